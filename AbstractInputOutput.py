@@ -2,8 +2,27 @@ from abc import ABCMeta, abstractmethod
 import pprint
 
 
+def chunked(records, chunk_size):
+    """ Lists the last element of every record, which is an iterator, and groups the records such that these lists add
+            up to at least chunk_size items per group. A record is never split over two groups.
+    """
+    chunk = []
+    amount = 0
+    for record in records:
+        record = tuple(record[:-1]) + (list(record[-1]),)
+        chunk.append(record)
+        amount += len(record[-1])
+        if amount >= chunk_size:
+            yield chunk
+            chunk = []
+            amount = 0
+    if chunk:
+        yield chunk
+
+
 class AbstractInputOutput(object):
     __metaclass__ = ABCMeta
+    stream_chunk_size = 1000  # Matches or planned matches the stream methods hand to a batch method at once.
 
     @abstractmethod
     def get_settings(self):
@@ -118,3 +137,110 @@ class AbstractInputOutput(object):
         pprint.pprint(comp_info)
         pprint.pprint(comp_results)
         pprint.pprint(comp_play_times)
+
+    def set_player_ratings_batch(self, ratings):
+        """ Specifies what you want to do with the ratings of many persons at once. Override this when you can store
+                many ratings in one go, for example in a single database transaction.
+
+            Params
+            ----------
+            ratings: list<tuple>
+                For every person (knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
+                year_e_rating, year_d_rating), see set_player_rating.
+
+            Default
+            ----------
+            Calls set_player_rating for every person.
+        """
+        for rating in ratings:
+            self.set_player_rating(*rating)
+
+    def invalid_players_batch(self, knltb_numbers):
+        """ Specifies what to do with many persons that could not be found at once.
+
+            Params
+            ----------
+            knltb_numbers: list<int>
+                The numbers of the persons, see invalid_player.
+
+            Default
+            ----------
+            Calls invalid_player for every person.
+        """
+        for knltb_number in knltb_numbers:
+            self.invalid_player(knltb_number)
+
+    def set_match_results_batch(self, match_results):
+        """ Specifies what you want to do with the matches of many persons at once.
+
+            Params
+            ----------
+            match_results: list<(knltb_number, list<MatchInfo>)>
+                For every person the number and the matches, see set_player_match_results.
+
+            Default
+            ----------
+            Calls set_player_match_results for every person.
+        """
+        for knltb_number, matches in match_results:
+            self.set_player_match_results(knltb_number, matches)
+
+    def set_competitions_batch(self, competitions):
+        """ Specifies what to do with the information of many competition teams at once.
+
+            Params
+            ----------
+            competitions: list<tuple>
+                For every team (season, own_teams, comp_url, comp_info, comp_results, comp_play_times), see
+                set_competition.
+
+            Default
+            ----------
+            Calls set_competition for every team.
+        """
+        for competition in competitions:
+            self.set_competition(*competition)
+
+    def stream_match_results(self, match_results):
+        """ Like set_match_results_batch, but the persons and their matches are handed over as iterators, such that
+                they can be written one by one instead of after the whole batch is looked at.
+
+            Params
+            ----------
+            match_results: iterator<(knltb_number, iterator<MatchInfo>)>
+                For every person the number and the matches, see set_player_match_results.
+
+            Default
+            ----------
+            Calls set_match_results_batch for every stream_chunk_size matches, the matches of a person are never
+                split over two calls.
+        """
+        for chunk in chunked(match_results, self.stream_chunk_size):
+            self.set_match_results_batch(chunk)
+
+    def stream_competition(self, competitions):
+        """ Like set_competitions_batch, but the teams and their planning are handed over as iterators.
+
+            Params
+            ----------
+            competitions: iterator<tuple>
+                For every team (season, own_teams, comp_url, comp_info, comp_results, iterator<TeamPlanning>), see
+                set_competition.
+
+            Default
+            ----------
+            Calls set_competitions_batch for every stream_chunk_size planned matches, the planning of a team is never
+                split over two calls.
+        """
+        for chunk in chunked(competitions, self.stream_chunk_size):
+            self.set_competitions_batch(chunk)
+
+    def flush(self):
+        """ Called when a scraper is done, after everything was handed over. Override this when you keep records
+                around before storing them, to store what is left.
+
+            Default
+            ----------
+            Does nothing.
+        """
+        pass
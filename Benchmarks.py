@@ -0,0 +1,1212 @@
+import BaseHTTPServer
+import SocketServer
+import gzip
+import hashlib
+import resource
+import mmap
+import multiprocessing
+import os
+import tempfile
+import StringIO
+import threading
+import time
+import urlparse
+import sys
+
+import HttpSession
+import KnltbFixtures
+from AbstractInputOutput import AbstractInputOutput
+
+"""
+    Benchmarks that run the scrapers against a local stand-in for the public KNLTB site, such that we can measure the
+    throughput of the scrapers without bothering the real site.
+
+    Usage
+    ----------
+    python Benchmarks.py [players|competitions|parsing|columnar|sqlite|records|queue|resume|errors|pacing|
+                         instrumentation|discovery|trajectories|poules|setup|daemon]
+                         [amount] [latency_in_seconds]
+"""
+
+
+class QuietIO(AbstractInputOutput):
+    """
+        An IO that only counts what it receives, such that printing does not end up in the measurements.
+    """
+    def __init__(self):
+        self.ratings = 0
+        self.matches = 0
+        self.invalid = 0
+        self.teams = 0
+        self.planned_matches = 0
+
+    def get_settings(self):
+        return True, False
+
+    def get_players(self):
+        return []
+
+    def get_competition(self):
+        return []
+
+    def set_player_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
+                          year_e_rating, year_d_rating):
+        self.ratings += 1
+
+    def set_player_match_results(self, knltb_number, matches):
+        self.matches += len(matches)
+
+    def invalid_player(self, knltb_number):
+        self.invalid += 1
+
+    def set_competition(self, season, own_teams, comp_url, comp_info, comp_results, comp_play_times):
+        self.teams += 1
+        self.planned_matches += len(comp_play_times)
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+        Serves generated KNLTB pages after waiting the latency of the server, like the real site would.
+        Connections are kept alive, pages are compressed when the client asks for it and an unchanged page is
+        answered with 304 Not Modified when the client sends its ETag.
+    """
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1  # Sending the headers and the page in one go, otherwise Nagle delays every kept alive response.
+
+    def do_GET(self):
+        parsed = urlparse.urlparse(self.path)
+        self.server.requests += 1
+        params = urlparse.parse_qs(parsed.query)
+        time.sleep(self.server.latency)
+        if self.server.status != 200:
+            self.server.failed_requests += 1
+            self.send_error(self.server.status)
+            return
+        if self.server.error_page:
+            self.server.failed_requests += 1
+            page = "<html><body><h1>Server Error in '/' Application.</h1></body></html>"
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+            return
+        if parsed.path == '/Spelersprofiel.aspx':
+            self.server.player_requests.append(time.time())
+            page = self.server.player_page(int(params['bondsnummer'][0]))
+        elif parsed.path == '/StandenEnUitslagenZoeken.aspx' and 'id' in params:
+            page = self.server.site.association_page(params['id'][0], params['vereniging'][0])
+        elif parsed.path == '/StandenEnUitslagenZoeken.aspx':
+            page = self.server.site.search_page()
+        elif parsed.path == '/StandenEnUitslagen.aspx':
+            page = self.server.site.team_page(params['id'][0])
+        else:
+            self.send_error(404)
+            return
+        etag = '"' + hashlib.md5(page).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', etag)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buffer = StringIO.StringIO()
+            with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+                compressed.write(page)
+            page = buffer.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.1, site=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.latency = latency
+        self.site = site
+        self.pages = {}
+        self.requests = 0
+        self.status = 200  # Set to for example 503 to play an outage.
+        self.error_page = False  # Set to answer every page with the error page of the site, with status 200.
+        self.failed_requests = 0
+        self.player_requests = []  # When every player page was asked for, to check the politeness of the scrapers.
+        self.community = None  # The KNLTB numbers players link to in their matches, by default they are random.
+
+    def player_page(self, knltb_number):
+        if knltb_number not in self.pages:
+            self.pages[knltb_number] = KnltbFixtures.player_page(knltb_number, community=self.community)
+        return self.pages[knltb_number]
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def benchmark_player_scraper(amount_of_players=40, latency=0.1, delay_time=0.02, worker_counts=(4, 8, 16)):
+    """
+        Compares the old sequential loop of PlayerScraper with the concurrent worker pool.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped in every run.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay that is used by both the sequential loop and the shared token bucket.
+        worker_counts: list<int>
+            The amount of workers for which the concurrent mode is measured.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of players per second it reached.
+    """
+    import PlayerScraper
+
+    server = StandInServer(latency).start()
+    PlayerScraper.base_url = server.url
+    PlayerScraper.delay_time = delay_time
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+
+    runs = [('sequential', lambda: PlayerScraper.scrape_players(knltb_numbers, True))]
+    for amount_of_workers in worker_counts:
+        runs.append(('{} workers'.format(amount_of_workers),
+                     lambda w=amount_of_workers: PlayerScraper.scrape_players_concurrently(knltb_numbers, True, w)))
+
+    results = []
+    for name, run in runs:
+        PlayerScraper.io = QuietIO()
+        start = time.time()
+        scraped = run()
+        duration = time.time() - start
+        assert scraped == amount_of_players and PlayerScraper.io.ratings == amount_of_players
+        results.append((name, amount_of_players / duration))
+        print('{:<12} {:>8.2f} players/sec ({:.2f}s)'.format(name, amount_of_players / duration, duration))
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def benchmark_competition_scraper(amount_of_competitions=6, latency=0.1, delay_time=0.02, worker_counts=(4, 8)):
+    """
+        Compares the three sequential phases of CompetitionScraper with the pipelined workers.
+
+        Parameters
+        ----------
+        amount_of_competitions: int
+            How many competition and association combinations are scraped in every run.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay that is used by both the sequential phases and the shared token bucket.
+        worker_counts: list<int>
+            The amount of workers for which the pipeline is measured.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of pages per second it reached.
+    """
+    import CompetitionScraper
+
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(amount_of_competitions)]
+    site = KnltbFixtures.CompetitionSite(names, ['A.T.C.'])
+    server = StandInServer(latency, site).start()
+    CompetitionScraper.base_url = server.url
+    CompetitionScraper.delay_time = delay_time
+    CompetitionScraper.competition_index_file = None  # Every run starts without an index, like the runs before it.
+    pages = 1 + amount_of_competitions + len(site.poules)  # The page with all competitions is only loaded once.
+
+    runs = [('sequential', lambda competitions: CompetitionScraper.scrape_competitions(competitions))]
+    for amount_of_workers in worker_counts:
+        runs.append(('{} workers'.format(amount_of_workers),
+                     lambda competitions, w=amount_of_workers:
+                     CompetitionScraper.scrape_competitions_pipelined(competitions, w)))
+
+    results = []
+    for name, run in runs:
+        CompetitionScraper.io = QuietIO()
+        CompetitionScraper.competition_index = None
+        competitions = [[competition_name, 'A.T.C.'] for competition_name in names]
+        start = time.time()
+        run(competitions)
+        duration = time.time() - start
+        assert CompetitionScraper.io.teams == len(site.poules)
+        results.append((name, pages / duration))
+        print('{:<12} {:>8.2f} pages/sec ({:.2f}s)'.format(name, pages / duration, duration))
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def load_through_file(content, filename):
+    """
+        The way pages were handled before they were parsed in memory: written to disk in chunks of 128 bytes and
+        mapped back into memory.
+    """
+    with open(filename, 'wb') as fd:
+        for idx in range(0, len(content), 128):
+            fd.write(content[idx:idx + 128])
+    with open(filename, 'r') as fd:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def benchmark_in_memory_parsing(amount_of_pages=200):
+    """
+        Compares parsing player pages through a file on disk and mmap with parsing them straight from memory.
+
+        Parameters
+        ----------
+        amount_of_pages: int
+            How many player pages are parsed in every run.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of pages per second it reached.
+    """
+    import PlayerScraper
+
+    pages = [KnltbFixtures.player_page(nr) for nr in range(20000000, 20000000 + amount_of_pages)]
+    filename = os.path.join(tempfile.mkdtemp(), 'last_knltb_player.html')
+
+    def through_file(nr, content):
+        s = load_through_file(content, filename)
+        PlayerScraper.get_player_data(s, nr)
+        PlayerScraper.get_player_changes_over_time(s, nr)
+        s.close()
+
+    def in_memory(nr, content):
+        PlayerScraper.get_player_data(content, nr)
+        PlayerScraper.get_player_changes_over_time(content, nr)
+
+    results = []
+    for name, run in [('disk and mmap', through_file), ('in memory', in_memory)]:
+        PlayerScraper.io = QuietIO()
+        start = time.time()
+        for nr, content in enumerate(pages):
+            run(nr, content)
+        duration = time.time() - start
+        assert PlayerScraper.io.ratings == amount_of_pages
+        results.append((name, amount_of_pages / duration))
+        print('{:<14} {:>8.2f} pages/sec ({:.2f}s)'.format(name, amount_of_pages / duration, duration))
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+    return results
+
+
+def deep_size(value, seen=None):
+    """
+        The memory used by a value and everything it refers to, counting shared objects once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+
+def benchmark_columnar_export(amount_of_players=2000):
+    """
+        Compares the matches of many players as lists of MatchInfo with the columnar export of the same matches.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many generated players are exported.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The measurements, by name.
+    """
+    import ColumnarExport
+    import PlayerScraper
+
+    match_results = [(nr, PlayerScraper.get_player_matches(KnltbFixtures.player_page(nr))[1])
+                     for nr in range(20000000, 20000000 + amount_of_players)]
+    amount_of_matches = sum(len(matches) for _, matches in match_results)
+    filename = os.path.join(tempfile.mkdtemp(), 'matches.col')
+
+    start = time.time()
+    export = ColumnarExport.ColumnarExport()
+    for nr, matches in match_results:
+        export.add_matches(nr, matches)
+    export.save(filename)
+    export_duration = time.time() - start
+
+    start = time.time()
+    columns = ColumnarExport.ColumnarFile(filename)
+    dates = columns.dates()
+    season = (dates >= ColumnarExport.numpy.datetime64('2017-04-01')) & \
+             (dates < ColumnarExport.numpy.datetime64('2017-10-01'))
+    added_rating = columns.column('matches', 'added_rating')[season]
+    events = columns.column('matches', 'event_name').codes[season]
+    load_duration = time.time() - start
+
+    columnar_size = sum(columns.array(name).nbytes for name in columns.header['arrays'])
+    tuple_size = deep_size(match_results)
+    results = [('matches', amount_of_matches), ('export seconds', export_duration),
+               ('load and select a season seconds', load_duration), ('matches in the season', len(added_rating)),
+               ('MatchInfo lists MB', tuple_size / 1e6), ('columnar file MB', os.path.getsize(filename) / 1e6),
+               ('columnar arrays MB', columnar_size / 1e6)]
+    assert len(events) == len(added_rating)
+    for name, value in results:
+        print('{:<34} {:>12.3f}'.format(name, value))
+    columns.close()
+    os.remove(filename)
+    os.rmdir(os.path.dirname(filename))
+    return results
+
+
+def benchmark_sqlite(amount_of_players=2000, batch_size=500, club='A.T.C.'):
+    """
+        Writes the matches of many players to SqliteIO, in batches, with one call per player and streamed. Writes
+        them all again to check that they update their rows instead of adding new ones, and compares club_matches
+        with a plain join on both team columns.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many generated players are written.
+        batch_size: int
+            The amount of players in one call to set_match_results_batch.
+        club: string
+            The club of which the matches are looked up.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The measurements, by name.
+    """
+    import PlayerScraper
+    import SqliteIO
+
+    match_results = [(nr, PlayerScraper.get_player_matches(KnltbFixtures.player_page(nr))[1])
+                     for nr in range(20000000, 20000000 + amount_of_players)]
+    amount_of_matches = sum(len(matches) for _, matches in match_results)
+    directory = tempfile.mkdtemp()
+    batches = [match_results[idx:idx + batch_size] for idx in range(0, len(match_results), batch_size)]
+
+    results = [('matches', amount_of_matches)]
+    for name, write in [('batches', lambda io: [io.set_match_results_batch(batch) for batch in batches]),
+                        ('one call per player', lambda io: [io.set_player_match_results(nr, matches)
+                                                            for nr, matches in match_results]),
+                        ('streamed', lambda io: io.stream_match_results((nr, iter(matches))
+                                                                        for nr, matches in match_results))]:
+        filename = os.path.join(directory, name.replace(' ', '_') + '.db')
+        io = SqliteIO.SqliteIO(filename)
+        start = time.time()
+        write(io)
+        results.append((name + ' matches/sec', amount_of_matches / (time.time() - start)))
+        start = time.time()
+        write(io)
+        results.append((name + ' again matches/sec', amount_of_matches / (time.time() - start)))
+        rows = io.connection.execute('SELECT COUNT(*) FROM matches').fetchone()[0]
+        assert rows == amount_of_matches, '{} rows for {} matches'.format(rows, amount_of_matches)
+        io.close()
+
+    io = SqliteIO.SqliteIO(filename)
+    start = time.time()
+    indexed = io.club_matches(club, '2017-01-01', '2017-12-31')
+    results.append(('club_matches ms', (time.time() - start) * 1000))
+    start = time.time()
+    joined = io.connection.execute(
+        'SELECT matches.* FROM matches LEFT JOIN teams AS home ON home.team_id = matches.club_home_id '
+        'LEFT JOIN teams AS out ON out.team_id = matches.club_out_id '
+        'WHERE (home.club = ? OR out.club = ?) AND matches.date BETWEEN ? AND ?',
+        (club, club, '2017-01-01', '2017-12-31')).fetchall()
+    results.append(('plain join ms', (time.time() - start) * 1000))
+    assert sorted(indexed) == sorted(joined)
+    results.append(('matches of the club', len(indexed)))
+    io.close()
+
+    for name, value in results:
+        print('{:<38} {:>12.1f}'.format(name, value))
+    for filename in os.listdir(directory):
+        os.remove(os.path.join(directory, filename))
+    os.rmdir(directory)
+    return results
+
+
+def crawl_memory(amount_of_players, compact_records, distinct_pages=500):
+    """
+        Parses the matches of amount_of_players players and keeps them, like an IO that collects a whole crawl.
+        Runs in its own process, such that the memory of one run does not end up in the next.
+
+        Returns
+        -------
+        megabytes: float
+            How much the peak memory of the process grew while the matches were kept.
+    """
+    import PlayerScraper
+    import CompetitionScraper
+
+    PlayerScraper.compact_records = compact_records
+    CompetitionScraper.compact_records = compact_records
+    # Parsing the same pages again still cuts fresh strings out of them, like pages of different players would.
+    pages = [KnltbFixtures.player_page(nr) for nr in range(20000000, 20000000 + distinct_pages)]
+    team_pages = [KnltbFixtures.team_page('A.T.C.', seed=seed) for seed in range(distinct_pages // 10)]
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    crawl = []
+    for idx in range(amount_of_players):
+        crawl.append(PlayerScraper.get_player_matches(pages[idx % distinct_pages])[1])
+        if idx % 10 == 0:
+            page = team_pages[idx // 10 % len(team_pages)]
+            crawl.append(CompetitionScraper.get_team_results(page, 'A.T.C.'))
+            crawl.append(CompetitionScraper.get_team_planning(page, 'A.T.C.'))
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024.0
+
+
+def benchmark_compact_records(amount_of_players=50000):
+    """
+        Compares the memory that a crawl of many players needs with named tuples and with compact records. Every
+        tenth player also comes with the standings and planning of a team.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players the crawl keeps.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the megabytes it needed.
+    """
+    results = []
+    for name, compact_records in [('named tuples', False), ('compact records', True)]:
+        memory = multiprocessing.Queue()
+        start = time.time()
+        process = multiprocessing.Process(target=lambda: memory.put(crawl_memory(amount_of_players,
+                                                                                 compact_records)))
+        process.start()
+        megabytes = memory.get()
+        process.join()
+        results.append((name, megabytes))
+        print('{:<16} {:>10.1f} MB for {} players ({:.1f}s)'.format(name, megabytes, amount_of_players,
+                                                                     time.time() - start))
+    return results
+
+
+def scrape_queue_in_process(url, filename, knltb_numbers, delay_time, lease_time, amount_of_workers, results):
+    import PlayerScraper
+
+    PlayerScraper.io = QuietIO()
+    PlayerScraper.base_url = url
+    PlayerScraper.delay_time = delay_time
+    PlayerScraper.work_queue_file = filename
+    PlayerScraper.work_queue_lease = lease_time
+    results.put(PlayerScraper.scrape_players_from_queue(knltb_numbers, True, amount_of_workers))
+
+
+def benchmark_work_queue(amount_of_players=200, latency=0.1, delay_time=0.01, process_counts=(1, 2, 4),
+                         workers_per_process=2):
+    """
+        Scrapes the players of one work queue with several processes. Before the processes start, a worker that
+        crashes claims a batch and never acknowledges it, the processes have to take those players over once the
+        lease ran out. Checks that every player is scraped once and that the processes together kept to delay_time.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped in every run.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay that all processes share.
+        process_counts: list<int>
+            The amount of processes for which the queue is measured.
+        workers_per_process: int
+            The amount of workers in every process.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of players per second it reached.
+    """
+    import WorkQueue
+
+    lease_time = 1.0
+    server = StandInServer(latency).start()
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+    directory = tempfile.mkdtemp()
+
+    results = []
+    for amount_of_processes in process_counts:
+        filename = os.path.join(directory, 'work_queue_{}.db'.format(amount_of_processes))
+        queue = WorkQueue.WorkQueue(filename, lease_time)
+        queue.add(knltb_numbers)
+        crashed = queue.claim('crashed worker', 10)
+        del server.player_requests[:]
+        scraped = multiprocessing.Queue()
+        start = time.time()
+        processes = [multiprocessing.Process(target=scrape_queue_in_process,
+                                             args=(server.url, filename, knltb_numbers, delay_time, lease_time,
+                                                   workers_per_process, scraped))
+                     for _ in range(amount_of_processes)]
+        for process in processes:
+            process.start()
+        counters = [scraped.get() for _ in processes]
+        duration = time.time() - start
+        for process in processes:
+            process.join()
+
+        # Single requests arrive closer together or further apart than they were sent, by the scheduling of the
+        # threads, so the budget is checked over every ten requests in a row.
+        requests = sorted(server.player_requests)
+        smallest_span = min(later - earlier for earlier, later in zip(requests, requests[9:]))
+        assert sum(counters) == amount_of_players and len(requests) == amount_of_players, (counters, len(requests))
+        assert queue.counts()['done'] == amount_of_players
+        name = '{} processes'.format(amount_of_processes)
+        results.append((name, amount_of_players / duration))
+        print('{:<12} {:>8.2f} players/sec ({:.2f}s), per process {}, {} taken over from a crashed worker, '
+              '10 pages took at least {:.1f}ms'.format(name, amount_of_players / duration, duration, counters,
+                                                       len(crashed), smallest_span * 1000))
+        queue.close()
+    server.shutdown()
+    for filename in os.listdir(directory):
+        os.remove(os.path.join(directory, filename))
+    os.rmdir(directory)
+    return results
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptingIO(QuietIO):
+    """
+        An IO that fails from the moment it received a certain amount of ratings or teams, like a crash halfway
+        through a run.
+    """
+    def __init__(self, interrupt_after):
+        QuietIO.__init__(self)
+        self.interrupt_after = interrupt_after
+
+    def set_player_rating(self, *args):
+        if self.ratings == self.interrupt_after:
+            raise Interrupted()
+        QuietIO.set_player_rating(self, *args)
+
+    def set_competition(self, *args):
+        if self.teams == self.interrupt_after:
+            raise Interrupted()
+        QuietIO.set_competition(self, *args)
+
+
+def benchmark_resume(amount_of_players=100, latency=0.05, delay_time=0.01, io_batch_size=5):
+    """
+        Interrupts a run of both scrapers halfway and runs them again with the same checkpoint, to count how many
+        pages the second run loads compared to a run that starts over.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped, the competitions have about as many teams.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay of the scrapers.
+        io_batch_size: int
+            The amount of records that is handed to the IO at once, work is only journaled once it reached the IO.
+
+        Returns
+        -------
+        results: list<(string, int)>
+            The name of every run and the amount of pages it loaded.
+    """
+    import CompetitionScraper
+    import PlayerScraper
+
+    directory = tempfile.mkdtemp()
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(max(1, amount_of_players // 20))]
+    site = KnltbFixtures.CompetitionSite(names, ['A.T.C.'])
+    server = StandInServer(latency, site).start()
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+    for scraper in (PlayerScraper, CompetitionScraper):
+        scraper.base_url = server.url
+        scraper.delay_time = delay_time
+        scraper.io_batch_size = io_batch_size
+        scraper.checkpoint_file = os.path.join(directory, 'journal')
+    CompetitionScraper.competition_index_file = None
+    teams = len(site.poules)
+
+    results = []
+    for name, amount, run in [
+            ('players', amount_of_players, lambda: PlayerScraper.scrape_players(knltb_numbers, True)),
+            ('players with workers', amount_of_players,
+             lambda: PlayerScraper.scrape_players_concurrently(knltb_numbers, True, 4)),
+            ('competitions', teams,
+             lambda: CompetitionScraper.scrape_competitions([[name, 'A.T.C.'] for name in names])),
+            ('competitions pipelined', teams,
+             lambda: CompetitionScraper.scrape_competitions_pipelined([[name, 'A.T.C.'] for name in names], 4))]:
+        pages = []
+        for interrupt_after in (amount // 2, None):
+            PlayerScraper.io = CompetitionScraper.io = InterruptingIO(interrupt_after)
+            CompetitionScraper.competition_index = None
+            server.requests = 0
+            try:
+                run()
+            except Interrupted:
+                pass
+            pages.append(server.requests)
+            received = PlayerScraper.io.ratings if 'players' in name else PlayerScraper.io.teams
+        HttpSession.close_session()
+        assert not os.path.exists(os.path.join(directory, 'journal'))
+        results.append((name, pages[1]))
+        print('{:<24} interrupted after {} pages, the second run loaded {} pages and handed {} of {} to the IO'
+              .format(name, pages[0], pages[1], received, amount))
+    server.shutdown()
+    os.rmdir(directory)
+    return results
+
+
+def benchmark_error_pages(amount_of_players=20, latency=0.02, delay_time=0.005, workers=4):
+    """
+        Scrapes players while the stand-in site is down, first answering 503 and then answering with its error page,
+        and checks that none of them reaches the IO or is journaled as finished. Then scrapes them once the site is
+        back, which has to load every player again.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped in every run.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay of the scrapers.
+        workers: int
+            The amount of workers of the runs.
+
+        Returns
+        -------
+        results: list<(string, int)>
+            The name of every run and the amount of players it scraped.
+    """
+    import Checkpoint
+    import PlayerScraper
+
+    directory = tempfile.mkdtemp()
+    server = StandInServer(latency).start()
+    PlayerScraper.base_url = server.url
+    PlayerScraper.delay_time = delay_time
+    PlayerScraper.checkpoint_file = os.path.join(directory, 'journal')
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+
+    results = []
+    for name, status, error_page in [('503', 503, False), ('error page', 200, True), ('site back', 200, False)]:
+        server.status = status
+        server.error_page = error_page
+        server.requests = 0
+        PlayerScraper.io = QuietIO()
+        scraped = PlayerScraper.scrape_players_concurrently(knltb_numbers, True, workers)
+        results.append((name, scraped))
+        print('{:<12} scraped {} of {} players with {} requests'.format(name, scraped, amount_of_players,
+                                                                        server.requests))
+        if status != 200 or error_page:
+            assert scraped == 0 and PlayerScraper.io.ratings == 0 and PlayerScraper.io.invalid == 0
+            checkpoint = Checkpoint.Checkpoint(PlayerScraper.checkpoint_file,
+                                               Checkpoint.job_key('players', sorted(knltb_numbers), True))
+            assert not any(checkpoint.done('player', nr) for nr in knltb_numbers)
+            checkpoint.close()
+        else:
+            assert scraped == amount_of_players and PlayerScraper.io.ratings == amount_of_players
+            assert not os.path.exists(PlayerScraper.checkpoint_file)
+    PlayerScraper.checkpoint_file = None
+    HttpSession.close_session()
+    server.shutdown()
+    os.rmdir(directory)
+    return results
+
+
+def benchmark_adaptive_pacing(amount_of_players=120, delay_time=0.75, workers=4):
+    """
+        Scrapes players while the stand-in site goes through a schedule: fast, then slow, then down, then fast
+        again. Compares the fixed delay_time with the adaptive pacing, which starts at the same rate.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped in every run.
+        delay_time: float
+            The fixed delay, and the delay the adaptive pacing starts from.
+        workers: int
+            The amount of workers of both runs.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of players per second it reached.
+    """
+    import PlayerScraper
+    import RateLimiter
+
+    # Seconds since the start, latency and status of the site from then on.
+    schedule = [(0, 0.05, 200), (15, 1.5, 200), (25, 0.05, 503), (35, 0.05, 200)]
+    server = StandInServer(schedule[0][1]).start()
+    PlayerScraper.base_url = server.url
+    PlayerScraper.delay_time = delay_time
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+
+    def play_schedule(done):
+        start = time.time()
+        for at, latency, status in schedule:
+            if done.wait(max(0, start + at - time.time())):
+                return
+            server.latency = latency
+            server.status = status
+
+    results = []
+    for name, adaptive in [('fixed delay', False), ('adaptive', True)]:
+        pacer = None
+        if adaptive:
+            pacer = RateLimiter.AdaptivePacer(1.0 / delay_time, 0.2, 4.0, breaker=RateLimiter.CircuitBreaker(5, 5.0))
+        HttpSession.pacer = pacer
+        PlayerScraper.io = QuietIO()
+        server.requests = server.failed_requests = 0
+        done = threading.Event()
+        schedule_thread = threading.Thread(target=play_schedule, args=(done,))
+        schedule_thread.start()
+        start = time.time()
+        PlayerScraper.scrape_players_concurrently(knltb_numbers, True, workers)
+        duration = time.time() - start
+        done.set()
+        schedule_thread.join()
+        results.append((name, amount_of_players / duration))
+        print('{:<12} {:>6.2f} players/sec ({:.1f}s), {} requests failed during the outage'.format(
+            name, amount_of_players / duration, duration, server.failed_requests))
+        if pacer is not None:
+            print('             ' + pacer.summary())
+            print('             rate over time: ' + ', '.join('{:.0f}s {:.2f}'.format(at, rate)
+                                                             for at, rate in pacer.metrics()['history']))
+    HttpSession.pacer = None
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def benchmark_instrumentation(amount_of_players=200, latency=0.02, delay_time=0.005, workers=4, profile=0):
+    """
+        Scrapes players and competitions with the instrumentation on, prints where the time went and compares the
+        throughput with a run without instrumentation, to show what the measuring costs.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many players are scraped in every run.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay of the runs.
+        workers: int
+            The amount of workers of the runs.
+        profile: int
+            When 1, the instrumented runs are profiled as well and the hot functions are printed.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of pages per second it reached.
+    """
+    import CompetitionScraper
+    import Instrumentation
+    import PlayerScraper
+
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(6)]
+    site = KnltbFixtures.CompetitionSite(names, ['A.T.C.'])
+    server = StandInServer(latency, site).start()
+    metrics_file = os.path.join(tempfile.mkdtemp(), 'metrics')
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    for nr in knltb_numbers:
+        server.player_page(nr)
+    for scraper in [PlayerScraper, CompetitionScraper]:
+        scraper.base_url = server.url
+        scraper.delay_time = delay_time
+    CompetitionScraper.competition_index_file = None
+
+    def scrape_players():
+        PlayerScraper.io = QuietIO()
+        PlayerScraper.scrape_players_concurrently(knltb_numbers, True, workers)
+        return amount_of_players
+
+    def scrape_competitions():
+        CompetitionScraper.io = QuietIO()
+        CompetitionScraper.competition_index = None
+        CompetitionScraper.scrape_competitions_pipelined([[name, 'A.T.C.'] for name in names], workers)
+        return 1 + len(names) + len(site.poules)
+
+    results = []
+    for scraper_name, run in [('players', scrape_players), ('competitions', scrape_competitions)]:
+        for instrumented in [False, True]:
+            profiler = Instrumentation.Profiler().start() if instrumented and profile else None
+            if instrumented:
+                Instrumentation.start()
+            start = time.time()
+            pages = run()
+            duration = time.time() - start
+            name = '{} {}'.format(scraper_name, 'instrumented' if instrumented else 'plain')
+            results.append((name, pages / duration))
+            print('{:<24} {:>8.2f} pages/sec ({:.2f}s)'.format(name, pages / duration, duration))
+            if instrumented:
+                summary = Instrumentation.finish(metrics_file)
+                print(Instrumentation.summary_line(summary))
+                with open(metrics_file + '.prom') as fd:
+                    prometheus = fd.read()
+                assert summary['counters']['pages'] == pages
+                assert '{}_stage_seconds_count{{stage="parse"}} '.format(Instrumentation.metric_prefix) in prometheus
+            if profiler is not None:
+                profiler.stop(top=15)
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def benchmark_discovery(community_size=3000, max_players=300, latency=0.02, delay_time=0.005, workers=4):
+    """
+        Crawls a community of players in which every player links to other players of the same community, starting
+        from a few seeds. Checks that no page is loaded twice and that the budget is kept.
+
+        Parameters
+        ----------
+        community_size: int
+            The amount of players in the community.
+        max_players: int
+            The budget of player pages of the crawl.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay of the crawl.
+        workers: int
+            The amount of workers of the crawl.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of the run and the amount of players per second it reached.
+    """
+    import DiscoveryCrawler
+    import PlayerScraper
+
+    server = StandInServer(latency).start()
+    server.community = range(20000000, 20000000 + community_size)
+    PlayerScraper.base_url = server.url
+    PlayerScraper.delay_time = delay_time
+    PlayerScraper.io = QuietIO()
+    crawler = DiscoveryCrawler.DiscoveryCrawler(server.community[:5], True, max_depth=3, max_players=max_players)
+    start = time.time()
+    scraped = crawler.crawl(workers)
+    duration = time.time() - start
+    assert scraped == min(max_players, community_size) == server.requests == PlayerScraper.io.ratings
+    assert len(server.pages) == server.requests, 'A player page was loaded twice'
+    print('discovery    {:>8.2f} players/sec ({:.2f}s)'.format(scraped / duration, duration))
+    print(crawler.summary())
+    print('visited bitmap {:.1f} MB for any amount of players, a set of the {} players seen takes {:.1f} MB'.format(
+        len(crawler.visited.bits) / 1024.0 ** 2, len(crawler.visited),
+        (sys.getsizeof(set(range(len(crawler.visited)))) + 24 * len(crawler.visited)) / 1024.0 ** 2))
+    HttpSession.close_session()
+    server.shutdown()
+    return [('discovery', scraped / duration)]
+
+
+def python_report(match_results, ratings, window=5):
+    """
+        The latest rating, form and drift of every trajectory computed match by match, to check and compare
+        RatingTrajectories.report with.
+    """
+    import ColumnarExport
+
+    trajectories = {}
+    for nr, matches in match_results:
+        # The page lists the newest matches first, the sort by date below keeps the matches of a day oldest first.
+        for match in reversed(matches):
+            trajectories.setdefault((nr, match.match_type == 'Dubbel'), []).append(
+                (ColumnarExport.parse_date(match.date), ColumnarExport.parse_rating(match.added_rating),
+                 ColumnarExport.parse_rating(match.rating_at_start_match)))
+    report = {}
+    for (nr, double), matches in trajectories.items():
+        matches.sort(key=lambda match: match[0])
+        added = [0.0 if added_rating != added_rating else added_rating for _, added_rating, _ in matches]
+        latest = matches[-1][2] + added[-1]
+        rating = ColumnarExport.parse_rating(ratings[nr][3 if double else 2])
+        report[nr, double] = (latest, sum(added[-window:]), latest - rating)
+    return report
+
+
+def benchmark_rating_trajectories(amount_of_players=5000):
+    """
+        Computes the rating trajectories and the report of a club of generated players, vectorized and match by match.
+
+        Parameters
+        ----------
+        amount_of_players: int
+            How many generated players are in the club.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The measurements, by name.
+    """
+    import ColumnarExport
+    import PlayerScraper
+    import RatingTrajectories
+
+    pages = [(nr, KnltbFixtures.player_page(nr)) for nr in range(20000000, 20000000 + amount_of_players)]
+    match_results = [(nr, PlayerScraper.get_player_matches(page)[1]) for nr, page in pages]
+    ratings = {nr: PlayerScraper.get_player_ratings(page) for nr, page in pages}
+    export = ColumnarExport.ColumnarExport()
+    for nr, matches in match_results:
+        export.add_matches(nr, matches)
+        export.add_rating(nr, *ratings[nr][2:] + ratings[nr][:2])
+    del pages
+
+    start = time.time()
+    trajectories = RatingTrajectories.RatingTrajectories.from_export(export)
+    report = trajectories.report()
+    event_totals = trajectories.event_totals()
+    vectorized_duration = time.time() - start
+
+    start = time.time()
+    expected = python_report(match_results, ratings)
+    python_duration = time.time() - start
+
+    assert len(report) == len(expected)
+    for row in report:
+        latest, form, drift = expected[row['knltb_number'], bool(row['double'])]
+        assert abs(row['latest_rating'] - latest) < 1e-4 and abs(row['form'] - form) < 1e-4 and \
+            abs(row['drift'] - drift) < 1e-4
+    results = [('matches', sum(len(matches) for _, matches in match_results)), ('trajectories', len(report)),
+               ('event totals', len(event_totals)), ('vectorized seconds', vectorized_duration),
+               ('match by match seconds', python_duration)]
+    for name, value in results:
+        print('{:<34} {:>12.3f}'.format(name, value))
+    return results
+
+
+def benchmark_shared_poules(amount_of_competitions=10, own_teams_per_poule=3, latency=0.05, delay_time=0.01):
+    """
+        Scrapes competitions in which several own teams play in every poule, once loading the poule for every own team
+        and once sharing it between them, see CompetitionScraper.PouleCache.
+
+        Parameters
+        ----------
+        amount_of_competitions: int
+            How many competition and association combinations are scraped in every run.
+        own_teams_per_poule: int
+            How many teams of the association play in every poule.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay between pages.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every run and the amount of team pages it loaded.
+    """
+    import CompetitionScraper
+
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(amount_of_competitions)]
+    site = KnltbFixtures.CompetitionSite(names, ['A.T.C.'], own_teams_per_poule=own_teams_per_poule)
+    server = StandInServer(latency, site).start()
+    CompetitionScraper.base_url = server.url
+    CompetitionScraper.delay_time = delay_time
+    CompetitionScraper.competition_index_file = None
+
+    results = []
+    for name, share_poules in [('every own team', False), ('shared poules', True)]:
+        CompetitionScraper.io = QuietIO()
+        CompetitionScraper.competition_index = None
+        CompetitionScraper.share_poules = share_poules
+        server.requests = 0
+        start = time.time()
+        CompetitionScraper.scrape_competitions([[competition_name, 'A.T.C.'] for competition_name in names])
+        duration = time.time() - start
+        team_pages = server.requests - 1 - amount_of_competitions
+        assert CompetitionScraper.io.teams == len(site.poules) * (1 if share_poules else own_teams_per_poule)
+        results.append((name, team_pages))
+        print('{:<16} {:>5} team pages {:>5} passed on to the IO ({:.2f}s)'.format(
+            name, team_pages, CompetitionScraper.io.teams, duration))
+    CompetitionScraper.share_poules = True
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def benchmark_setup(amount_of_associations=30, amount_of_competitions=2, latency=0.1, delay_time=0.02,
+                    worker_counts=(1, 8)):
+    """
+        Measures the setup of CompetitionScraper for many associations: resolving the competitions and looking up the
+        teams of every association, with the teams of several associations looked up at the same time or not.
+
+        Parameters
+        ----------
+        amount_of_associations: int
+            How many associations play in every competition.
+        amount_of_competitions: int
+            How many competitions are scraped for every association.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay between pages.
+        worker_counts: list<int>
+            The amounts of lookup_workers that are measured.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The amount of lookup_workers of every run and the seconds its setup took.
+    """
+    import CompetitionScraper
+
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(amount_of_competitions)]
+    associations = ['Vereniging {}'.format(idx) for idx in range(amount_of_associations)]
+    site = KnltbFixtures.CompetitionSite(names, associations, poules_per_association=2)
+    server = StandInServer(latency, site).start()
+    CompetitionScraper.base_url = server.url
+    CompetitionScraper.delay_time = delay_time
+    CompetitionScraper.competition_index_file = None
+
+    results = []
+    for amount_of_workers in worker_counts:
+        CompetitionScraper.competition_index = None
+        competitions = [[name, association] for association in associations for name in names]
+        server.requests = 0
+        start = time.time()
+        CompetitionScraper.resolve_competitions(competitions, None)
+        CompetitionScraper.find_all_teams(competitions, None, amount_of_workers)
+        duration = time.time() - start
+        assert all(len(competition_season[3]) == 2 for competition_season in competitions)
+        results.append(('{} lookup workers'.format(amount_of_workers), duration))
+        print('{:<18} {:>4} pages in {:.2f}s'.format(results[-1][0], server.requests, duration))
+    HttpSession.close_session()
+    server.shutdown()
+    return results
+
+
+def benchmark_daemon(amount_of_runs=5, amount_of_players=5, latency=0.02, delay_time=0.02):
+    """
+        Compares scheduled runs that each start their own process, which pays for the interpreter, the imports, new
+        connections and loading the competition index every time, with the same runs as jobs of a ScrapeDaemon.
+
+        Parameters
+        ----------
+        amount_of_runs: int
+            How many runs of every kind are measured.
+        amount_of_players: int
+            How many players every players run scrapes.
+        latency: float
+            How long the stand-in server waits before answering, in seconds.
+        delay_time: float
+            The politeness delay between pages.
+
+        Returns
+        -------
+        results: list<(string, float)>
+            The name of every way of running and the average seconds of a run.
+    """
+    import subprocess
+    import CompetitionScraper
+    import PlayerScraper
+    import ScrapeDaemon
+
+    names = ['Voorjaarscompetitie {} 2017'.format(idx) for idx in range(2)]
+    associations = ['Vereniging {}'.format(idx) for idx in range(2)]
+    site = KnltbFixtures.CompetitionSite(names, associations)
+    server = StandInServer(latency, site).start()
+    knltb_numbers = range(20000000, 20000000 + amount_of_players)
+    competitions = [[name, association] for association in associations for name in names]
+    index_file = os.path.join(tempfile.mkdtemp(), 'competition_index.json')
+    for module in (PlayerScraper, CompetitionScraper):
+        module.base_url = server.url
+        module.delay_time = delay_time
+    CompetitionScraper.competition_index_file = index_file
+    script = '\n'.join(['import sys', 'sys.path.insert(0, {!r})', 'import Benchmarks', 'import {module}',
+                         '{module}.base_url = {!r}', '{module}.delay_time = {!r}', 'import CompetitionScraper',
+                         'CompetitionScraper.competition_index_file = {!r}', '{module}.io = Benchmarks.QuietIO()',
+                         '{module}.run({!r})'])
+    kinds = [('players', PlayerScraper, knltb_numbers), ('competitions', CompetitionScraper, competitions)]
+
+    results = []
+    with open(os.devnull, 'w') as devnull:
+        for kind, module, arguments in kinds:
+            start = time.time()
+            for _ in range(amount_of_runs):
+                code = script.format(os.path.dirname(os.path.abspath(__file__)), server.url, delay_time, index_file,
+                                     arguments, module=module.__name__)
+                subprocess.check_call([sys.executable, '-c', code], stdout=devnull)
+            results.append(('{} processes'.format(kind), (time.time() - start) / amount_of_runs))
+            print('{:<24} {:.3f}s per run'.format(results[-1][0], results[-1][1]))
+
+    daemon = ScrapeDaemon.ScrapeDaemon(schedule=[], port=0)
+    start = time.time()
+    thread = threading.Thread(target=daemon.run)
+    thread.daemon = True
+    thread.start()
+    port = daemon.server.server_address[1]
+    for kind, module, arguments in kinds:
+        module.io = QuietIO()
+        start = time.time()
+        for _ in range(amount_of_runs):
+            job = ScrapeDaemon.control('/jobs', {'kind': kind, kind if kind == 'competitions' else 'knltb_numbers':
+                                                 arguments}, port)
+            while job['state'] not in ('done', 'failed'):
+                time.sleep(0.005)
+                job = ScrapeDaemon.control('/jobs/{}'.format(job['id']), port=port)
+            assert job['state'] == 'done', job['error']
+        results.append(('{} daemon jobs'.format(kind), (time.time() - start) / amount_of_runs))
+        print('{:<24} {:.3f}s per run'.format(results[-1][0], results[-1][1]))
+    assert PlayerScraper.io.ratings == amount_of_runs * amount_of_players
+    assert CompetitionScraper.io.teams == amount_of_runs * len(site.poules)
+    daemon.stop()
+    thread.join()
+    server.shutdown()
+    return results
+
+
+benchmarks = {'players': benchmark_player_scraper, 'competitions': benchmark_competition_scraper,
+              'parsing': benchmark_in_memory_parsing, 'columnar': benchmark_columnar_export,
+              'sqlite': benchmark_sqlite, 'records': benchmark_compact_records, 'queue': benchmark_work_queue,
+              'resume': benchmark_resume, 'errors': benchmark_error_pages, 'pacing': benchmark_adaptive_pacing,
+              'instrumentation': benchmark_instrumentation, 'discovery': benchmark_discovery,
+              'trajectories': benchmark_rating_trajectories, 'poules': benchmark_shared_poules,
+              'setup': benchmark_setup, 'daemon': benchmark_daemon}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        benchmarks[sys.argv[1]](*[float(argument) if '.' in argument else int(argument)
+                                  for argument in sys.argv[2:]])
+    else:
+        for benchmark in sorted(benchmarks):
+            print(benchmark)
+            benchmarks[benchmark]()
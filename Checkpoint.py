@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import threading
+
+"""
+    A journal of the work a run finished, such that a run that was interrupted by a crash, a Ctrl+C or a network drop
+    continues where it stopped instead of starting over.
+
+    The journal is a file with one line of json for everything that was finished: a scraped KNLTB number or team, a
+    competition uid that was found or the teams of a competition. A line is only written once the IO received the
+    results, so after a restart nothing is skipped that did not reach the IO. The first line holds the key of the job,
+    a journal of another job is thrown away instead of continued. When the run finishes the journal is removed.
+"""
+
+
+def job_key(*parts):
+    """
+        A key for a job, such that a journal is only continued by a run that was asked to do the same work.
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()[:16]
+
+
+def encoded(value):
+    """
+        The value read from json with its texts as utf-8 strings again, like the scrapers use them.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [encoded(item) for item in value]
+    return value
+
+
+class Checkpoint(object):
+    def __init__(self, filename, job, sync_every=20):
+        """
+            Parameters
+            ----------
+            filename: string
+                The journal, it is continued when it belongs to the same job and created otherwise.
+            job: string
+                The key of the job, see job_key.
+            sync_every: int
+                The journal is written to the disk itself after this many lines, instead of leaving it to the
+                operating system. A crash of the scraper loses nothing either way, a crash of the machine loses at
+                most this many lines.
+        """
+        self.filename = filename
+        self.job = job
+        self.sync_every = sync_every
+        self.entries = {}
+        self.unsynced = 0
+        self.lock = threading.Lock()
+        self.resumed = self.load()
+        self.journal = open(filename, 'a')
+        if not self.resumed:
+            self.write([{'job': job}])
+
+    def load(self):
+        """
+            Reads the journal of an earlier run of the same job.
+
+            Returns
+            -------
+            resumed: boolean
+                Whether there was a journal of this job to continue.
+        """
+        if not os.path.exists(self.filename):
+            return False
+        with open(self.filename, 'r+') as fd:
+            lines = fd.read().split('\n')
+            try:
+                header = json.loads(lines[0])
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get('job') != self.job:
+                fd.truncate(0)
+                return False
+            good_length = len(lines[0]) + 1
+            for line in lines[1:]:
+                try:
+                    kind, key, value = json.loads(line)
+                except ValueError:
+                    break  # The last line of a crashed run may be cut off halfway.
+                self.entries[(encoded(kind), encoded(key))] = encoded(value)
+                good_length += len(line) + 1
+            # Cutting off what could not be read, such that the next lines do not end up behind it.
+            fd.truncate(good_length)
+        return True
+
+    def done(self, kind, key):
+        """
+            Whether the work of this kind, like 'player' or 'team', with this key was finished.
+        """
+        with self.lock:
+            return (kind, key) in self.entries
+
+    def get(self, kind, key, default=None):
+        """
+            The value that was recorded for the work, like the uid of a competition.
+        """
+        with self.lock:
+            return self.entries.get((kind, key), default)
+
+    def record(self, kind, key, value=True):
+        self.record_batch([(kind, key, value)])
+
+    def record_batch(self, entries):
+        """
+            Writes finished work to the journal.
+
+            Parameters
+            ----------
+            entries: list<(string, key, value)>
+                The kind of the work, its key and the value to remember, True when there is nothing to remember.
+        """
+        with self.lock:
+            for kind, key, value in entries:
+                self.entries[(kind, key)] = value
+            self.write([[kind, key, value] for kind, key, value in entries])
+
+    def write(self, lines):
+        """
+            Appends lines to the journal, the lock has to be held.
+        """
+        self.journal.write(''.join(json.dumps(line) + '\n' for line in lines))
+        self.journal.flush()
+        self.unsynced += len(lines)
+        if self.unsynced >= self.sync_every:
+            os.fsync(self.journal.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        with self.lock:
+            if not self.journal.closed:
+                self.journal.flush()
+                os.fsync(self.journal.fileno())
+                self.journal.close()
+
+    def finish(self):
+        """
+            The job is done, the next run starts from the beginning again.
+        """
+        self.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
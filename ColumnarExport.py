@@ -0,0 +1,330 @@
+import array
+import datetime
+import json
+import mmap
+import os
+import struct
+import tempfile
+
+from AbstractInputOutput import AbstractInputOutput
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+    Exports the scraped matches and ratings column by column into a compact binary file, for analysis of many
+    players at once.
+
+    Dates are stored as days since 1970-01-01 and ratings as floats, in typed arrays. Texts that repeat a lot, like
+    the names of events, teams and players, are stored once in a dictionary while the column only holds their number
+    in that dictionary. Loading maps the file into memory, such that no column is read from disk before it is used.
+
+    Requires numpy.
+
+    Layout of the file
+    ----------
+    magic        8 bytes, KNLTBCOL
+    header size  4 bytes, unsigned little endian
+    header       json describing every table, column and dictionary and where its array starts in the file
+    arrays       the offsets in the header count from the first multiple of 8 after the header, every array starts
+                 at a multiple of 8 bytes
+"""
+
+magic = 'KNLTBCOL'
+missing_date = -2 ** 31  # Stored for dates that could not be read.
+typecodes = {'<i4': 'i', '|u1': 'B', '<f4': 'f'}  # The arrays in which the columns are collected, by their type.
+epoch = datetime.date(1970, 1, 1).toordinal()
+parsed_dates = {}  # Dates repeat a lot, so every date is only parsed once.
+
+"""
+    The columns of every table, with the type of their array or the dictionary they are encoded with.
+    Columns that share a dictionary can be compared by their numbers, a team has the same number as home and out team.
+"""
+match_columns = [
+    ('knltb_number', '<i4'), ('date', '<i4'), ('tournament', '|u1'), ('match_type', 'types'),
+    ('event_name', 'events'), ('category', 'categories'), ('club_home', 'teams'), ('club_out', 'teams'),
+    ('added_rating', '<f4'), ('rating_at_start_match', '<f4'), ('home_player', '|u1'), ('partner', 'players'),
+    ('opponent1', 'players'), ('opponent2', 'players'), ('who_won', 'results'), ('match_result', 'scores'),
+]
+rating_columns = [
+    ('knltb_number', '<i4'), ('act_e_rating', '<f4'), ('act_d_rating', '<f4'), ('old_e_rating', '<f4'),
+    ('old_d_rating', '<f4'), ('year_e_rating', '<f4'), ('year_d_rating', '<f4'),
+]
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError('The columnar export needs numpy, install it with: pip install numpy')
+
+
+def parse_date(date):
+    """
+        Days since 1970-01-01 of a date like 24-06-2017, missing_date when it is not a date.
+    """
+    if date not in parsed_dates:
+        try:
+            day, month, year = [int(part) for part in date.strip().split('-')]
+            parsed_dates[date] = datetime.date(year, month, day).toordinal() - epoch
+        except (ValueError, AttributeError):
+            parsed_dates[date] = missing_date
+    return parsed_dates[date]
+
+
+def data_start(header_size):
+    """
+        Where the arrays start, the first multiple of 8 after the header.
+    """
+    start = len(magic) + 4 + header_size
+    return start + -start % 8
+
+
+def parse_rating(rating):
+    """
+        The rating as a float, for example +0.0123 or 8,2719. Not a number when there is no rating.
+    """
+    if isinstance(rating, float):
+        return rating  # Already a number, see Records.
+    try:
+        return float(rating.replace(',', '.'))
+    except (ValueError, AttributeError):
+        return float('nan')
+
+
+class Dictionary(object):
+    """
+        Gives every distinct text a number, in the order they are first seen. 0 is reserved for no value.
+    """
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0, False: 0, '': 0}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ColumnarExport(object):
+    """
+        Collects matches and ratings column by column, until they are written with save.
+    """
+    def __init__(self):
+        require_numpy()
+        self.dictionaries = {}
+        self.types = {'matches': dict(match_columns), 'ratings': dict(rating_columns)}
+        # Collecting in arrays instead of lists, such that a value takes 4 bytes instead of a Python object.
+        self.columns = {table: {name: array.array(typecodes.get(kind, 'I')) for name, kind in types.items()}
+                        for table, types in self.types.items()}
+
+    def dictionary(self, name):
+        if name not in self.dictionaries:
+            self.dictionaries[name] = Dictionary()
+        return self.dictionaries[name]
+
+    def add_matches(self, knltb_number, matches):
+        """
+            Parameters
+            ----------
+            knltb_number: int
+                The KNLTB number of the person that played the matches.
+            matches: iterable<MatchInfo>
+                The matches as returned by PlayerScraper.get_player_matches.
+        """
+        columns = self.columns['matches']
+        encoders = {name: self.dictionary(kind).encode for name, kind in match_columns if kind[0] not in '<|'}
+        for match in matches:
+            columns['knltb_number'].append(knltb_number)
+            columns['date'].append(parse_date(match.date))
+            columns['tournament'].append(match.tournament_or_competition is True)
+            columns['home_player'].append(match.home_player is True)
+            columns['added_rating'].append(parse_rating(match.added_rating))
+            columns['rating_at_start_match'].append(parse_rating(match.rating_at_start_match))
+            for name, encode in encoders.items():
+                columns[name].append(encode(getattr(match, name)))
+
+    def add_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating, year_e_rating,
+                   year_d_rating):
+        columns = self.columns['ratings']
+        columns['knltb_number'].append(knltb_number)
+        for name, rating in [('act_e_rating', act_e_rating), ('act_d_rating', act_d_rating),
+                             ('old_e_rating', old_e_rating), ('old_d_rating', old_d_rating),
+                             ('year_e_rating', year_e_rating), ('year_d_rating', year_d_rating)]:
+            columns[name].append(parse_rating(rating))
+
+    def arrays(self):
+        """
+            Every array that ends up in the file, by the name it is described with in the header.
+        """
+        arrays = {}
+        for table, columns in self.columns.items():
+            for name, values in columns.items():
+                kind = self.types[table][name]
+                if kind[0] in '<|':
+                    arrays[table + '.' + name] = numpy.frombuffer(values, dtype=kind) if values else \
+                        numpy.zeros(0, dtype=kind)
+                else:
+                    codes = numpy.frombuffer(values, dtype='<u4') if values else numpy.zeros(0, dtype='<u4')
+                    size = len(self.dictionary(kind).values)
+                    arrays[table + '.' + name] = codes.astype('<u2') if size < 2 ** 16 else codes
+        for name, dictionary in self.dictionaries.items():
+            encoded = [value.encode('utf-8') if isinstance(value, unicode) else str(value or '')
+                       for value in dictionary.values]
+            arrays[name + '.offsets'] = numpy.cumsum([0] + [len(value) for value in encoded], dtype='<i8')
+            arrays[name + '.data'] = numpy.frombuffer(''.join(encoded) or '\0', dtype='|u1')
+        return arrays
+
+    def save(self, filename):
+        """
+            Writes everything that was collected to filename, through a temporary file such that a reader never
+            maps half a file.
+        """
+        arrays = self.arrays()
+        header = {'tables': {table: {'rows': len(columns['knltb_number']),
+                                     'columns': {name: self.types[table][name] for name in columns}}
+                             for table, columns in self.columns.items()},
+                  'dictionaries': sorted(self.dictionaries), 'arrays': {}}
+        offset = 0
+        for name in sorted(arrays):
+            header['arrays'][name] = {'dtype': arrays[name].dtype.str, 'offset': offset, 'count': len(arrays[name])}
+            offset += (arrays[name].nbytes + 7) // 8 * 8
+        encoded_header = json.dumps(header)
+        start = data_start(len(encoded_header))
+
+        handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+        with os.fdopen(handle, 'wb') as fd:
+            fd.write(magic + struct.pack('<I', len(encoded_header)) + encoded_header)
+            for name in sorted(arrays):
+                fd.seek(start + header['arrays'][name]['offset'])
+                fd.write(arrays[name].tostring())
+            fd.truncate(start + offset)
+        os.rename(temporary_filename, filename)
+
+
+class DictionaryColumn(object):
+    """
+        A column of which the values are numbers in a dictionary of texts.
+    """
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        return self.values[self.codes[idx]]
+
+    def code(self, value):
+        """
+            The number of value in the dictionary, such that rows can be selected with column.codes == code.
+            -1 when the value does not occur.
+        """
+        try:
+            return self.values.index(value)
+        except ValueError:
+            return -1
+
+    def decode(self):
+        return [self.values[code] for code in self.codes]
+
+
+class ColumnarFile(object):
+    """
+        A file written by ColumnarExport, mapped into memory. The arrays of the columns point straight into the
+        mapped file, so loading only reads the header and the dictionaries.
+    """
+    def __init__(self, filename):
+        require_numpy()
+        with open(filename, 'rb') as fd:
+            self.map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(magic)] != magic:
+            raise ValueError('{} is not a columnar export'.format(filename))
+        header_size = struct.unpack('<I', self.map[len(magic):len(magic) + 4])[0]
+        self.header = json.loads(self.map[len(magic) + 4:len(magic) + 4 + header_size])
+        self.start = data_start(header_size)
+        self.dictionaries = {}
+        for name in self.header['dictionaries']:
+            offsets = self.array(name + '.offsets')
+            data = self.array(name + '.data').tostring()
+            self.dictionaries[name] = [None] + [data[offsets[idx]:offsets[idx + 1]]
+                                                for idx in range(1, len(offsets) - 1)]
+
+    def array(self, name):
+        description = self.header['arrays'][name]
+        return numpy.frombuffer(self.map, dtype=description['dtype'], count=description['count'],
+                                offset=self.start + description['offset'])
+
+    def rows(self, table):
+        return self.header['tables'][table]['rows']
+
+    def column(self, table, name):
+        """
+            Returns
+            -------
+            column: numpy.ndarray or DictionaryColumn
+                The typed array of the column, or the numbers and dictionary of a column with texts.
+        """
+        kind = self.header['tables'][table]['columns'][name]
+        codes = self.array(table + '.' + name)
+        if kind[0] in '<|':
+            return codes
+        return DictionaryColumn(codes, self.dictionaries[kind])
+
+    def dates(self, table='matches'):
+        """
+            The dates of the table as numpy dates, not a time for dates that could not be read.
+        """
+        days = self.column(table, 'date')
+        dates = days.astype('datetime64[D]')
+        dates[days == missing_date] = numpy.datetime64('NaT')
+        return dates
+
+    def close(self):
+        self.map.close()
+
+
+class ColumnarIO(AbstractInputOutput):
+    """
+        An IO that collects the ratings and matches of the players and writes them as a columnar export when the
+        scraper is done.
+    """
+    def __init__(self, filename="knltb_matches.col", knltb_numbers=None, want_match_results=True, debug=False):
+        self.filename = filename
+        self.knltb_numbers = knltb_numbers or []
+        self.want_match_results = want_match_results
+        self.debug = debug
+        self.export = ColumnarExport()
+
+    def get_settings(self):
+        return self.want_match_results, self.debug
+
+    def get_players(self):
+        return self.knltb_numbers
+
+    def get_competition(self):
+        return []
+
+    def set_player_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
+                          year_e_rating, year_d_rating):
+        self.export.add_rating(knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating, year_e_rating,
+                               year_d_rating)
+
+    def set_player_match_results(self, knltb_number, matches):
+        self.export.add_matches(knltb_number, matches)
+
+    def stream_match_results(self, match_results):
+        for knltb_number, matches in match_results:
+            self.export.add_matches(knltb_number, matches)
+
+    def invalid_player(self, knltb_number):
+        pass
+
+    def set_competition(self, season, own_teams, comp_url, comp_info, comp_results, comp_play_times):
+        pass
+
+    def flush(self):
+        self.export.save(self.filename)
@@ -0,0 +1,100 @@
+import bisect
+import json
+import os
+import tempfile
+import time
+
+"""
+    An index of every competition on the public KNLTB site, from its name to its unique identifier, kept on the file
+    system between runs. The search page with all competitions only has to be loaded when the index is older than its
+    time to live, after that finding a competition does not need the site at all.
+"""
+
+
+class CompetitionIndex(object):
+    def __init__(self, filename="competition_index.json", ttl=7 * 24 * 3600):
+        """
+            Parameters
+            ----------
+            filename: string
+                The file in which the index is kept between runs, None to keep it in memory only.
+            ttl: int
+                Seconds after which the index is considered out of date and should be built again.
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.built_at = 0
+        self.competitions = {}
+        self.names = []
+        if filename is not None and os.path.exists(filename):
+            self.load()
+
+    @property
+    def stale(self):
+        return not self.competitions or time.time() - self.built_at > self.ttl
+
+    def update(self, competitions):
+        """
+            Replaces the index with the competitions of a freshly loaded search page and stores it.
+
+            Parameters
+            ----------
+            competitions: dict<string, dict>
+                For every competition name a dict with its 'uid' and its 'season'.
+
+            Raises errors
+            -------
+            ValueError, when there are no competitions. The page did not load correctly, the index is left as it is.
+        """
+        if not competitions:
+            raise ValueError('The page with all competitions does not list any competition')
+        self.competitions = dict(competitions)
+        self.names = sorted(self.competitions)
+        self.built_at = time.time()
+        if self.filename is not None:
+            self.save()
+
+    def lookup(self, competition_name):
+        """
+            Returns
+            -------
+            competition: dict
+                The 'uid' and 'season' of the competition with exactly this name, None when there is none.
+        """
+        return self.competitions.get(competition_name)
+
+    def starting_with(self, prefix):
+        """
+            Returns
+            -------
+            competitions: list<(string, dict)>
+                The name, uid and season of every competition of which the name starts with prefix, sorted by name.
+        """
+        start = bisect.bisect_left(self.names, prefix)
+        found = []
+        for name in self.names[start:]:
+            if not name.startswith(prefix):
+                break
+            found.append((name, self.competitions[name]))
+        return found
+
+    def load(self):
+        try:
+            with open(self.filename, 'r') as fd:
+                stored = json.load(fd)
+        except (IOError, ValueError):
+            return
+        # json gives back unicode, while the names in the pages and in the IO are utf-8 encoded strings.
+        self.competitions = {}
+        for name, competition in stored['competitions'].items():
+            self.competitions[name.encode('utf-8')] = {key: value.encode('utf-8')
+                                                       for key, value in competition.items()}
+        self.names = sorted(self.competitions)
+        self.built_at = stored['built_at']
+
+    def save(self):
+        # Writing to a temporary file first, such that an interrupted run never leaves half an index behind.
+        handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)))
+        with os.fdopen(handle, 'w') as fd:
+            json.dump({'built_at': self.built_at, 'competitions': self.competitions}, fd)
+        os.rename(temporary_filename, self.filename)
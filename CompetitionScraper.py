@@ -1,10 +1,24 @@
 from collections import namedtuple
 
-import requests
+import difflib
+import itertools
+import re
+import sys
 import time
-import mmap
 import pprint
-import os
+import threading
+import Queue
+import TerminalColors as BgColors
+import RateLimiter
+import HttpSession
+import PageArchive
+import CompetitionIndex
+import Checkpoint
+import Instrumentation
+import OutputBuffer
+import Records
+import ParserBackends
+from LazyProperty import lazy_property
 
 """
     Please specify here which InputOutput you will be using.
@@ -13,13 +27,41 @@ import os
      and what your html_page_directory should be.
 """
 # import YourIO as InputOutput
-# io = InputOutput.YourIO()
+# io_class = InputOutput.YourIO
+# import PageCache
+# HttpSession.page_cache = PageCache.PageCache("cache/")  # Reuses pages that did not change since the last run.
 import GeneralIO as InputOutput
-io = InputOutput.GeneralIO()
+io_class = InputOutput.GeneralIO  # Made on first use by get_io, not when this file is imported.
+io = None
 
 debug = False  # Whether you want verbose information.
 html_page_directory = "pages/"  # Which dictionary the html files should end up in.
+archive_pages = False  # Whether every loaded page is also written to the html_page_directory, in the background.
 delay_time = 0.75  # Time between page loads. The lower, the more risky.. Keep it at at least 0.5!
+adaptive_pacing = False  # Pace page loads by how the site responds instead of delay_time, see RateLimiter.py.
+pacing_floor = 0.2  # Pages per second the adaptive pacing never goes below.
+pacing_ceiling = 4.0  # Pages per second the adaptive pacing never goes above.
+workers = 1  # Maximum amount of page loads in flight at the same time. 1 is the old sequential behaviour.
+lookup_workers = 4  # Associations of which the teams are looked up at the same time, never more than workers.
+base_url = "http://publiek.mijnknltb.nl/"  # Where the public KNLTB site lives.
+io_lock = threading.Lock()  # The IO is not expected to be thread safe, so only one worker at a time may call it.
+compact_records = False  # Share repeated texts between teams and store numbers as numbers, for large crawls.
+parser_backend = 'find'  # How pages are read: find, html_parser or lxml, see ParserBackends.py.
+share_poules = True  # Load and parse a poule once, also when several own teams play in it, see PouleCache.
+io_batch_size = 1  # Amount of teams collected before they are handed to the IO in one call, 1 hands over each one.
+checkpoint_file = None  # Set to a file like "competitions.journal" to continue an interrupted run, see Checkpoint.py.
+competition_index_file = "competition_index.json"  # Where the names and uids of all competitions are kept.
+competition_index_ttl = 7 * 24 * 3600  # Seconds before the list of all competitions is loaded again.
+instrumentation = False  # Time every stage of a page and write the numbers to metrics_file, see Instrumentation.py.
+metrics_file = "metrics"  # Gets a .json and a .prom extension, the latter can be picked up by Prometheus.
+profile_run = False  # Run under cProfile and write the functions that took the most time to profile_file.
+profile_file = "profile.txt"  # Where the profile of the run ends up.
+
+competition_index = None
+competition_index_refreshed = False  # Whether the competition index was built during this run.
+competition_index_lock = threading.Lock()
+page_limiter = None
+page_limiter_lock = threading.Lock()
 """
     Specifying the named tuples which will contain all the data.
     This is also how the data will be fed onto the IO(input output class).
@@ -30,11 +72,10 @@ TeamResult = namedtuple('TeamResult', ['Name', 'Position', 'TimesPlayed', 'Won',
 TeamPlanning = namedtuple("TeamPlanning", ["OwnTeamName", "Opponent", "PlayAtHome", "DayCount", "Date",
                                            "Result", "Status", "CatchUp", "Commencement", "Present",
                                            "CourtType", "Comments"])
-
-"""
-    Global variable for keeping track of all the teams of the specific club.
-"""
-all_friendly_teams_in_this_competition = []
+CompactTeamInfo = Records.compact(TeamInfo, 'CompactTeamInfo')
+CompactTeamResult = Records.compact(TeamResult, 'CompactTeamResult',
+                                    ints=['Position', 'TimesPlayed', 'Won', 'Draw', 'Lost', 'PointsWon', 'PointsLost'])
+CompactTeamPlanning = Records.compact(TeamPlanning, 'CompactTeamPlanning', ints=['DayCount'])
 
 """
     This python file returns the requested scraped info for all competition teams of your club
@@ -50,33 +91,21 @@ all_friendly_teams_in_this_competition = []
 """
 
 
-def load_request_into_file(request, filename):
+def get_io():
     """
-        Loading a specific html page request into a file.
-
-        Parameters
-        ----------
-        request: request
-            The request of the specific page.
-        filename: string
-            The name the file should be
-
-        Returns
-        -------
-        mmap.mmap: mmap.mmap file
-            The open file.
+        The IO the competitions are read from and handed to, made out of io_class the first time it is needed.
+        Set io to use an IO that is already made.
     """
-    with open(filename, 'wb') as fd:
-        for chunk in request.iter_content(chunk_size=128):
-            fd.write(chunk)
-    openfile = open(filename, 'r')
-    return mmap.mmap(openfile.fileno(), 0, access=mmap.ACCESS_READ)
+    global io
+    if io is None:
+        io = io_class()
+    return io
 
 
 def find_competition_uid(competition_name):
     """
         Given a specific competition_name, find the unique identifier such that we can find all the information of the
-        team afterwards.
+        team afterwards. See find_competition_uids.
 
         Parameters
         ----------
@@ -92,20 +121,110 @@ def find_competition_uid(competition_name):
         -------
         NameError, when the specified competition could not be found.
     """
-    url = "http://publiek.mijnknltb.nl/StandenEnUitslagenZoeken.aspx"
-    r = requests.get(url, stream=True)
+    return find_competition_uids([competition_name])[competition_name]
+
+
+def find_competition_uids(competition_names):
+    """
+        Finds the unique identifiers of many competitions at once.
+        The identifiers are looked up in the competition index, which only loads the page with all competitions when it
+        is out of date, or once when some of the competitions are not in there yet.
+        A name that is not complete is accepted when exactly one competition starts with it.
+
+        Parameters
+        ----------
+        competition_names: list<string>
+            The names of the competitions. Example = ["Winteroutdoorcompetitie Zuid 2016/2017"]
+
+        Returns
+        -------
+        uids: dict<string, string>
+            The unique identifier of every competition, by name.
+
+        Raises errors
+        -------
+        NameError, when some of the specified competitions could not be found. All of them are named.
+    """
+    index, refreshed = get_competition_index()
+    competitions = {name: lookup_competition(index, name) for name in set(competition_names)}
+    missing = [name for name, competition in competitions.items() if competition is None]
+    if missing and not refreshed:
+        # The competitions might have been added after the index was built.
+        index, refreshed = get_competition_index(force_refresh=True)
+        competitions.update({name: lookup_competition(index, name) for name in missing})
+        missing = [name for name in missing if competitions[name] is None]
+    if missing:
+        errors = []
+        for name in sorted(missing):
+            suggestions = difflib.get_close_matches(name, index.names, 3)
+            errors.append('Specified competition, ' + name + ', does not exist!' +
+                          (' Did you mean: ' + ', '.join(suggestions) + '?' if suggestions else ''))
+        raise NameError(' '.join(errors))
+    return {name: competition['uid'] for name, competition in competitions.items()}
+
+
+def lookup_competition(index, competition_name):
+    """
+        The competition with exactly this name, otherwise the only competition that starts with this name.
+    """
+    competition = index.lookup(competition_name)
+    if competition is None:
+        starting_with = index.starting_with(competition_name)
+        if len(starting_with) == 1:
+            competition = starting_with[0][1]
+    return competition
+
+
+def get_competition_index(force_refresh=False):
+    """
+        Returns the competition index, building it from the page with all competitions when it is out of date.
+
+        Parameters
+        ----------
+        force_refresh: boolean
+            Whether the index is built again even when it is not out of date.
+
+        Returns
+        -------
+        index: CompetitionIndex.CompetitionIndex
+            The index of all competitions.
+        refreshed: boolean
+            Whether the index was built during this run.
+    """
+    global competition_index, competition_index_refreshed
+    with competition_index_lock:
+        if competition_index is None:
+            competition_index = CompetitionIndex.CompetitionIndex(competition_index_file, competition_index_ttl)
+        if competition_index.stale or force_refresh:
+            url = base_url + "StandenEnUitslagenZoeken.aspx"
+            s = HttpSession.fetch(url, page_type='competition_search').content
+            competition_index.update({name: {'uid': uid, 'season': get_current_season(name)}
+                                      for name, uid in get_all_competitions(s).items()})
+            competition_index_refreshed = True
+        return competition_index, competition_index_refreshed
 
-    s = load_request_into_file(r, html_page_directory+'/knltb_competition_page.html')
 
-    current_length = s.find(competition_name)
-    current_length = s.rfind('value="', 0, current_length)
-    current_length += len('value="')
-    begin_length = current_length
-    stop_length = s.find('">', begin_length, begin_length + 200)
-    uid = s[begin_length:stop_length]
-    if len(uid) < 5:
-        raise NameError('Specified competition, '+competition_name+', does not exist!')
-    return s[begin_length:stop_length]
+competition_option_pattern = re.compile(r'value="([^"]{5,200}?)">([^<]+)<')
+
+
+def get_all_competitions(s):
+    """
+        Reads every competition from the page with all competitions.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page.
+
+        Returns
+        -------
+        competitions: dict<string, string>
+            The unique identifier of every competition, by name.
+    """
+    competitions = {}
+    for uid, competition_name in competition_option_pattern.findall(s):
+        competitions[competition_name.strip()] = uid
+    return competitions
 
 
 def get_all_teams_in_competition(competition_uid, association):
@@ -129,11 +248,9 @@ def get_all_teams_in_competition(competition_uid, association):
         -------
         NameError, when there was not a single team to be found
     """
-    url = "http://publiek.mijnknltb.nl/StandenEnUitslagenZoeken.aspx"
+    url = base_url + "StandenEnUitslagenZoeken.aspx"
     payload = {'id': competition_uid, 'vereniging': association}
-    r = requests.get(url, stream=True, params=payload)
-
-    s = load_request_into_file(r, html_page_directory+'/knltb_competition_page.html')
+    s = HttpSession.fetch(url, payload, 'association_teams').content
 
     competition_links = []
     search_string = "<a href=\"StandenEnUitslagen.aspx?id="
@@ -158,6 +275,30 @@ def get_current_season(competition_name):
         return "Zomer"
 
 
+def load_team_page(competition_team_uid, association):
+    """
+        Given a specific competition_team_uid and association, we load the page with all information of this specific
+        teams competition.
+
+        Parameters
+        ----------
+        competition_team_uid: string
+            Containing the unique identifier of a specific competition for a given team.
+        association: string
+            Containing the name of your association
+
+        Returns
+        -------
+        team_page: TeamPage
+            The downloaded page, of which the sections are parsed when they are asked for.
+    """
+    url = base_url + "StandenEnUitslagen.aspx"
+    payload = {'id': competition_team_uid}
+    r = HttpSession.fetch(url, payload, 'standings')
+    print("Fetching for the next team at this link :" + r.url)
+    return TeamPage(r.content, association, r.url)
+
+
 def get_team_info(competition_team_uid, association):
     """
         Given a specific competition_team_uid and association, we find all information of this specific teams
@@ -178,17 +319,27 @@ def get_team_info(competition_team_uid, association):
             Contains information of which league and more.
         team_results_info:
             Information of what the current distribution is between how much they are located in the competition ATM.
-        s: mmap.mmap file
-            The open file.
+        s: string
+            The downloaded HTML page.
     """
-    url = "http://publiek.mijnknltb.nl/StandenEnUitslagen.aspx"
-    payload = {'id': competition_team_uid}
-    r = requests.get(url, stream=True, params=payload)
-    print("Fetching for the next team at this link :" + r.url)
-    team_link = r.url
+    team_page = load_team_page(competition_team_uid, association)
+    return team_page.url, team_page.info, team_page.standings, team_page.s
 
-    s = load_request_into_file(r, html_page_directory+'/knltb_competition_page.html')
 
+def get_team_information(s):
+    """
+        Finding out in which competition the team plays.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page.
+
+        Returns
+        -------
+        team_information: NamedTuple TeamInfo
+            See find_out_what_for_competition_this_is.
+    """
     current_find_result = s.find("<div class=\"knltb-public-label\">") + len("<div class=\"knltb-public-label\">")
     current_find_result = s.find("<div class=\"knltb-public-label\">", current_find_result) + \
         len("<div class=\"knltb-public-label\">")
@@ -197,7 +348,25 @@ def get_team_info(competition_team_uid, association):
 
     if debug:
         pprint.pprint(team_information)
+    return team_information
+
+
+def get_team_results(s, association):
+    """
+        Getting the standings of the competition the team plays in.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page.
+        association: string
+            Containing the name of your association
 
+        Returns
+        -------
+        team_results_info: List of NamedTuples TeamResult
+            Information of what the current distribution is between how much they are located in the competition ATM.
+    """
     team_results_info = []
     search_string_for_single_team = "<tr bgcolor="
     current_find_result = s.find(search_string_for_single_team)
@@ -208,8 +377,6 @@ def get_team_info(competition_team_uid, association):
         total_string = s[current_find_result:end_find_result].strip()
         position = total_string[0:1]
         team_name = total_string[2:]
-        if association in team_name:
-            all_friendly_teams_in_this_competition.append(team_name)
         times_played, current_find_result = get_next_column_value(s, current_find_result)
         times_won, current_find_result = get_next_column_value(s, current_find_result)
         times_draw, current_find_result = get_next_column_value(s, current_find_result)
@@ -222,15 +389,15 @@ def get_team_info(competition_team_uid, association):
         else:
             own_team = False
 
-        result_team = TeamResult(team_name, position, times_played, times_won, times_draw, times_lost,
-                                 points_won, points_lost, own_team)
+        result_team = (CompactTeamResult if compact_records else TeamResult)(
+            team_name, position, times_played, times_won, times_draw, times_lost, points_won, points_lost, own_team)
         if debug:
             pprint.pprint(result_team)
 
         team_results_info.append(result_team)
         current_find_result = s.find(search_string_for_single_team, current_find_result)
 
-    return team_link, team_information, team_results_info, s
+    return team_results_info
 
 
 def get_next_column_value(s, begin_length, identifier='<td class="crm-wp-cell" width="30">',
@@ -240,8 +407,8 @@ def get_next_column_value(s, begin_length, identifier='<td class="crm-wp-cell" w
 
         Parameters
         ----------
-        s: mmap.mmap file
-            The open file.
+        s: string
+            The downloaded HTML page.
         begin_length: int
             Current position in the document
         identifier: string
@@ -267,10 +434,8 @@ def find_out_what_for_competition_this_is(s):
 
         Parameters
         ----------
-        s: mmap.mmap file
-            The open file but scoped to most info of the team.
-        out_of_scope_s: mmap.mmap file
-            The open file but scoped to the hole file.
+        s: string
+            The downloaded HTML page but scoped to most info of the team.
 
         Returns
         -------
@@ -325,7 +490,8 @@ def find_out_what_for_competition_this_is(s):
 
     full_day = s[:begin_of_string - 1]
 
-    team_information = TeamInfo(full_day, day, type_comp, comp_class, original_s)
+    team_information = (CompactTeamInfo if compact_records else TeamInfo)(full_day, day, type_comp, comp_class,
+                                                                          original_s)
     return team_information
 
 
@@ -335,8 +501,8 @@ def get_team_planning(s, association):
 
         Parameters
         ----------
-        s: mmap.mmap file
-            The open file.
+        s: string
+            The downloaded HTML page.
         association: string
             Containing the name of your association
 
@@ -376,8 +542,9 @@ def get_team_planning(s, association):
         if new_day_index < current_index:
             current_day_index = new_day_index
 
-        planning = TeamPlanning(own_team, opponent, play_at_home, day_count, date, result_day, status, catch_up,
-                                commencement, present, court_type, comment)
+        planning = (CompactTeamPlanning if compact_records else TeamPlanning)(
+            own_team, opponent, play_at_home, day_count, date, result_day, status, catch_up, commencement, present,
+            court_type, comment)
 
         if debug:
             pprint.pprint(planning)
@@ -385,50 +552,518 @@ def get_team_planning(s, association):
         team_planning.append(planning)
     return team_planning
 
-try:
+def get_own_teams(team_results_info):
     """
-        The main loop that combines it all
+        Function that gets the names of all teams of the association that play in this competition.
 
-        We start out by checking if the directory exists on the file system, if not we create it.
-        Then we follow by getting the main page of competition information.
-        Followed by finding the required competition seasons.
-        Then for each competition team:
-            We fetch the page
-            We get all the information
-            We send this information to the input output
-        Finally we say bye bye
+        Parameters
+        ----------
+        team_results_info: List of NamedTuples TeamResult
+            The standings of the competition.
 
-        Of course you should be able to interrupt with your keyboard, hence by Ctrl+C you can exit the program early.
+        Returns
+        -------
+        own_teams: list<string>
+            The names of the teams of the association.
     """
-    if not os.path.exists(html_page_directory):
-        os.makedirs(html_page_directory)
+    return [team_result.Name for team_result in team_results_info if team_result.OwnTeam]
 
-    competitions = io.get_competition()
-    # Competitions has a structure of [0] - name, [1] - club
+
+class TeamPage(object):
+    """
+        One downloaded page of a competition team. Every section is parsed the first time it is asked for and kept
+        afterwards, such that the page is never scanned twice for the same information.
+    """
+    def __init__(self, s, association, url=None):
+        """
+            Parameters
+            ----------
+            s: string
+                The downloaded HTML page.
+            association: string
+                Containing the name of your association
+            url: string
+                Contains the link to the public KNLTB site for this teams competition
+        """
+        self.s = s
+        self.association = association
+        self.url = url
+
+    @lazy_property
+    def info(self):
+        """
+            See get_team_information.
+        """
+        return ParserBackends.get(parser_backend).team_information(self.s)
+
+    @lazy_property
+    def standings(self):
+        """
+            See get_team_results.
+        """
+        return ParserBackends.get(parser_backend).team_results(self.s, self.association)
+
+    @lazy_property
+    def planning(self):
+        """
+            See get_team_planning.
+        """
+        return ParserBackends.get(parser_backend).team_planning(self.s, self.association)
+
+    @lazy_property
+    def own_teams(self):
+        """
+            See get_own_teams.
+        """
+        return get_own_teams(self.standings)
+
+
+class PouleCache(object):
+    """
+        Remembers the teams and poules of one run, such that a poule in which several own teams play is parsed
+        once. The own_teams passed on with it name all own teams in the poule.
+        Teams are remembered by their uid, such that a uid that is linked to more than once is only loaded and passed
+        on once. Poules are remembered by their name and the teams that play in them, such that a poule that is
+        reached through another uid is loaded, but its planning is not parsed again. It is still passed on with the
+        url of that uid, such that the IO hears of every own team.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.teams = set()
+        self.poules = {}
+
+    def claim_team(self, association, team):
+        """
+            Returns
+            -------
+            first: boolean
+                Whether the team was not claimed before during this run, only then its page should be loaded.
+        """
+        with self.lock:
+            if (association, team) in self.teams:
+                return False
+            self.teams.add((association, team))
+            return True
+
+    def poule(self, team_page):
+        """
+            Returns
+            -------
+            poule: (list<string>, TeamInfo, list<TeamPlanning>)
+                The own teams, information and planning of the poule of this page, as parsed from the first page of
+                the poule during this run. Only these are kept, not the page they were parsed from.
+        """
+        key = (team_page.association, team_page.info.Name, tuple(sorted(team.Name for team in team_page.standings)))
+        with self.lock:
+            poule = self.poules.get(key)
+        if poule is None:
+            # Parsed outside the lock, when two pages of a poule arrive at the same time the first one is kept.
+            poule = (team_page.own_teams, team_page.info, team_page.planning)
+            with self.lock:
+                poule = self.poules.setdefault(key, poule)
+        return poule
+
+
+def scrape_team(competition_name, association, team, output=None, poules=None):
+    """
+        Fetching and parsing the page of a single competition team and passing it on to the IO.
+
+        Parameters
+        ----------
+        competition_name: string
+            Containing the string of the competition. Example = "Winteroutdoorcompetitie Zuid 2016/2017"
+        association: string
+            Containing the name of your association
+        team: string
+            Containing the unique identifier of a specific competition for a given team.
+        output: OutputBuffer.OutputBuffer
+            Collects the results for the IO, by default they are handed over immediately.
+        poules: PouleCache
+            The poules of this run, the page is not parsed further when its poule already was.
+    """
+    if output is None:
+        output = OutputBuffer.OutputBuffer(get_io(), 1, io_lock)
+    current_season_name = get_current_season(competition_name)
+    team_page = load_team_page(team, association)
+    with Instrumentation.stage('parse'):
+        if poules is None:
+            own_teams, info, planning = team_page.own_teams, team_page.info, team_page.planning
+        else:
+            own_teams, info, planning = poules.poule(team_page)
+            if info is not team_page.info:
+                Instrumentation.count('shared_poules')
+    Instrumentation.count('teams')
+    Instrumentation.count('matches', len(planning))
+    output.add_competition(current_season_name, own_teams, team_page.url, info, team_page.standings, planning)
+
+
+def wait_between_pages():
+    """
+        Waiting delay_time after a page, unless the page loads are paced by how the site responds, see
+        adaptive_pacing.
+    """
+    if HttpSession.pacer is None:
+        time.sleep(delay_time)
+
+
+def open_checkpoint(competitions):
+    """
+        The journal of this run when a checkpoint_file is set, which continues the journal of an interrupted run of
+        the same competitions.
+    """
+    if checkpoint_file is None:
+        return None
+    checkpoint = Checkpoint.Checkpoint(checkpoint_file, Checkpoint.job_key(
+        'competitions', [competition_season[:2] for competition_season in competitions]))
+    if checkpoint.resumed:
+        print('Continuing the interrupted run of {}'.format(checkpoint_file))
+    return checkpoint
+
+
+def resolve_competitions(competitions, checkpoint):
+    """
+        Adds the uid of the competition to every competition_season, as found by an interrupted run or else by
+        find_competition_uids, which resolves all the others at once.
+
+        Returns
+        -------
+        resumed: boolean
+            Whether all uids came from the checkpoint, such that no page was loaded.
+    """
+    uids = {}
+    if checkpoint is not None:
+        for competition_season in competitions:
+            uid = checkpoint.get('competition', competition_season[0])
+            if uid is not None:
+                uids[competition_season[0]] = uid
+    missing = [competition_season[0] for competition_season in competitions if competition_season[0] not in uids]
+    if missing:
+        found = find_competition_uids(missing)
+        if checkpoint is not None:
+            checkpoint.record_batch([('competition', name, uid) for name, uid in sorted(found.items())])
+        uids.update(found)
     for competition_season in competitions:
-        competition_season.append(find_competition_uid(competition_season[0]))
+        competition_season.append(uids[competition_season[0]])
         print ('Competition season {} has competition uid {}'.format(competition_season[0], competition_season[2]))
-        time.sleep(delay_time)
+    return not missing
 
-    # Competitions has a structure of [0] - name, [1] - club, [2] - uid of competition-season
+
+def find_teams(competition_season, checkpoint):
+    """
+        Adds the uids of the teams of the association in the competition to competition_season, as found by an
+        interrupted run or else by get_all_teams_in_competition.
+
+        Returns
+        -------
+        resumed: boolean
+            Whether the teams came from the checkpoint, such that no page was loaded.
+    """
+    key = competition_season[1] + '|' + competition_season[2]
+    teams = checkpoint.get('teams', key) if checkpoint is not None else None
+    resumed = teams is not None
+    if not resumed:
+        teams = get_all_teams_in_competition(competition_season[2], competition_season[1])
+        if checkpoint is not None:
+            checkpoint.record('teams', key, teams)
+    competition_season.append(teams)
+    return resumed
+
+
+def get_page_limiter():
+    """
+        The token bucket shared by all workers that load pages at the same time, made on first use. Every phase of a
+        run uses the same one, such that its first page is paced against the last page of the phase before it. It is
+        made again when delay_time changed.
+    """
+    global page_limiter
+    with page_limiter_lock:
+        if page_limiter is None or page_limiter.rate != 1.0 / delay_time:
+            page_limiter = RateLimiter.TokenBucket(1.0 / delay_time)
+        return page_limiter
+
+
+def find_all_teams(competitions, checkpoint, amount_of_workers):
+    """
+        Adds the uids of the teams of the association to every competition_season, see find_teams. The teams of
+        amount_of_workers associations are looked up at the same time, while one token bucket shared by these
+        workers makes sure we never load more than one page per delay_time.
+
+        Raises errors
+        -------
+        NameError, when an association has no teams in its competition. The other associations are looked up first.
+    """
+    if amount_of_workers <= 1:
+        for competition_season in competitions:
+            if not find_teams(competition_season, checkpoint):
+                wait_between_pages()
+        return
+
+    limiter = get_page_limiter()
+    remaining = Queue.Queue()
+    errors = []
     for competition_season in competitions:
-        competition_season.append(get_all_teams_in_competition(competition_season[2], competition_season[1]))
-        time.sleep(delay_time)
+        if checkpoint is not None and checkpoint.done('teams', competition_season[1] + '|' + competition_season[2]):
+            find_teams(competition_season, checkpoint)
+        else:
+            remaining.put(competition_season)
+
+    def worker():
+        while True:
+            try:
+                competition_season = remaining.get_nowait()
+            except Queue.Empty:
+                return
+            if HttpSession.pacer is None:
+                limiter.acquire()
+            try:
+                find_teams(competition_season, checkpoint)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(amount_of_workers, remaining.qsize()))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        # Joining with a timeout, otherwise Ctrl+C is not delivered until all the associations are done.
+        while thread.is_alive():
+            thread.join(0.5)
+    if errors:
+        raise errors[0]
+
+
+def scrape_competitions(competitions):
+    """
+        Scraping the competitions in three phases, waiting delay_time after every page. All competitions are resolved
+        at once, then the teams of min(lookup_workers, workers) associations are looked up at the same time, and then
+        the team pages are loaded one after another.
+        Work that an interrupted run already finished is skipped, see checkpoint_file.
+
+        Parameters
+        ----------
+        competitions: list<list<competition, association abbreviation>>
+            The competitions as returned by the IO.
+
+        Returns
+        -------
+        failed: int
+            The amount of pages that could not be scraped, always 0 as the first error stops the run.
+    """
+    checkpoint = open_checkpoint(competitions)
+
+    # Competitions has a structure of [0] - name, [1] - club
+    if not resolve_competitions(competitions, checkpoint):
+        wait_between_pages()
+
+    # Competitions has a structure of [0] - name, [1] - club, [2] - uid of competition-season
+    find_all_teams(competitions, checkpoint, min(lookup_workers, workers))
 
     # Competitions has a structure of [0] - name, [1] - club, [2] - uid of competition, [3] - list of uid teams
+    output = OutputBuffer.OutputBuffer(get_io(), io_batch_size, io_lock, checkpoint)
+    poules = PouleCache() if share_poules else None
     for competition_season in competitions:
         for team in competition_season[3]:
-            del all_friendly_teams_in_this_competition[:]
-            current_season_name = get_current_season(competition_season[0])
-            team_url, team_info, team_results, file_mmap = get_team_info(team, competition_season[1])
-            team_list = [team_url, team_info, team_results, get_team_planning(file_mmap, competition_season[1])]
-            io.set_competition(current_season_name, all_friendly_teams_in_this_competition,
-                               team_url, team_info, team_results,
-                               get_team_planning(file_mmap, competition_season[1]))
-            file_mmap.close()
-            time.sleep(delay_time)
-
-    print('Finished Bye Bye, exiting..')
-
-except KeyboardInterrupt:
-    print('Received CTRL + C, exiting..')
+            if checkpoint is not None and checkpoint.done('team', competition_season[1] + '|' + team):
+                continue
+            if poules is None or poules.claim_team(competition_season[1], team):
+                scrape_team(competition_season[0], competition_season[1], team, output, poules)
+                output.add_finished('team', competition_season[1] + '|' + team)
+                wait_between_pages()
+    output.flush()
+    if checkpoint is not None:
+        checkpoint.finish()
+    return 0
+
+
+def scrape_competitions_pipelined(competitions, amount_of_workers):
+    """
+        Scraping the competitions as a pipeline instead of in three phases. All competitions are resolved at once,
+        then the teams of every association are looked up, and as soon as those of one association are known its team
+        pages are loaded, while the teams of the other associations are still being looked up. Work further down the
+        pipeline goes first, such that the first results reach the IO as soon as possible.
+        One token bucket shared by all workers makes sure we never load more than one page per delay_time.
+
+        Parameters
+        ----------
+        competitions: list<list<competition, association abbreviation>>
+            The competitions as returned by the IO.
+        amount_of_workers: int
+            The maximum amount of page loads that are in flight at the same time.
+
+        Returns
+        -------
+        failed: int
+            The amount of pages that could not be scraped.
+
+        Raises errors
+        -------
+        NameError, when some of the competitions could not be found, see find_competition_uids.
+    """
+    limiter = get_page_limiter()
+    checkpoint = open_checkpoint(competitions)
+    output = OutputBuffer.OutputBuffer(get_io(), io_batch_size, io_lock, checkpoint)
+    poules = PouleCache() if share_poules else None
+    tasks = Queue.PriorityQueue()
+    sequence = itertools.count()
+    failed = []
+    resolution_errors = []
+
+    def submit(stage, function, *args):
+        # Lower stage numbers are handled first, the sequence number keeps the order within a stage.
+        tasks.put((stage, next(sequence), function, args))
+
+    def resumed(kind, key):
+        # Work an interrupted run already did does not load a page, so it is done right away instead of queued.
+        return checkpoint is not None and checkpoint.done(kind, key)
+
+    def competitions_stage(competition_seasons):
+        resolve_competitions(competition_seasons, checkpoint)
+        for competition_season in competition_seasons:
+            if resumed('teams', competition_season[1] + '|' + competition_season[2]):
+                teams_stage(competition_season)
+            else:
+                submit(1, teams_stage, competition_season)
+
+    def teams_stage(competition_season):
+        find_teams(competition_season, checkpoint)
+        for team in competition_season[3]:
+            if not resumed('team', competition_season[1] + '|' + team) and \
+                    (poules is None or poules.claim_team(competition_season[1], team)):
+                submit(0, team_stage, competition_season[0], competition_season[1], team)
+
+    def team_stage(competition_name, association, team):
+        scrape_team(competition_name, association, team, output, poules)
+        output.add_finished('team', association + '|' + team)
+
+    def worker():
+        while True:
+            stage, _, function, args = tasks.get()
+            try:
+                if HttpSession.pacer is None:
+                    limiter.acquire()
+                function(*args)
+            except Exception as e:
+                if function is competitions_stage:
+                    # Without the uids of the competitions nothing can be scraped, like in the sequential mode.
+                    resolution_errors.append(e)
+                Instrumentation.count('errors')
+                failed.append(args)
+                print(BgColors.TerminalColors.fail + 'Failed {}{}: {}'.format(function.__name__, args, e) +
+                      BgColors.TerminalColors.end_color)
+            finally:
+                tasks.task_done()
+
+    if all(resumed('competition', competition_season[0]) for competition_season in competitions):
+        competitions_stage(competitions)
+    else:
+        submit(2, competitions_stage, competitions)
+    for _ in range(amount_of_workers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+    # Not using tasks.join(), otherwise Ctrl+C is not delivered until all the pages are done.
+    while tasks.unfinished_tasks:
+        time.sleep(0.1)
+    output.flush()
+    # The pages that failed are tried again by the next run, the others are skipped.
+    if checkpoint is not None and not failed:
+        checkpoint.finish()
+    elif checkpoint is not None:
+        checkpoint.close()
+    if resolution_errors:
+        raise resolution_errors[0]
+    return len(failed)
+
+
+def set_up():
+    """
+        Sets up what every run of this process shares: the archive of the pages and the adaptive pacing. What is
+        already set up is kept, such that a process that runs many times, like ScrapeDaemon, keeps it warm.
+    """
+    if archive_pages and HttpSession.page_archive is None:
+        HttpSession.page_archive = PageArchive.PageArchive(html_page_directory)
+    if adaptive_pacing and HttpSession.pacer is None:
+        HttpSession.pacer = RateLimiter.AdaptivePacer(1.0 / delay_time, pacing_floor, pacing_ceiling)
+
+
+def run(competitions=None):
+    """
+        Scrapes the teams of the competitions like running this file does, with the settings above. The competition
+        index stays loaded between runs, it is only built again when it is out of date or misses a competition.
+
+        Parameters
+        ----------
+        competitions: list<list<competition, association abbreviation>>
+            The competitions, by default the competitions of the IO.
+
+        Returns
+        -------
+        competitions: list<list<competition, association abbreviation>>
+            The competitions that were asked for.
+        failed: int
+            The amount of pages that could not be scraped, see scrape_competitions_pipelined.
+
+        Raises errors
+        -------
+        NameError, when some of the competitions could not be found.
+    """
+    global competition_index_refreshed
+    set_up()
+    competition_index_refreshed = False
+    if competitions is None:
+        competitions = get_io().get_competition()
+    # The scraping appends the uids and the teams to every competition, a next run starts from the name and the club.
+    competitions = [list(competition_season[:2]) for competition_season in competitions]
+    if workers > 1:
+        failed = scrape_competitions_pipelined(competitions, workers)
+    else:
+        failed = scrape_competitions(competitions)
+    if HttpSession.page_archive is not None:
+        HttpSession.page_archive.flush()
+    return competitions, failed
+
+
+ParserBackends.register(competition_scraper=sys.modules[__name__])
+
+if __name__ == '__main__':
+    profiler = None
+    try:
+        """
+            The main loop that combines it all
+
+            We start out by setting up the archive of the pages, if requested.
+            Then we follow by getting the main page of competition information.
+            Followed by finding the required competition seasons.
+            Then for each competition team:
+                We fetch the page
+                We get all the information
+                We send this information to the input output
+            When workers is larger than 1, these steps are pipelined over multiple workers.
+            With a checkpoint_file, the work an interrupted run already finished is skipped.
+            With instrumentation or profile_run, we write down where the time went.
+            Finally we say bye bye
+
+            Of course you should be able to interrupt with your keyboard, hence by Ctrl+C you can exit the program
+            early.
+        """
+        if profile_run:
+            profiler = Instrumentation.Profiler().start()
+        if instrumentation:
+            Instrumentation.start()
+
+        competitions, failed = run()
+
+        if HttpSession.pacer is not None:
+            print(HttpSession.pacer.summary())
+        Instrumentation.report(metrics_file, profiler, profile_file)
+        if failed:
+            print(BgColors.TerminalColors.fail + '{} pages could not be scraped, exiting..'.format(failed) +
+                  BgColors.TerminalColors.end_color)
+            sys.exit(1)
+        print('Finished Bye Bye, exiting..')
+
+    except KeyboardInterrupt:
+        Instrumentation.report(metrics_file, profiler, profile_file)
+        print('Received CTRL + C, exiting..')
+        if checkpoint_file is not None:
+            print('Run again to continue where this run stopped.')
@@ -0,0 +1,338 @@
+import heapq
+import re
+import threading
+
+import TerminalColors as BgColors
+import HttpSession
+import Instrumentation
+import OutputBuffer
+import PlayerScraper
+import RateLimiter
+
+"""
+    Discovers players by following the partners and opponents in the match tables of the players we already know,
+    breadth first, starting from the players of io.get_players(). Every discovered player is scraped like
+    PlayerScraper does, so whole regions can be covered without keeping lists of KNLTB numbers by hand.
+
+    Every player is loaded at most once per run: the KNLTB numbers that were visited or are waiting in the frontier
+    are kept in a bitmap. The frontier hands out the nearest players first, within the same depth those met in a
+    match of one of the preferred_clubs and then those that played most recently. The crawl stops at max_depth
+    matches away from the seeds or after max_players pages, whichever comes first.
+
+    The page loads, the IO and the politeness delay are those of PlayerScraper, set them there.
+
+    Usage
+    ----------
+    python DiscoveryCrawler.py
+"""
+
+max_depth = 2  # The seeds are at depth 0, the players they played with or against at depth 1 and so on.
+max_players = 1000  # The most player pages that are loaded in one run, including the seeds.
+preferred_clubs = []  # Players met in a match of these clubs, like "A.T.C.", are visited first within their depth.
+workers = 1  # Amount of players that are fetched and parsed at the same time.
+
+link_pattern = re.compile(r'Spelersprofiel\.aspx\?bondsnummer=(\d+)')
+
+
+def match_date(date):
+    """
+        The date of a match as a number that is larger for later dates, 0 when it is not a date like 31-12-2017.
+    """
+    try:
+        day, month, year = date.strip().split('-')
+        return int(year) * 10000 + int(month) * 100 + int(day)
+    except ValueError:
+        return 0
+
+
+def linked_players(s, clubs=()):
+    """
+        Finding the players the owner of a page played with or against.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+        clubs: list<string>
+            The preferred clubs.
+
+        Returns
+        -------
+        linked: dict<int, (int, boolean)>
+            For every KNLTB number that is linked from the match tables, the date of the last match in which it was
+            linked, see match_date, and whether one of the clubs played in any of those matches.
+    """
+    linked = {}
+    # Every match starts with its date, followed by the event, the teams and the anchors of the players.
+    for piece in s.split(PlayerScraper.match_separator)[1:]:
+        numbers = link_pattern.findall(piece)
+        if not numbers:
+            continue
+        date = match_date(piece[:piece.find('</td>')])
+        club_match = any(club in piece for club in clubs)
+        for number in numbers:
+            nr = int(number)
+            last_date, last_club_match = linked.get(nr, (0, False))
+            linked[nr] = (max(date, last_date), club_match or last_club_match)
+    return linked
+
+
+class VisitedSet(object):
+    def __init__(self, capacity=10 ** 8):
+        """
+            The KNLTB numbers that were visited or are waiting in the frontier, one bit per possible number.
+            KNLTB numbers have eight digits, so all of them fit in 12.5 MB. Unlike a bloom filter the bitmap never
+            claims a player was seen when he was not, so nobody is skipped. Numbers outside of the bitmap are kept
+            in a set.
+
+            Parameters
+            ----------
+            capacity: int
+                The numbers below this one are kept in the bitmap.
+        """
+        self.capacity = capacity
+        self.bits = bytearray((capacity + 7) // 8)
+        self.others = set()
+        self.size = 0
+
+    def add(self, nr):
+        """
+            Marks a number as seen.
+
+            Returns
+            -------
+            added: boolean
+                Whether the number was not seen before.
+        """
+        if 0 <= nr < self.capacity:
+            mask = 1 << (nr & 7)
+            if self.bits[nr >> 3] & mask:
+                return False
+            self.bits[nr >> 3] |= mask
+        elif nr in self.others:
+            return False
+        else:
+            self.others.add(nr)
+        self.size += 1
+        return True
+
+    def __contains__(self, nr):
+        if 0 <= nr < self.capacity:
+            return bool(self.bits[nr >> 3] & (1 << (nr & 7)))
+        return nr in self.others
+
+    def __len__(self):
+        return self.size
+
+
+class Frontier(object):
+    """
+        The discovered players that were not visited yet, the one with the lowest priority first. A player that is
+        found again with a better priority moves up, the old entry in the heap is skipped when it comes up.
+    """
+    def __init__(self):
+        self.heap = []
+        self.best = {}  # The best priority of every player in the frontier.
+
+    def push(self, nr, priority):
+        if nr in self.best and self.best[nr] <= priority:
+            return
+        self.best[nr] = priority
+        heapq.heappush(self.heap, (priority, nr))
+
+    def pop(self):
+        """
+            Returns
+            -------
+            player: (int, tuple)
+                The KNLTB number and the priority of the best player, None when the frontier is empty.
+        """
+        while self.heap:
+            priority, nr = heapq.heappop(self.heap)
+            if self.best.get(nr) == priority:
+                del self.best[nr]
+                return nr, priority
+        return None
+
+    def __contains__(self, nr):
+        return nr in self.best
+
+    def __len__(self):
+        return len(self.best)
+
+
+def priority(depth, last_date, club_match):
+    """
+        The order in which the frontier hands out players: by depth, then the players of the preferred clubs, then
+        the players that played most recently.
+    """
+    return depth, 0 if club_match else 1, -last_date
+
+
+class DiscoveryCrawler(object):
+    def __init__(self, seeds, want_rating_changes, max_depth=2, max_players=1000, clubs=()):
+        """
+            Parameters
+            ----------
+            seeds: list<int>
+                The KNLTB numbers the crawl starts from.
+            want_rating_changes: boolean
+                Whether we also want the match results of the players.
+            max_depth: int
+                The most matches a visited player is away from the seeds.
+            max_players: int
+                The most player pages that are loaded.
+            clubs: list<string>
+                The preferred clubs, see priority.
+        """
+        self.want_rating_changes = want_rating_changes
+        self.max_depth = max_depth
+        self.max_players = max_players
+        self.clubs = clubs
+        self.visited = VisitedSet()
+        self.frontier = Frontier()
+        self.claimed = 0
+        self.in_flight = 0
+        self.scraped = 0
+        self.failed = 0
+        self.per_depth = [0] * (max_depth + 1)
+        self.lock = threading.Condition()
+        for nr in seeds:
+            if self.visited.add(int(nr)):
+                self.frontier.push(int(nr), priority(0, 0, False))
+
+    def next_player(self):
+        """
+            Blocks until there is a player to visit. While the frontier is empty but other workers are still loading
+            pages, new players may turn up.
+
+            Returns
+            -------
+            player: (int, int)
+                The KNLTB number and the depth of the player, None when the crawl is done.
+        """
+        with self.lock:
+            while self.claimed < self.max_players:
+                player = self.frontier.pop()
+                if player is not None:
+                    self.claimed += 1
+                    self.in_flight += 1
+                    return player[0], player[1][0]
+                if self.in_flight == 0:
+                    break
+                self.lock.wait(0.5)
+            return None
+
+    def visited_player(self, depth, linked, scraped):
+        """
+            Adds the players that were linked from a visited page to the frontier.
+
+            Parameters
+            ----------
+            depth: int
+                The depth of the visited player.
+            linked: dict<int, (int, boolean)>
+                See linked_players.
+            scraped: boolean
+                Whether the page was scraped, or failed.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            if scraped:
+                self.scraped += 1
+                self.per_depth[depth] += 1
+            else:
+                self.failed += 1
+            if depth < self.max_depth:
+                for nr, (last_date, club_match) in linked.items():
+                    # Players in the frontier may move up, the others are only added when they were never seen.
+                    if nr in self.frontier or self.visited.add(nr):
+                        self.frontier.push(nr, priority(depth + 1, last_date, club_match))
+            self.lock.notify_all()
+
+    def visit(self, nr, output):
+        """
+            Scrapes the player and finds the players he played with or against.
+        """
+        s = PlayerScraper.load_player_page(nr)
+        PlayerScraper.scrape_player_page(s, nr, self.want_rating_changes, output)
+        return linked_players(s, self.clubs)
+
+    def crawl(self, amount_of_workers=1):
+        """
+            Visits players until the frontier is empty or a budget is used up. All workers share one token bucket,
+            such that we never load more than one page per PlayerScraper.delay_time.
+
+            Parameters
+            ----------
+            amount_of_workers: int
+                The amount of players that are fetched and parsed at the same time.
+
+            Returns
+            -------
+            counter: int
+                The amount of players that were scraped.
+        """
+        limiter = RateLimiter.TokenBucket(1.0 / PlayerScraper.delay_time)
+        output = OutputBuffer.OutputBuffer(PlayerScraper.get_io(), PlayerScraper.io_batch_size, PlayerScraper.io_lock)
+
+        def worker():
+            while True:
+                player = self.next_player()
+                if player is None:
+                    return
+                nr, depth = player
+                if HttpSession.pacer is None:
+                    limiter.acquire()
+                linked, scraped = {}, False
+                try:
+                    linked = self.visit(nr, output)
+                    scraped = True
+                except Exception as e:
+                    Instrumentation.count('errors')
+                    print(BgColors.TerminalColors.fail + 'Failed scraping player {}: {}'.format(nr, e) +
+                          BgColors.TerminalColors.end_color)
+                finally:
+                    self.visited_player(depth, linked, scraped)
+
+        threads = [threading.Thread(target=worker) for _ in range(max(1, amount_of_workers))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for thread in threads:
+                # Joining with a timeout, otherwise Ctrl+C is not delivered until the crawl is done.
+                while thread.is_alive():
+                    thread.join(0.5)
+        finally:
+            # Also when the crawl is interrupted, such that what was scraped reaches the IO and is remembered.
+            output.flush()
+            PlayerScraper.save_watermarks()
+        return self.scraped
+
+    def summary(self):
+        with self.lock:
+            return 'Scraped {} players ({} per depth), {} failed, {} players seen, {} left in the frontier'.format(
+                self.scraped, ', '.join(str(amount) for amount in self.per_depth), self.failed, len(self.visited),
+                len(self.frontier))
+
+
+if __name__ == '__main__':
+    try:
+        """
+            Getting the seeds and the settings from the IO of PlayerScraper, then crawling until a budget is used up.
+        """
+        PlayerScraper.set_up()
+        seeds = PlayerScraper.get_io().get_players()
+        want_rating_changes, PlayerScraper.debug = PlayerScraper.get_io().get_settings()
+        crawler = DiscoveryCrawler(seeds, want_rating_changes, max_depth, max_players, preferred_clubs)
+        print BgColors.TerminalColors.ok_blue + "Let's start!" + BgColors.TerminalColors.end_color
+        crawler.crawl(workers)
+        if HttpSession.page_archive is not None:
+            HttpSession.page_archive.flush()
+        print(crawler.summary())
+        print('Finished Bye Bye, exiting..')
+
+    except KeyboardInterrupt:
+        PlayerScraper.save_watermarks()
+        print('Received CTRL + C, exiting..')
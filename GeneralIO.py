@@ -17,7 +17,7 @@ class GeneralIO(AbstractInputOutput):
         #              '[20889364, 13343424, 19621159, ....., 20889320] : \n')
 
     def get_competition(self):
-        return super(GeneralIO)
+        return super(GeneralIO, self).get_competition()
 
     def set_player_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
                           year_e_rating, year_d_rating):
@@ -28,4 +28,5 @@ class GeneralIO(AbstractInputOutput):
         return super(GeneralIO, self).invalid_player(knltb_number)
 
     def set_competition(self, season, own_teams, comp_url, comp_info, comp_results, comp_play_times):
-        return super(GeneralIO, self).set_competition(season, own_teams, comp_info, comp_results, comp_play_times)
+        return super(GeneralIO, self).set_competition(season, own_teams, comp_url, comp_info, comp_results,
+                                                      comp_play_times)
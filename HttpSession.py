@@ -0,0 +1,184 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import Instrumentation
+
+"""
+    The one place where pages of the public KNLTB site are fetched, used by both scrapers.
+    It holds a single pooled session, such that connections are kept alive and reused between page loads instead of
+    setting up a new connection for every page, and asks the site to compress its html.
+"""
+
+connect_timeout = 5  # Seconds we wait for a connection to the site before giving up.
+read_timeout = 30  # Seconds we wait for the site to send the next part of a page before giving up.
+connections_per_host = 10  # Maximum amount of open connections to one host, keep at least the amount of workers.
+page_cache = None  # Set to a PageCache.PageCache to reuse pages that did not change between runs.
+page_archive = None  # Set to a PageArchive.PageArchive to keep a copy of every loaded page on disk.
+pacer = None  # Set to a RateLimiter.AdaptivePacer to pace page loads by how the site responds, see the scrapers.
+error_page_markers = ["Server Error in '/' Application", "Runtime Error"]  # The site answered 200 with its error page.
+
+shared_session = None
+shared_session_lock = threading.Lock()
+
+
+class ErrorPage(requests.HTTPError):
+    """
+        The site answered with an error status or with its error page instead of the page we asked for.
+    """
+
+
+class HttpSession(object):
+    def __init__(self, connections_per_host=connections_per_host, connect_timeout=connect_timeout,
+                 read_timeout=read_timeout):
+        """
+            Parameters
+            ----------
+            connections_per_host: int
+                Maximum amount of connections kept open to a single host. When all are in use, a page load waits for
+                one to come free instead of opening another one.
+            connect_timeout: float
+                Seconds we wait for a connection to the site before giving up.
+            read_timeout: float
+                Seconds we wait for the site to send the next part of a page before giving up.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=connections_per_host, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+
+    def get(self, url, params=None, headers=None):
+        """
+            Loading a page over one of the pooled connections.
+
+            Parameters
+            ----------
+            url: string
+                The page we want to load.
+            params: dict
+                The query parameters of the page.
+            headers: dict
+                Extra headers for this page load only.
+
+            Returns
+            -------
+            requests.Response
+                The response, with the content already downloaded and decompressed. Either the page or, when
+                headers asked whether it changed, 304 Not Modified.
+
+            Raises errors
+            -------
+            ErrorPage, when the site answered with another status or with its error page.
+        """
+        if pacer is None:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        else:
+            pacer.acquire()
+            start = time.time()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                pacer.report(time.time() - start)
+                raise
+            pacer.report(time.time() - start, response.status_code, is_error_page(response),
+                         retry_after(response))
+        check_response(response)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def is_error_page(response):
+    """
+        Whether the site answered with its error page instead of the page we asked for.
+    """
+    start = response.content[:4096]
+    return any(marker in start for marker in error_page_markers)
+
+
+def check_response(response):
+    """
+        Raises errors
+        -------
+        ErrorPage, when the site did not answer with the page, such that it is not parsed and tried again later.
+    """
+    if response.status_code not in (200, 304):
+        raise ErrorPage('The site answered {} for {}'.format(response.status_code, response.url), response=response)
+    if is_error_page(response):
+        raise ErrorPage('The site answered with its error page for {}'.format(response.url), response=response)
+
+
+def retry_after(response):
+    """
+        The seconds the site asked us to wait before the next page, None when it did not ask.
+    """
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_session():
+    """
+        Returns the session that is shared by everything in this process, creating it on first use.
+    """
+    global shared_session
+    with shared_session_lock:
+        if shared_session is None:
+            shared_session = HttpSession(connections_per_host, connect_timeout, read_timeout)
+        return shared_session
+
+
+def fetch(url, params=None, page_type=None):
+    """
+        Loading a page with the shared session, or from the page_cache when one is set and the page type is known.
+
+        Parameters
+        ----------
+        url: string
+            The page we want to load.
+        params: dict
+            The query parameters of the page.
+        page_type: string
+            The type of the page, see PageCache.default_ttls. Pages without a type are never cached.
+
+        Returns
+        -------
+        requests.Response
+            The response, with the content already downloaded and decompressed.
+
+        Raises errors
+        -------
+        ErrorPage, when the site answered with an error status or with its error page.
+        requests.RequestException, when the site could not be reached.
+    """
+    with Instrumentation.stage('fetch'):
+        try:
+            if page_cache is not None and page_type is not None:
+                response = page_cache.fetch(get_session(), url, params, page_type)
+            else:
+                response = get_session().get(url, params)
+        except requests.RequestException:
+            Instrumentation.count('fetch_errors')
+            raise
+    Instrumentation.count('pages')
+    Instrumentation.count('bytes', len(response.content))
+    if page_archive is not None:
+        page_archive.save(response.url, response.content)
+    return response
+
+
+def close_session():
+    """
+        Closes all connections of the shared session. The next page load will start a fresh session.
+    """
+    global shared_session
+    with shared_session_lock:
+        if shared_session is not None:
+            shared_session.close()
+            shared_session = None
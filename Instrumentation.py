@@ -0,0 +1,261 @@
+import bisect
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import resource
+import StringIO
+import sys
+import tempfile
+import threading
+import time
+
+"""
+    Measures where the time of a scraper run goes. Every stage of a page records how long it took in a histogram:
+        fetch   loading the page from the site or the page cache
+        write   keeping a copy of the page on disk, see PageArchive
+        parse   reading the ratings, matches, standings and planning out of the page
+        sink    handing the results over to the IO
+    Next to that it counts the pages, bytes, matches, teams, the players or teams that failed (errors) and the
+    pages that could not be loaded (fetch_errors). At the end of a run it writes a summary in
+    json and the same numbers in the text format of Prometheus.
+
+    Nothing is measured until start is called, the stages and counters cost next to nothing before that.
+
+    The profiling mode runs the scraper under cProfile, in every thread, and writes the functions that took the most
+    time. Python 2 has no tracemalloc, so for memory it reports the peak memory of the process.
+"""
+
+"""
+    The upper bounds in seconds of the buckets of every histogram.
+"""
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+stages = ('fetch', 'write', 'parse', 'sink')
+counters = ('pages', 'bytes', 'matches', 'teams', 'errors', 'fetch_errors')
+metric_prefix = 'knltb_scraper'
+
+active = None  # The Instrumentation of the run, None when nothing is measured.
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket holds everything above the largest bound.
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+            The upper bound of the bucket in which the q-th quantile falls, at most the largest value seen.
+        """
+        if self.count == 0:
+            return 0.0
+        seen = 0
+        for idx, amount in enumerate(self.counts):
+            seen += amount
+            if seen >= q * self.count:
+                return min(buckets[idx], self.max) if idx < len(buckets) else self.max
+        return self.max
+
+    def summary(self):
+        return {'count': self.count, 'seconds': self.sum, 'average': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99), 'max': self.max,
+                'buckets': dict(zip([str(bound) for bound in buckets] + ['+Inf'], self.counts))}
+
+
+class Instrumentation(object):
+    def __init__(self):
+        self.started_at = time.time()
+        self.histograms = {stage: Histogram() for stage in stages}
+        self.counters = {counter: 0 for counter in counters}
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram()
+            self.histograms[stage].observe(seconds)
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def summary(self):
+        """
+            Everything that was measured, with the duration of the run and the peak memory of the process.
+        """
+        with self.lock:
+            return {'duration': time.time() - self.started_at,
+                    'peak_memory_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                    'counters': dict(self.counters),
+                    'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()}}
+
+    def prometheus(self):
+        """
+            The measurements in the text format of Prometheus, such that a node exporter can pick up the file.
+        """
+        summary = self.summary()
+        lines = ['# HELP {}_stage_seconds Seconds spent per stage of a page.'.format(metric_prefix),
+                 '# TYPE {}_stage_seconds histogram'.format(metric_prefix)]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, amount in zip([str(bound) for bound in buckets] + ['+Inf'], histogram.counts):
+                cumulative += amount
+                lines.append('{}_stage_seconds_bucket{{stage="{}",le="{}"}} {}'.format(metric_prefix, stage, bound,
+                                                                                       cumulative))
+            lines.append('{}_stage_seconds_sum{{stage="{}"}} {}'.format(metric_prefix, stage, histogram.sum))
+            lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(metric_prefix, stage, histogram.count))
+        for counter, value in sorted(summary['counters'].items()):
+            lines.append('# TYPE {}_{}_total counter'.format(metric_prefix, counter))
+            lines.append('{}_{}_total {}'.format(metric_prefix, counter, value))
+        lines.append('# TYPE {}_run_duration_seconds gauge'.format(metric_prefix))
+        lines.append('{}_run_duration_seconds {}'.format(metric_prefix, summary['duration']))
+        lines.append('# TYPE {}_peak_memory_bytes gauge'.format(metric_prefix))
+        lines.append('{}_peak_memory_bytes {}'.format(metric_prefix, int(summary['peak_memory_mb'] * 1024 * 1024)))
+        return '\n'.join(lines) + '\n'
+
+
+def write_atomically(filename, data):
+    handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+    with os.fdopen(handle, 'w') as fd:
+        fd.write(data)
+    os.rename(temporary_filename, filename)
+
+
+def start():
+    """
+        Starts measuring, for the rest of this process.
+    """
+    global active
+    active = Instrumentation()
+    return active
+
+
+def finish(metrics_file):
+    """
+        Writes what was measured to metrics_file.json and metrics_file.prom and stops measuring.
+
+        Returns
+        -------
+        summary: dict
+            See Instrumentation.summary.
+    """
+    global active
+    instrumentation, active = active, None
+    if instrumentation is None:
+        return None
+    summary = instrumentation.summary()
+    write_atomically(metrics_file + '.json', json.dumps(summary, indent=2, sort_keys=True))
+    write_atomically(metrics_file + '.prom', instrumentation.prometheus())
+    return summary
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+        Measures how long the code inside takes, as the stage name. Does nothing while nothing is measured.
+    """
+    instrumentation = active
+    if instrumentation is None:
+        yield
+        return
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        instrumentation.observe(name, time.time() - start_time)
+
+
+def count(counter, amount=1):
+    instrumentation = active
+    if instrumentation is not None:
+        instrumentation.count(counter, amount)
+
+
+def summary_line(summary):
+    """
+        The summary in a few lines, to print at the end of a run.
+    """
+    stage_lines = ['  {:<6} {:>6} times {:>8.2f}s in total, p50 {:.3f}s, p90 {:.3f}s, max {:.3f}s'.format(
+        stage, result['count'], result['seconds'], result['p50'], result['p90'], result['max'])
+        for stage, result in sorted(summary['stages'].items())]
+    counter_line = ', '.join('{} {}'.format(counter, value) for counter, value in sorted(summary['counters'].items()))
+    return '\n'.join(['Run of {:.1f}s, peak memory {:.1f} MB, {}'.format(summary['duration'], summary['peak_memory_mb'],
+                                                                        counter_line)] + stage_lines)
+
+
+def report(metrics_file, profiler=None, profile_file=None):
+    """
+        Writes and prints what was measured and stops the profiler, at the end of a run or when it is interrupted.
+
+        Parameters
+        ----------
+        metrics_file: string
+            Where the measurements are written, without the .json and .prom extension.
+        profiler: Profiler
+            The profiler of the run, None when the run is not profiled.
+        profile_file: string
+            Where the hot functions are written, see Profiler.stop.
+    """
+    summary = finish(metrics_file)
+    if summary is not None:
+        print(summary_line(summary))
+    if profiler is not None:
+        profiler.stop(profile_file)
+
+
+class Profiler(object):
+    """
+        Runs cProfile in the thread that starts it and in every thread started after that, such that the workers of
+        the scrapers are profiled as well.
+    """
+    def __init__(self):
+        self.profiles = []
+        self.lock = threading.Lock()
+
+    def profile_thread(self, *args):
+        # Called for the first event of a new thread, from then on the profile of the thread takes over.
+        profile = cProfile.Profile()
+        with self.lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        threading.setprofile(self.profile_thread)
+        self.profile_thread()
+        return self
+
+    def stop(self, filename=None, top=40):
+        """
+            Stops profiling and writes the functions that took the most time, summed over all threads.
+
+            Parameters
+            ----------
+            filename: string
+                Where the hot functions are written, they are printed when it is None.
+            top: int
+                The amount of functions that are written.
+        """
+        threading.setprofile(None)
+        with self.lock:
+            profiles, self.profiles = self.profiles, []
+        # Disabling every profile also counts the calls its thread is still in. A thread that keeps running goes on
+        # calling into its profile, but what it records from now on is not in the stats below.
+        for profile in profiles:
+            profile.disable()
+        output = StringIO.StringIO()
+        stats = pstats.Stats(*profiles, stream=output)
+        output.write('Peak memory {:.1f} MB\n'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0))
+        stats.sort_stats('cumulative').print_stats(top)
+        stats.sort_stats('tottime').print_stats(top)
+        if filename is None:
+            sys.stdout.write(output.getvalue())
+        else:
+            write_atomically(filename, output.getvalue())
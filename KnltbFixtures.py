@@ -0,0 +1,271 @@
+import random
+
+"""
+    Generates synthetic pages that look like the ones of the public KNLTB site. They contain exactly the markup the
+    scrapers search for, so they can be used to measure the scrapers without bothering the real site.
+"""
+
+first_names = ['Jan', 'Piet', 'Kees', 'Anna', 'Sanne', 'Lotte', 'Daan', 'Bram', 'Eva', 'Femke']
+last_names = ['Jansen', 'de Vries', 'van Dijk', 'Bakker', 'Visser', 'Smit', 'Meijer', 'de Boer', 'Mulder', 'Bos']
+clubs = ['A.T.C.', 'T.V. Het Zuiden', 'L.T.C. De Kei', 'T.C. Oranje', 'T.V. Smash']
+
+
+def random_name(rnd, not_this_name=None):
+    name = not_this_name
+    while name == not_this_name:
+        name = rnd.choice(first_names) + ' ' + rnd.choice(last_names)
+    return name
+
+
+def random_rating(rnd):
+    return '{:.4f}'.format(rnd.uniform(2.5, 9.0))
+
+
+def player_anchor(rnd, name, rating=None, community=None):
+    """
+        An anchor linking to the profile of a player as it is shown in the match tables. The KNLTB number is picked
+        from the community when one is given, such that players of a community link to each other.
+    """
+    if rating is None:
+        rating = random_rating(rnd)
+    knltb_number = rnd.choice(community) if community else rnd.randint(10000000, 29999999)
+    return '<a href="Spelersprofiel.aspx?bondsnummer={}" target="_blank">{} (&nbsp;{})</a>'.format(
+        knltb_number, name, rating)
+
+
+def match_rows(rnd, player_name, tournament, double_ratio=0.4, community=None):
+    """
+        The rows of a single match on the players page.
+
+        Parameters
+        ----------
+        rnd: random.Random
+            Source of randomness, such that the same seed gives the same page.
+        player_name: string
+            The name of the owner of the page, this player is always one of the players of the match.
+        tournament: boolean
+            Whether this is a tournament match or a competition match.
+        double_ratio: float
+            The chance that this is a double instead of a single.
+        community: list<int>
+            The KNLTB numbers the other players are picked from, by default they get random numbers.
+
+        Returns
+        -------
+        rows: string
+            The html of this match.
+    """
+    double = rnd.random() < double_ratio
+    amount_of_players = 4 if double else 2
+    players = [random_name(rnd, player_name) for _ in range(amount_of_players)]
+    players[rnd.randrange(amount_of_players)] = player_name
+    cell = '<td class="crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom">{}</td>\r\n'
+    wide_cell = '<td class="crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom" colspan="2">{}</td>\r\n'
+
+    rows = '<tr>\r\n<td class="crm-wp-cell crm-wp-cell-padding-top">{:02d}-{:02d}-2017</td>\r\n'.format(
+        rnd.randint(1, 28), rnd.randint(1, 12))
+    if tournament:
+        event = rnd.choice(['Open Toernooi ', 'Jeugdtoernooi ', 'Gravel Open ']) + rnd.choice(clubs)
+    else:
+        event = rnd.choice(['Voorjaarscompetitie 2017', 'Najaarscompetitie 2017', 'Winteroutdoorcompetitie 2017'])
+    rows += '<td class="crm-wp-cell crm-wp-cell-padding-top" colspan="4">{}</td>\r\n</tr>\r\n<tr>\r\n'.format(event)
+    rows += cell.format('Dubbel' if double else 'Enkel')
+    if tournament:
+        rows += wide_cell.format(rnd.choice(['HE5', 'HD6', 'DE7', 'GD8', 'HE8 17+']))
+    else:
+        rows += cell.format(rnd.choice(clubs) + ' ' + str(rnd.randint(1, 9)))
+        rows += cell.format(rnd.choice(clubs) + ' ' + str(rnd.randint(1, 9)))
+    rows += wide_cell.format('{:+.4f}'.format(rnd.uniform(-0.05, 0.05)))
+    rows += '</tr>\r\n<tr>\r\n'
+    for name in players:
+        rows += '<td class="crm-wp-cell">' + player_anchor(rnd, name, community=community) + '</td>\r\n'
+    rows += '<td class="crm-wp-cell" style="vertical-align:middle;white-space:nowrap">{}</td>\r\n'.format(
+        rnd.choice(['Gewonnen', 'Verloren']))
+    rows += '<td class="crm-wp-cell" style="vertical-align:middle">{}-{} {}-{}</td>\r\n</tr>\r\n'.format(
+        rnd.randint(0, 7), rnd.randint(0, 7), rnd.randint(0, 7), rnd.randint(0, 7))
+    return rows
+
+
+def match_table(rnd, player_name, amount_of_matches, tournament, double_ratio=0.4, community=None):
+    table = '<table class="knltb-geselecteerde-toernooien" cellspacing="0">\r\n'
+    table += '<tr>\r\n<th>Datum</th><th colspan="4">Toernooi</th>\r\n</tr>\r\n'
+    for _ in range(amount_of_matches):
+        table += match_rows(rnd, player_name, tournament, double_ratio, community)
+    return table + '</table>\r\n'
+
+
+def player_page(knltb_number, competition_matches=20, tournament_matches=10, seed=None, double_ratio=0.4,
+                community=None):
+    """
+        Generates the page of a single player, Spelersprofiel.aspx.
+
+        Parameters
+        ----------
+        knltb_number: int
+            The KNLTB number of the player.
+        competition_matches: int
+            How many competition matches the player played.
+        tournament_matches: int
+            How many tournament matches the player played.
+        seed: int
+            Seed for the randomness, by default the KNLTB number is used.
+        double_ratio: float
+            Which part of the matches are doubles, 0 for a page with only singles and 1 for only doubles.
+        community: list<int>
+            The KNLTB numbers of the players this player played with and against, by default they are random.
+
+        Returns
+        -------
+        page: string
+            The html of the players page.
+    """
+    rnd = random.Random(knltb_number if seed is None else seed)
+    player_name = random_name(rnd)
+    page = '<html>\r\n<head><title>Spelersprofiel</title></head>\r\n<body>\r\n'
+    page += '<span class="knltb-public-title">Spelersprofiel\r\n        :&nbsp;{}&nbsp;[{}]</span>\r\n'.format(
+        player_name, knltb_number)
+    page += '<table class="knltb-public-table">\r\n'
+    for label in ['Speelsterkte Enkel 2017', 'Speelsterkte Dubbel 2017']:
+        page += '<tr><td class="knltb-public-label">{}</td>\r\n<td>{}</td></tr>\r\n'.format(label,
+                                                                                           rnd.randint(3, 9))
+    for label in ['Rating Enkel', 'Rating Dubbel', 'Eindejaarsrating Enkel', 'Eindejaarsrating Dubbel']:
+        page += '<tr><td class="knltb-public-label">{}</td>\r\n<td>{}</td></tr>\r\n'.format(label,
+                                                                                           random_rating(rnd))
+    page += '</table>\r\n<h2>Partijresultaten competitie</h2>\r\n'
+    page += match_table(rnd, player_name, competition_matches, False, double_ratio, community)
+    page += '<h2>Partijresultaten toernooien</h2>\r\n'
+    page += match_table(rnd, player_name, tournament_matches, True, double_ratio, community)
+    return page + '</body>\r\n</html>\r\n'
+
+
+def round_robin(teams, match_days):
+    """
+        Schedules the teams of a poule such that every team plays every match day, using the circle method.
+
+        Returns
+        -------
+        days: list<list<(string, string)>>
+            For every match day the home and away team of every match.
+    """
+    teams = list(teams)
+    if len(teams) % 2 == 1:
+        teams.append(None)
+    days = []
+    for day in range(match_days):
+        matches = []
+        for idx in range(len(teams) // 2):
+            home, away = teams[idx], teams[len(teams) - 1 - idx]
+            if day % 2 == 1:
+                home, away = away, home
+            if home is not None and away is not None:
+                matches.append((home, away))
+        days.append(matches)
+        teams.insert(1, teams.pop())
+    return days
+
+
+def team_page(association, amount_of_teams=8, match_days=7, seed=0, own_teams=1):
+    """
+        Generates the page of a poule, StandenEnUitslagen.aspx, with the standings and the planning of every team.
+
+        Parameters
+        ----------
+        association: string
+            The association we are scraping for, the first own_teams teams of the poule belong to it.
+        amount_of_teams: int
+            How many teams play in this poule.
+        match_days: int
+            How many match days are planned.
+        seed: int
+            Seed for the randomness.
+        own_teams: int
+            How many teams of the association play in this poule.
+
+        Returns
+        -------
+        page: string
+            The html of the poule page.
+    """
+    rnd = random.Random(seed)
+    teams = [association + ' ' + str(idx + 1) for idx in range(own_teams)]
+    other_clubs = [club for club in clubs if club != association]
+    while len(teams) < amount_of_teams:
+        team = rnd.choice(other_clubs) + ' ' + str(rnd.randint(1, 9))
+        if team not in teams:
+            teams.append(team)
+    rnd.shuffle(teams)
+
+    page = '<html>\r\n<body>\r\n<div class="knltb-public-label">Competitie</div>\r\n'
+    page += '<div class="knltb-public-label">VJ17 Zaterdag (13:00) {}e klasse Gemengd 17+ </div>\r\n'.format(
+        rnd.randint(1, 6))
+    page += '<table class="knltb-standen">\r\n'
+    for position, team in enumerate(teams):
+        points = [str(rnd.randint(0, 30)) for _ in range(6)]
+        page += '<tr bgcolor="{}">\r\n<td class="crm-wp-cell">\r\n      {} {}\r\n</td>\r\n'.format(
+            '#FFFFFF' if position % 2 == 0 else '#E6E6E6', position + 1, team)
+        for value in points:
+            page += '<td class="crm-wp-cell" width="30">{}</td>\r\n'.format(value)
+        page += '</tr>\r\n'
+    page += '</table>\r\n<table class="knltb-planning">\r\n'
+    for day, matches in enumerate(round_robin(teams, match_days)):
+        page += '<tr><td class="crm-wp-cell" colspan="5">Dag {} ({:02d}-{:02d}-2017)</td></tr>\r\n'.format(
+            day + 1, rnd.randint(1, 28), rnd.randint(4, 6))
+        for home, away in matches:
+            page += '<tr title="Aanvang:&lt;/b> {}:00&lt;br/>Aanwezig:&lt;/b> {}:45&lt;br/>Baansoort:&lt;/b> {}' \
+                    '&lt;br/>Opmerking:&lt;/b>{}">'.format(rnd.randint(9, 14), rnd.randint(8, 13),
+                                                           rnd.choice(['Gravel', 'Kunstgras', 'Smashcourt']),
+                                                           rnd.choice(['', ' Graag op tijd']))
+            for value in [home, away, '{}-{}'.format(rnd.randint(0, 6), rnd.randint(0, 6)),
+                          rnd.choice(['Gespeeld', 'Gepland']), '']:
+                page += '<td class="crm-wp-cell">{}</td>'.format(value)
+            page += '</tr>\r\n'
+    return page + '</table>\r\n</body>\r\n</html>\r\n'
+
+
+class CompetitionSite(object):
+    """
+        A made up set of competitions, in which every association plays with some teams in several poules. It generates
+        the search page, the page with the teams of an association and the poule pages.
+        With own_teams_per_poule above 1 several teams of the association play in the same poule, and the page with
+        the teams of the association links to that poule once for every one of them, like the real site does.
+    """
+    def __init__(self, competition_names, associations, poules_per_association=4, amount_of_teams=8,
+                 match_days=7, own_teams_per_poule=1):
+        self.competition_uids = {}
+        self.poules = {}
+        self.association_poules = {}
+        self.amount_of_teams = amount_of_teams
+        self.match_days = match_days
+        self.own_teams_per_poule = own_teams_per_poule
+        rnd = random.Random(len(competition_names))
+        for competition_name in competition_names:
+            uid = '{:08x}-{:04x}'.format(rnd.getrandbits(32), rnd.getrandbits(16))
+            self.competition_uids[competition_name] = uid
+            for association in associations:
+                poule_uids = []
+                for _ in range(poules_per_association):
+                    poule_uid = str(rnd.randint(100000, 999999))
+                    self.poules[poule_uid] = association
+                    poule_uids.append(poule_uid)
+                self.association_poules[(uid, association)] = poule_uids
+        self.pages = {}
+
+    def search_page(self):
+        page = '<html>\r\n<body>\r\n<select name="id">\r\n'
+        for competition_name in sorted(self.competition_uids):
+            page += '<option value="{}">{}</option>\r\n'.format(self.competition_uids[competition_name],
+                                                               competition_name)
+        return page + '</select>\r\n</body>\r\n</html>\r\n'
+
+    def association_page(self, competition_uid, association):
+        page = '<html>\r\n<body>\r\n<table>\r\n'
+        for poule_uid in self.association_poules.get((competition_uid, association), []) * self.own_teams_per_poule:
+            page += '<tr><td><a href="StandenEnUitslagen.aspx?id={}">{}</a></td></tr>\r\n'.format(poule_uid,
+                                                                                                 association)
+        return page + '</table>\r\n</body>\r\n</html>\r\n'
+
+    def team_page(self, poule_uid):
+        if poule_uid not in self.pages:
+            self.pages[poule_uid] = team_page(self.poules[poule_uid], self.amount_of_teams, self.match_days,
+                                              int(poule_uid), self.own_teams_per_poule)
+        return self.pages[poule_uid]
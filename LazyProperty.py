@@ -0,0 +1,19 @@
+"""
+    A property that is only computed the first time it is asked for, after which the result is kept on the object.
+    Used by the page objects of the scrapers, such that every section of a page is parsed at most once, no matter how
+    many consumers ask for it.
+"""
+
+
+class lazy_property(object):
+    def __init__(self, function):
+        self.function = function
+        self.name = function.__name__
+        self.__doc__ = function.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        # Storing the value under the same name means the next lookup finds it on the object and never gets here.
+        value = instance.__dict__[self.name] = self.function(instance)
+        return value
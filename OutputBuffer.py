@@ -0,0 +1,111 @@
+import threading
+
+import Instrumentation
+
+"""
+    Collects what the scrapers found and hands it over to the IO in batches, such that an IO that writes to a database
+    can store many records in one go instead of one at a time.
+"""
+
+
+class OutputBuffer(object):
+    def __init__(self, io, batch_size=1, lock=None, checkpoint=None):
+        """
+            Parameters
+            ----------
+            io: AbstractInputOutput
+                The IO that receives the batches.
+            batch_size: int
+                The amount of records that is collected before they are handed over. 1 hands over every record
+                immediately, like the scrapers used to.
+            lock: threading.Lock
+                The lock that makes sure only one thread at a time calls the IO.
+            checkpoint: Checkpoint.Checkpoint
+                The journal in which finished work is recorded, once everything that came before it reached the IO.
+        """
+        self.io = io
+        self.batch_size = batch_size
+        self.lock = lock if lock is not None else threading.Lock()
+        self.ratings = []
+        self.invalid_players = []
+        self.match_results = []
+        self.competitions = []
+        self.checkpoint = checkpoint
+        self.finished = []
+        self.watermarks = []
+
+    def add_player_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating, year_e_rating,
+                          year_d_rating):
+        self.add(self.ratings, (knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating, year_e_rating,
+                                year_d_rating))
+
+    def add_invalid_player(self, knltb_number):
+        self.add(self.invalid_players, knltb_number)
+
+    def add_match_results(self, knltb_number, matches):
+        self.add(self.match_results, (knltb_number, matches))
+
+    def add_competition(self, season, own_teams, comp_url, comp_info, comp_results, comp_play_times):
+        self.add(self.competitions, (season, own_teams, comp_url, comp_info, comp_results, comp_play_times))
+
+    def add_finished(self, kind, key, value=True):
+        """
+            Marks work as finished in the checkpoint, see Checkpoint.record. It is only written to the journal when
+            the records that were added before it are handed over, such that a restart never skips work of which the
+            results did not reach the IO.
+        """
+        if self.checkpoint is None:
+            return
+        with self.lock:
+            self.finished.append((kind, key, value))
+            if not (self.ratings or self.invalid_players or self.match_results or self.competitions):
+                self.hand_over()
+
+    def add_watermark(self, watermarks, knltb_number, page_fingerprint, list_of_matches):
+        """
+            Updates the watermarks of a player, see Watermarks.WatermarkStore.update. Like add_finished, this only
+            happens when the records that were added before it are handed over, such that the saved watermarks never
+            cover matches that did not reach the IO.
+        """
+        with self.lock:
+            self.watermarks.append((watermarks, knltb_number, page_fingerprint, list_of_matches))
+            if not (self.ratings or self.invalid_players or self.match_results or self.competitions):
+                self.hand_over()
+
+    def add(self, records, record):
+        with self.lock:
+            records.append(record)
+            if len(records) >= self.batch_size:
+                self.hand_over()
+
+    def hand_over(self):
+        """
+            Hands everything that was collected over to the IO, the lock has to be held.
+        """
+        ratings, self.ratings = self.ratings, []
+        invalid_players, self.invalid_players = self.invalid_players, []
+        match_results, self.match_results = self.match_results, []
+        competitions, self.competitions = self.competitions, []
+        finished, self.finished = self.finished, []
+        watermarks, self.watermarks = self.watermarks, []
+        with Instrumentation.stage('sink'):
+            if ratings:
+                self.io.set_player_ratings_batch(ratings)
+            if invalid_players:
+                self.io.invalid_players_batch(invalid_players)
+            if match_results:
+                self.io.stream_match_results(iter(match_results))
+            if competitions:
+                self.io.stream_competition(iter(competitions))
+        if finished:
+            self.checkpoint.record_batch(finished)
+        for store, knltb_number, page_fingerprint, list_of_matches in watermarks:
+            store.update(knltb_number, page_fingerprint, list_of_matches)
+
+    def flush(self):
+        """
+            Hands over what is left and tells the IO we are done.
+        """
+        with self.lock:
+            self.hand_over()
+            self.io.flush()
@@ -0,0 +1,75 @@
+import os
+import re
+import threading
+import Queue
+
+import Instrumentation
+
+"""
+    Keeps a copy of loaded pages on the file system, for when you want to look at what the scrapers saw.
+    The pages are written by a background thread, such that writing never slows down the scraping itself.
+"""
+
+
+class PageArchive(object):
+    def __init__(self, directory="pages/", max_pending=1000):
+        """
+            Parameters
+            ----------
+            directory: string
+                The directory the pages are written to.
+            max_pending: int
+                The maximum amount of pages waiting to be written. When the disk can not keep up, pages are dropped
+                instead of holding up the scrapers.
+        """
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.pending = Queue.Queue(max_pending)
+        self.dropped = 0
+        self.writer = threading.Thread(target=self.write_pages)
+        self.writer.daemon = True
+        self.writer.start()
+
+    @staticmethod
+    def filename(url):
+        """
+            A readable filename for the page at this url, for example Spelersprofiel_bondsnummer_20889364.html.
+        """
+        page = url.split('://', 1)[-1].split('/', 1)[-1]
+        return re.sub('[^A-Za-z0-9-]+', '_', page.replace('.aspx', '')).strip('_') + '.html'
+
+    def save(self, url, content):
+        """
+            Queues a page to be written to the archive.
+
+            Parameters
+            ----------
+            url: string
+                The url the page was loaded from, which decides the filename.
+            content: string
+                The html of the page.
+        """
+        try:
+            self.pending.put_nowait((url, content))
+        except Queue.Full:
+            self.dropped += 1
+
+    def write_pages(self):
+        while True:
+            url, content = self.pending.get()
+            try:
+                with Instrumentation.stage('write'):
+                    with open(os.path.join(self.directory, self.filename(url)), 'wb') as fd:
+                        fd.write(content)
+            except IOError as e:
+                Instrumentation.count('errors')
+                print('Could not archive {}: {}'.format(url, e))
+            finally:
+                self.pending.task_done()
+
+    def flush(self):
+        """
+            Waits until every queued page is written.
+        """
+        self.pending.join()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import requests
+
+import HttpSession
+
+"""
+    A cache on the file system for the pages of the public KNLTB site, such that pages that did not change are not
+    downloaded again in the next run.
+
+    Every page is looked up by its url and query parameters. The body is stored under the hash of its content, such
+    that equal pages are only stored once. A page that is younger than the time to live of its page type is used
+    without asking the site. An older page is revalidated with the ETag and Last-Modified the site gave us, and only
+    downloaded again when the site says it changed.
+"""
+
+"""
+    How long, in seconds, a page of a specific type may be used without asking the site whether it changed.
+"""
+default_ttls = {
+    'competition_search': 7 * 24 * 3600,  # The list of competitions only changes a couple of times a year.
+    'association_teams': 24 * 3600,  # Teams are only added when a competition starts.
+    'standings': 10 * 60,  # Results come in during match days.
+    'player': 30 * 60,
+}
+
+
+class PageCache(object):
+    def __init__(self, directory="cache/", ttls=None):
+        """
+            Parameters
+            ----------
+            directory: string
+                The directory in which the cache is stored.
+            ttls: dict<string, int>
+                The time to live in seconds per page type, page types that are not given use default_ttls.
+        """
+        self.directory = directory
+        self.ttls = dict(default_ttls)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.entry_directory = os.path.join(directory, 'entries')
+        self.body_directory = os.path.join(directory, 'bodies')
+        for path in [self.entry_directory, self.body_directory]:
+            if not os.path.exists(path):
+                os.makedirs(path)
+
+    @staticmethod
+    def key(url, params):
+        """
+            The key of a page, which is the same for the same url and query parameters in any order.
+        """
+        query = '&'.join('{}={}'.format(name, value) for name, value in sorted((params or {}).items()))
+        return hashlib.sha1(url + '?' + query).hexdigest()
+
+    def write_atomically(self, filename, data):
+        """
+            Writing to a temporary file first, such that other workers or an interrupted run never see half a file.
+        """
+        handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with os.fdopen(handle, 'wb') as fd:
+            fd.write(data)
+        os.rename(temporary_filename, filename)
+
+    def read_entry(self, key):
+        try:
+            with open(os.path.join(self.entry_directory, key + '.json'), 'r') as fd:
+                return json.load(fd)
+        except (IOError, ValueError):
+            return None
+
+    def write_entry(self, key, entry):
+        self.write_atomically(os.path.join(self.entry_directory, key + '.json'), json.dumps(entry))
+
+    def read_body(self, body_hash):
+        try:
+            with open(os.path.join(self.body_directory, body_hash), 'rb') as fd:
+                return fd.read()
+        except IOError:
+            return None
+
+    def write_body(self, body):
+        body_hash = hashlib.sha1(body).hexdigest()
+        filename = os.path.join(self.body_directory, body_hash)
+        if not os.path.exists(filename):
+            self.write_atomically(filename, body)
+        return body_hash
+
+    @staticmethod
+    def cached_response(url, params, body):
+        """
+            Builds a response from a cached body, such that the scrapers can not tell it apart from a loaded page.
+        """
+        response = requests.models.Response()
+        response.status_code = 200
+        response.url = requests.Request('GET', url, params=params).prepare().url
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def fetch(self, session, url, params, page_type):
+        """
+            Loading a page from the cache when it is still fresh, otherwise asking the site whether it changed.
+
+            Parameters
+            ----------
+            session: HttpSession.HttpSession
+                The session used when the page has to be revalidated or downloaded.
+            url: string
+                The page we want to load.
+            params: dict
+                The query parameters of the page.
+            page_type: string
+                The type of the page, which decides how long it may be used without asking the site.
+
+            Returns
+            -------
+            requests.Response
+                The response, either loaded from the site or rebuilt from the cache.
+        """
+        key = self.key(url, params)
+        entry = self.read_entry(key)
+        body = self.read_body(entry['body']) if entry is not None else None
+        if body is not None and time.time() - entry['fetched_at'] < self.ttls.get(page_type, 0):
+            return self.cached_response(url, params, body)
+
+        headers = {}
+        if body is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if body is not None and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        response = session.get(url, params, headers)
+
+        if response.status_code == 304 and body is not None:
+            entry['fetched_at'] = time.time()
+            self.write_entry(key, entry)
+            return self.cached_response(url, params, body)
+        if response.status_code == 200 and not HttpSession.is_error_page(response):
+            # The site sends its error page with status 200, it should not be used again for the whole ttl.
+            self.write_entry(key, {'url': response.url, 'page_type': page_type, 'fetched_at': time.time(),
+                                   'body': self.write_body(response.content),
+                                   'etag': response.headers.get('ETag'),
+                                   'last_modified': response.headers.get('Last-Modified')})
+        return response
+
+    def prune(self, max_age=30 * 24 * 3600):
+        """
+            Removes the pages that were not fetched for max_age seconds and the bodies no page refers to anymore.
+
+            Returns
+            -------
+            removed: int
+                The amount of bodies that were removed.
+        """
+        in_use = set()
+        for filename in os.listdir(self.entry_directory):
+            if not filename.endswith('.json'):
+                continue
+            entry = self.read_entry(filename[:-len('.json')])
+            if entry is None or time.time() - entry['fetched_at'] > max_age:
+                os.remove(os.path.join(self.entry_directory, filename))
+            else:
+                in_use.add(entry['body'])
+        removed = 0
+        for body_hash in os.listdir(self.body_directory):
+            if len(body_hash) == 40 and body_hash not in in_use:
+                os.remove(os.path.join(self.body_directory, body_hash))
+                removed += 1
+        return removed
@@ -0,0 +1,659 @@
+import bisect
+import re
+import threading
+
+try:
+    from HTMLParser import HTMLParser
+except ImportError:
+    from html.parser import HTMLParser
+
+try:
+    import lxml.etree
+except ImportError:
+    lxml = None
+
+"""
+    The ways the pages of the public KNLTB site can be read. The scrapers use the one set by their parser_backend,
+    such that the fastest one that still reads the pages correctly can be picked per run, see ParserChecks.py.
+
+    find          The searching functions of the scrapers, which look for the markup around every value.
+    single_pass   PlayerScraper.parse_player_page for player pages, the searching functions for team pages.
+    html_parser   Builds a tree of the page with the HTMLParser of the standard library and reads the values from its
+                  elements.
+    lxml          The same tree, built by lxml. Requires lxml.
+
+    The trees keep every text as it is written in the page, entities included, such that they give exactly the values
+    the searching functions give. Whenever a page does not look like the tree backends expect, they hand it to the
+    searching functions, like the single pass parser does.
+"""
+
+void_tags = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source',
+                       'wbr'])
+implied_ends = {'td': ('td', 'th'), 'th': ('td', 'th'), 'tr': ('tr', 'td', 'th'), 'li': ('li',), 'p': ('p',),
+                'option': ('option',)}  # The open elements a start tag closes, when their end tag was left out.
+player_labels = ['Speelsterkte Enkel 2017', 'Speelsterkte Dubbel 2017', 'Rating Enkel', 'Rating Dubbel',
+                 'Eindejaarsrating Enkel', 'Eindejaarsrating Dubbel']
+profile_marker = 'Spelersprofiel\r\n        :&nbsp;'
+match_cell = 'crm-wp-cell crm-wp-cell-padding-top'
+match_detail_cell = 'crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom'
+planning_labels = [('Aanvang:&lt;/b> ', '&lt;br/>'), ('Aanwezig:&lt;/b> ', '&lt;br/>'),
+                   ('Baansoort:&lt;/b> ', '&lt;br/>'), ('Opmerking:&lt;/b>', None)]
+lxml_unwritable = re.compile(r'&(?!amp;|lt;|nbsp;)')  # Entities lxml decodes that written cannot tell apart.
+
+
+player_module = None  # The PlayerScraper module the pages are read with, see register.
+competition_module = None  # The CompetitionScraper module the pages are read with, see register.
+
+
+class UnexpectedPage(Exception):
+    """
+        Raised by the single pass parser and the tree backends when the page does not look like they expect, such
+        that the page is parsed by the searching functions instead.
+    """
+    pass
+
+
+def register(player_scraper=None, competition_scraper=None):
+    """
+        Sets the scraper modules of which the backends use the searching functions, records and settings. Every
+        scraper registers itself when it is loaded, also when it runs as a script, such that the backends do not
+        import a second copy of it with settings of its own. The first module of every scraper is kept.
+    """
+    global player_module, competition_module
+    if player_module is None:
+        player_module = player_scraper
+    if competition_module is None:
+        competition_module = competition_scraper
+
+
+def player_scraper():
+    if player_module is None:
+        import PlayerScraper  # Registers itself, for when the backends are used without running a scraper.
+    return player_module
+
+
+def competition_scraper():
+    if competition_module is None:
+        import CompetitionScraper  # Registers itself, like PlayerScraper.
+    return competition_module
+
+
+class Element(object):
+    """
+        An element of the page. Its parts are the texts and elements in it, in the order of the page. order and end
+        are the positions of its start and of the last thing in it, counted over all elements and texts of the page.
+    """
+    __slots__ = ('tag', 'attrs', 'parts', 'order', 'end')
+
+    def __init__(self, tag, attrs, order):
+        self.tag = tag
+        self.attrs = attrs
+        self.parts = []
+        self.order = order
+        self.end = order
+
+    def text(self):
+        """
+            The text in the element as it is written in the page.
+
+            Raises errors
+            -------
+            UnexpectedPage, when the element contains other elements.
+        """
+        for part in self.parts:
+            if type(part) is Element:
+                raise UnexpectedPage()
+        return ''.join(self.parts)
+
+    def cells(self):
+        return [part for part in self.parts if type(part) is Element and part.tag in ('td', 'th')]
+
+
+class Document(object):
+    """
+        The tree of a page. Besides the root it lists every element in the order they start, and every text that
+        directly follows a tag, with its position and the element it is in.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.elements = []
+        self.texts = []
+
+    def texts_starting_with(self, start):
+        return [(order, text, element) for order, text, element in self.texts if text.startswith(start)]
+
+    def first_text_containing(self, part, after=0):
+        for order, text, _ in self.texts:
+            if order > after and part in text:
+                return order
+        return None
+
+
+class TreeBuilder(object):
+    """
+        Builds a Document out of the tags and texts of a page, whichever parser finds them.
+    """
+    def __init__(self):
+        self.order = 0
+        self.document = Document(Element(None, {}, 0))
+        self.stack = [self.document.root]
+        self.after_tag = True
+        self.current_text = None
+
+    def start(self, tag, attrs):
+        closes = implied_ends.get(tag)
+        if closes:
+            while self.stack[-1].tag in closes:
+                self.stack.pop().end = self.order
+        self.order += 1
+        element = Element(tag, attrs, self.order)
+        self.stack[-1].parts.append(element)
+        self.document.elements.append(element)
+        if tag not in void_tags:
+            self.stack.append(element)
+        self.after_tag = True
+
+    def end(self, tag):
+        for idx in range(len(self.stack) - 1, 0, -1):
+            if self.stack[idx].tag == tag:
+                for element in self.stack[idx:]:
+                    element.end = self.order
+                del self.stack[idx:]
+                break
+        self.after_tag = True
+
+    def data(self, text):
+        parts = self.stack[-1].parts
+        if self.after_tag:
+            self.order += 1
+            self.current_text = [self.order, text, self.stack[-1]]
+            self.document.texts.append(self.current_text)
+            parts.append(text)
+        else:
+            # Texts are handed over in pieces around entities, the pieces are joined into a single text.
+            parts[-1] += text
+            self.current_text[1] = parts[-1]
+        self.after_tag = False
+
+    def close(self):
+        for element in self.stack[1:]:
+            element.end = self.order
+        self.document.texts = [tuple(text) for text in self.document.texts]
+        return self.document
+
+
+class StandardLibraryParser(HTMLParser):
+    """
+        Hands the tags and texts HTMLParser finds to a TreeBuilder, keeping entities as they are written.
+    """
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.builder = TreeBuilder()
+
+    def unescape(self, s):
+        return s  # Attributes are kept as they are written, like the searching functions read them.
+
+    def handle_starttag(self, tag, attrs):
+        self.builder.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.builder.start(tag, dict(attrs))
+        self.builder.end(tag)
+
+    def handle_endtag(self, tag):
+        self.builder.end(tag)
+
+    def handle_data(self, data):
+        self.builder.data(data)
+
+    def handle_entityref(self, name):
+        self.builder.data('&' + name + ';')
+
+    def handle_charref(self, name):
+        self.builder.data('&#' + name + ';')
+
+    def handle_comment(self, data):
+        self.builder.after_tag = True
+
+    def handle_decl(self, decl):
+        self.builder.after_tag = True
+
+
+def build_with_html_parser(s):
+    parser = StandardLibraryParser()
+    parser.feed(s)
+    parser.close()
+    return parser.builder.close()
+
+
+def written(value, quote=False):
+    """
+        A text lxml decoded, written back like the page writes it. lxml turns the page into unicode, the scrapers work
+        on the bytes of the page.
+    """
+    if not isinstance(value, str):
+        value = value.encode('utf-8')
+    value = value.replace('&', '&amp;').replace('<', '&lt;').replace('\xc2\xa0', '&nbsp;')
+    return value.replace('"', '&quot;') if quote else value
+
+
+class LxmlTarget(object):
+    """
+        Hands the tags and texts lxml finds to a TreeBuilder.
+    """
+    def __init__(self):
+        self.builder = TreeBuilder()
+
+    def start(self, tag, attrib):
+        self.builder.start(tag, {name: written(value, True) for name, value in attrib.items()})
+
+    def end(self, tag):
+        self.builder.end(tag)
+
+    def data(self, data):
+        self.builder.data(written(data))
+
+    def comment(self, text):
+        self.builder.after_tag = True
+
+    def close(self):
+        return self.builder.close()
+
+
+def build_with_lxml(s):
+    """
+        Raises errors
+        -------
+        UnexpectedPage, when the page has entities written cannot write back, or a non-breaking space that is not
+        written as an entity.
+    """
+    if lxml_unwritable.search(s) or '\xc2\xa0' in s:
+        raise UnexpectedPage()
+    return lxml.etree.fromstring(s, lxml.etree.HTMLParser(target=LxmlTarget(), encoding='utf-8'))
+
+
+class ParserBackend(object):
+    """
+        Reads the values out of the pages, by the searching functions of the scrapers. Other backends give exactly
+        the same values in another way.
+    """
+    def player_page(self, s, with_matches=True):
+        """
+            The ratings, the name of the player and the matches, see PlayerScraper.parse_player_page.
+        """
+        ratings = player_scraper().get_player_ratings(s)
+        if not with_matches:
+            return ratings, False, []
+        player_name, list_of_matches = player_scraper().get_player_matches(s)
+        return ratings, player_name, list_of_matches
+
+    def player_ratings(self, s):
+        """
+            See PlayerScraper.get_player_ratings.
+        """
+        return player_scraper().get_player_ratings(s)
+
+    def team_information(self, s):
+        """
+            See CompetitionScraper.get_team_information.
+        """
+        return competition_scraper().get_team_information(s)
+
+    def team_results(self, s, association):
+        """
+            See CompetitionScraper.get_team_results.
+        """
+        return competition_scraper().get_team_results(s, association)
+
+    def team_planning(self, s, association):
+        """
+            See CompetitionScraper.get_team_planning.
+        """
+        return competition_scraper().get_team_planning(s, association)
+
+    def reads_player_page(self, s):
+        """
+            Whether the backend reads this page itself, instead of handing it to the searching functions.
+        """
+        return True
+
+    def reads_team_page(self, s, association):
+        return True
+
+
+class SinglePassBackend(ParserBackend):
+    """
+        Reads player pages with PlayerScraper.parse_player_page.
+    """
+    def player_page(self, s, with_matches=True):
+        return player_scraper().parse_player_page(s, with_matches)
+
+    def player_ratings(self, s):
+        return self.player_page(s, False)[0]
+
+    def reads_player_page(self, s):
+        try:
+            player_scraper().sweep_player_page(s, True)
+            return True
+        except (UnexpectedPage, ValueError, IndexError):
+            return False
+
+
+class TreeBackend(ParserBackend):
+    """
+        Reads the pages from a tree of their elements. The tree of the last page is kept for every thread, as the
+        scrapers read a page in several parts.
+    """
+    def __init__(self, build):
+        self.build = build
+        self.local = threading.local()
+
+    def document(self, s):
+        if getattr(self.local, 's', None) is not s:
+            try:
+                document = self.build(s)
+            except Exception:
+                raise UnexpectedPage()
+            self.local.s, self.local.document = s, document
+        return self.local.document
+
+    def player_page(self, s, with_matches=True):
+        try:
+            return self.read_player_page(s, with_matches)
+        except UnexpectedPage:
+            return ParserBackend.player_page(self, s, with_matches)
+
+    def player_ratings(self, s):
+        return self.player_page(s, False)[0]
+
+    def team_information(self, s):
+        try:
+            return self.read_team_information(s)
+        except UnexpectedPage:
+            return ParserBackend.team_information(self, s)
+
+    def team_results(self, s, association):
+        try:
+            return self.read_team_results(s, association)
+        except UnexpectedPage:
+            return ParserBackend.team_results(self, s, association)
+
+    def team_planning(self, s, association):
+        try:
+            return self.read_team_planning(s, association)
+        except UnexpectedPage:
+            return ParserBackend.team_planning(self, s, association)
+
+    def reads_player_page(self, s):
+        try:
+            self.read_player_page(s, True)
+            return True
+        except (UnexpectedPage, ValueError, IndexError):
+            return False
+
+    def reads_team_page(self, s, association):
+        try:
+            self.read_team_information(s)
+            self.read_team_results(s, association)
+            self.read_team_planning(s, association)
+            return True
+        except UnexpectedPage:
+            return False
+
+    def read_player_page(self, s, with_matches=True):
+        """
+            See parse_player_page.
+
+            Raises errors
+            -------
+            UnexpectedPage, when the page does not look like we expect.
+        """
+        document = self.document(s)
+        ratings = read_ratings(document)
+        if not with_matches:
+            return ratings, False, []
+
+        # The name is cut out of its text like get_player_matches cuts it out of the page.
+        order = document.first_text_containing(profile_marker)
+        if order is None:
+            raise UnexpectedPage()
+        text = document.texts[bisect.bisect_left(document.texts, (order,))][1]
+        start = text.find(profile_marker) + len(profile_marker)
+        end = text.find('&nbsp;[', start)
+        if end < 0:
+            raise UnexpectedPage()
+        player_name = text[start:end]
+        if len(player_name) > 40 or len(player_name) < 1:
+            return ratings, False, []
+        if ' ' not in player_name:
+            raise UnexpectedPage()
+
+        competition_order = document.first_text_containing('Partijresultaten competitie')
+        tournament_order = document.first_text_containing('Partijresultaten toernooien')
+        if competition_order is None or tournament_order is None or tournament_order < competition_order:
+            raise UnexpectedPage()
+        competition_rows = match_rows(document, competition_order, tournament_order)
+        tournament_rows = match_rows(document, tournament_order, None)
+        list_of_matches = []
+        for rows, tournament_or_competition in [(competition_rows, False), (tournament_rows, True)]:
+            for idx in range(0, len(rows), 3):
+                list_of_matches.append(read_match(rows[idx:idx + 3], tournament_or_competition, player_name))
+        return ratings, player_name, list_of_matches
+
+    def read_team_information(self, s):
+        """
+            See get_team_information.
+
+            Raises errors
+            -------
+            UnexpectedPage, when the page does not look like we expect.
+        """
+        labels = [element for element in self.document(s).elements
+                  if element.tag == 'div' and element.attrs == {'class': 'knltb-public-label'}]
+        if len(labels) < 2:
+            raise UnexpectedPage()
+        return competition_scraper().find_out_what_for_competition_this_is(labels[1].text())
+
+    def read_team_results(self, s, association):
+        """
+            See get_team_results.
+
+            Raises errors
+            -------
+            UnexpectedPage, when the page does not look like we expect.
+        """
+        scraper = competition_scraper()
+        record = scraper.CompactTeamResult if scraper.compact_records else scraper.TeamResult
+        team_results_info = []
+        for row in self.document(s).elements:
+            if row.tag != 'tr' or 'bgcolor' not in row.attrs:
+                continue
+            cells = row.cells()
+            if len(cells) != 7 or cells[0].attrs != {'class': 'crm-wp-cell'} or \
+                    any(cell.attrs != {'class': 'crm-wp-cell', 'width': '30'} for cell in cells[1:]):
+                raise UnexpectedPage()
+            text = cells[0].text()
+            if not text.startswith('\r\n') or text.find('\r\n', 2) < 0:
+                raise UnexpectedPage()
+            total_string = text[2:text.find('\r\n', 2)].strip()
+            team_name = total_string[2:]
+            values = [cell.text() for cell in cells[1:]]
+            team_results_info.append(record(team_name, total_string[0:1], *values +
+                                            [team_name.find(association) >= 0]))
+        return team_results_info
+
+    def read_team_planning(self, s, association):
+        """
+            See get_team_planning. The match day of every match is picked the same way get_team_planning picks it.
+
+            Raises errors
+            -------
+            UnexpectedPage, when the page does not look like we expect.
+        """
+        scraper = competition_scraper()
+        record = scraper.CompactTeamPlanning if scraper.compact_records else scraper.TeamPlanning
+        document = self.document(s)
+        own_texts = document.texts_starting_with(association)
+        days = document.texts_starting_with('Dag ')
+        titled_rows = [element for element in document.elements if element.tag == 'tr' and 'title' in element.attrs]
+        row_orders = [row.order for row in titled_rows]
+
+        team_planning = []
+        day = 0
+        current = own_texts[0] if own_texts else None
+        while current is not None:
+            row_idx = bisect.bisect_left(row_orders, current[0]) - 1
+            if row_idx < 0 or not days:
+                raise UnexpectedPage()
+            row = titled_rows[row_idx]
+            title = row.attrs['title'] or ''
+            values = []
+            position = 0
+            for label, end_label in planning_labels:
+                start = title.find(label, position)
+                if start < 0:
+                    raise UnexpectedPage()
+                start += len(label)
+                position = title.find(end_label, start) if end_label else len(title)
+                if position < 0:
+                    raise UnexpectedPage()
+                values.append(title[start:position])
+            commencement, present, court_type, comment = values
+
+            cells = [cell for cell in row.cells() if cell.attrs == {'class': 'crm-wp-cell'}][:5]
+            if len(cells) < 5:
+                raise UnexpectedPage()
+            team_1, team_2, result_day, status, catch_up = [cell.text() for cell in cells]
+            if team_1.find(association) >= 0:
+                own_team, play_at_home, opponent = team_1, True, team_2
+            else:
+                own_team, play_at_home, opponent = team_2, False, team_1
+
+            day_text = days[day][1][len('Dag '):]
+            if len(day_text) < 13:
+                raise UnexpectedPage()
+            team_planning.append(record(own_team, opponent, play_at_home, day_text[0:1], day_text[3:13], result_day,
+                                        status, catch_up, commencement, present, court_type, comment))
+
+            next_idx = bisect.bisect_left(own_texts, (cells[4].end + 1,))
+            current = own_texts[next_idx] if next_idx < len(own_texts) else None
+            if current is not None:
+                if day + 1 == len(days):
+                    raise UnexpectedPage()  # get_team_planning would read the day from the start of the page.
+                if days[day + 1][0] < current[0]:
+                    day += 1
+        return team_planning
+
+
+def read_ratings(document):
+    """
+        The six ratings, each from the first cell without attributes after its label, see get_player_ratings.
+    """
+    elements = document.elements
+    ratings = []
+    idx = 0
+    for label in player_labels:
+        while idx < len(elements) and not (elements[idx].tag == 'td' and
+                                           elements[idx].attrs == {'class': 'knltb-public-label'} and
+                                           elements[idx].parts == [label]):
+            idx += 1
+        while idx < len(elements) and not (elements[idx].tag == 'td' and elements[idx].attrs == {}):
+            idx += 1
+        if idx == len(elements):
+            raise UnexpectedPage()
+        rating = elements[idx].text()
+        if len(rating) >= 100:
+            raise UnexpectedPage()
+        ratings.append(rating)
+    return ratings
+
+
+def match_rows(document, section_order, next_section_order):
+    """
+        The rows of the matches in the section that starts at section_order, three for every match. These are all
+        rows after the header of its table, up to the next section, as get_matches_information reads a match from every
+        row it finds.
+    """
+    table = next((element for element in document.elements if element.order > section_order and
+                  element.tag == 'table' and element.attrs.get('class') == 'knltb-geselecteerde-toernooien'), None)
+    if table is None:
+        raise UnexpectedPage()
+    header_order = document.first_text_containing('Datum', table.order)
+    if header_order is None or (next_section_order is not None and header_order > next_section_order):
+        raise UnexpectedPage()
+    rows = [element for element in document.elements if element.tag == 'tr' and element.order > header_order and
+            (next_section_order is None or element.order < next_section_order)]
+    if len(rows) % 3 != 0:
+        raise UnexpectedPage()
+    return rows
+
+
+def read_match(rows, tournament_or_competition, player_name):
+    """
+        The MatchInfo of the three rows of a match, see get_match_info.
+    """
+    head, details, players_row = [row.cells() for row in rows]
+    if len(head) != 2 or head[0].attrs != {'class': match_cell} or \
+            head[1].attrs != {'class': match_cell, 'colspan': '4'}:
+        raise UnexpectedPage()
+    detail_attrs = [{'class': match_detail_cell}] + \
+        ([{'class': match_detail_cell, 'colspan': '2'}] if tournament_or_competition else
+         [{'class': match_detail_cell}, {'class': match_detail_cell}]) + [{'class': match_detail_cell, 'colspan': '2'}]
+    if [cell.attrs for cell in details] != detail_attrs:
+        raise UnexpectedPage()
+    fields = [head[0].text(), head[1].text()] + [cell.text() for cell in details]
+
+    amount_of_players = 4 if fields[2] == "Dubbel" else 2
+    if len(players_row) != amount_of_players + 2 or \
+            players_row[-2].attrs != {'class': 'crm-wp-cell', 'style': 'vertical-align:middle;white-space:nowrap'} or \
+            players_row[-1].attrs != {'class': 'crm-wp-cell', 'style': 'vertical-align:middle'}:
+        raise UnexpectedPage()
+    fields += [players_row[-2].text(), players_row[-1].text()]
+    if max(len(field) for field in fields) >= 100:
+        raise UnexpectedPage()
+
+    player_name_lower = player_name.rsplit(' ', 1)
+    player_name_lower = player_name_lower[0] + ' ' + player_name_lower[1].lower()
+    players = []
+    rating_at_start_match = False
+    for cell in players_row[:amount_of_players]:
+        anchors = [part for part in cell.parts if type(part) is Element]
+        if len(anchors) != 1 or anchors[0].tag != 'a' or anchors[0].attrs.get('target') != '_blank':
+            raise UnexpectedPage()
+        text = anchors[0].text()
+        end = text.find(' (')
+        if end < 0 or end >= 100:
+            raise UnexpectedPage()
+        name = text[:end]
+        if name == player_name or name == player_name_lower:
+            if not text.startswith('&nbsp;', end + 2) or not text.endswith(')') or len(text) - end - 9 >= 100:
+                raise UnexpectedPage()
+            rating_at_start_match = text[end + 8:-1]
+        players.append(name)
+    try:
+        return player_scraper().build_match_info(tuple(fields), tournament_or_competition, players, player_name,
+                                                 rating_at_start_match)
+    except ValueError:
+        raise UnexpectedPage()
+
+
+backends = {'find': ParserBackend(), 'single_pass': SinglePassBackend(),
+            'html_parser': TreeBackend(build_with_html_parser)}
+if lxml is not None:
+    backends['lxml'] = TreeBackend(build_with_lxml)
+
+
+def get(name):
+    """
+        The backend with this name.
+
+        Raises errors
+        -------
+        ImportError, when the backend needs a package that is not installed.
+        ValueError, when there is no backend with this name.
+    """
+    if name == 'lxml' and lxml is None:
+        raise ImportError('The lxml parser backend needs lxml, install it with: pip install lxml')
+    if name not in backends:
+        raise ValueError('Unknown parser backend {}, choose from: {}'.format(name, ', '.join(sorted(backends))))
+    return backends[name]
@@ -0,0 +1,258 @@
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import KnltbFixtures
+
+"""
+    Micro benchmarks of the parsers of both scrapers on generated pages, without any network in between.
+    Every benchmark runs in its own process, such that the peak memory of one benchmark does not hide the next one.
+
+    The results can be stored as baselines for this machine. A later run that parses fewer pages per second than the
+    baseline allows, or needs more memory, is reported as a regression and makes the run fail.
+
+    Usage
+    ----------
+    python ParserBenchmarks.py [--save] [benchmark ...]
+"""
+
+baseline_file = "parser_baselines.json"  # Where the baselines of this machine are stored.
+min_duration = 1.0  # Seconds every benchmark keeps parsing its pages, longer gives steadier numbers.
+allowed_slowdown = 0.25  # Part of the pages per second of the baseline a run may lose before it is a regression.
+allowed_memory_growth = 0.25  # Part of the peak memory of the baseline a run may add before it is a regression.
+association = 'A.T.C.'
+
+
+def player_pages(amount, competition_matches, tournament_matches, double_ratio=0.4):
+    return [KnltbFixtures.player_page(nr, competition_matches, tournament_matches, double_ratio=double_ratio)
+            for nr in range(20000000, 20000000 + amount)]
+
+
+def team_pages(amount, amount_of_teams, match_days):
+    return [KnltbFixtures.team_page(association, amount_of_teams, match_days, seed=seed) for seed in range(amount)]
+
+
+def competition_labels(amount):
+    """
+        The labels of team pages that find_out_what_for_competition_this_is reads.
+    """
+    labels = []
+    for idx in range(amount):
+        page = KnltbFixtures.team_page(association, 2, 1, seed=idx)
+        start = page.find('<div class="knltb-public-label">', page.find('<div class="knltb-public-label">') + 1)
+        start += len('<div class="knltb-public-label">')
+        labels.append(page[start:page.find('</div>', start)])
+    return labels
+
+
+"""
+    The fixtures every benchmark can parse, generated inside the process of the benchmark.
+"""
+fixtures = {
+    'player pages': lambda: player_pages(100, 20, 10),
+    'large player pages': lambda: player_pages(20, 150, 80),
+    'singles only': lambda: player_pages(100, 20, 10, double_ratio=0),
+    'doubles only': lambda: player_pages(100, 20, 10, double_ratio=1),
+    'team pages': lambda: team_pages(50, 8, 7),
+    'large team pages': lambda: team_pages(20, 16, 15),
+    'competition labels': lambda: competition_labels(200),
+}
+
+
+def parse_player_ratings(page):
+    import PlayerScraper
+    PlayerScraper.get_player_ratings(page)
+    return 0
+
+
+def parse_player_matches(page):
+    import PlayerScraper
+    return len(PlayerScraper.get_player_matches(page)[1])
+
+
+def parse_player_page_single_pass(page):
+    import PlayerScraper
+    return len(PlayerScraper.parse_player_page(page)[2])
+
+
+def parse_player_page_lazy(page):
+    import PlayerScraper
+    PlayerScraper.lazy_records = True
+    return len(PlayerScraper.parse_player_page(page)[2])
+
+
+def scan_who_won(page):
+    """
+        Reads a single field of every match, like a scan over a large archive would.
+    """
+    import PlayerScraper
+    matches = PlayerScraper.parse_player_page(page)[2]
+    for match_info in matches:
+        match_info.who_won
+    return len(matches)
+
+
+def scan_who_won_lazy(page):
+    import PlayerScraper
+    PlayerScraper.lazy_records = True
+    return scan_who_won(page)
+
+
+def parse_team_info(page):
+    import CompetitionScraper
+    CompetitionScraper.get_team_information(page)
+    CompetitionScraper.get_team_results(page, association)
+    return 0
+
+
+def parse_team_planning(page):
+    import CompetitionScraper
+    return len(CompetitionScraper.get_team_planning(page, association))
+
+
+def parse_player_page_html_parser(page):
+    import ParserBackends
+    return len(ParserBackends.get('html_parser').player_page(page)[2])
+
+
+def parse_player_page_lxml(page):
+    import ParserBackends
+    return len(ParserBackends.get('lxml').player_page(page)[2])
+
+
+def parse_team_planning_html_parser(page):
+    import ParserBackends
+    return len(ParserBackends.get('html_parser').team_planning(page, association))
+
+
+def parse_competition_label(label):
+    import CompetitionScraper
+    CompetitionScraper.find_out_what_for_competition_this_is(label)
+    return 0
+
+
+"""
+    Every benchmark, by name, with the fixture it parses and the parser it measures.
+    The parser returns how many matches it found, or 0 when the page does not contain matches.
+"""
+benchmarks = {
+    'player ratings': ('player pages', parse_player_ratings),
+    'player matches': ('player pages', parse_player_matches),
+    'player matches large': ('large player pages', parse_player_matches),
+    'player matches singles': ('singles only', parse_player_matches),
+    'player matches doubles': ('doubles only', parse_player_matches),
+    'player single pass': ('player pages', parse_player_page_single_pass),
+    'player lazy records': ('player pages', parse_player_page_lazy),
+    'who won scan': ('large player pages', scan_who_won),
+    'who won scan lazy': ('large player pages', scan_who_won_lazy),
+    'team info': ('team pages', parse_team_info),
+    'team planning': ('team pages', parse_team_planning),
+    'team planning large': ('large team pages', parse_team_planning),
+    'competition label': ('competition labels', parse_competition_label),
+    'player html parser': ('player pages', parse_player_page_html_parser),
+    'team planning html parser': ('team pages', parse_team_planning_html_parser),
+}
+try:
+    import lxml
+    benchmarks['player lxml'] = ('player pages', parse_player_page_lxml)
+except ImportError:
+    pass
+
+
+def peak_memory():
+    """
+        The most memory this process used so far, in MB. Linux reports it in KB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_benchmark(name):
+    """
+        Parses the pages of the benchmark over and over until min_duration passed.
+
+        Returns
+        -------
+        result: dict
+            The pages per second, matches per second and the peak memory in MB of this process.
+    """
+    fixture, parser = benchmarks[name]
+    pages = fixtures[fixture]()
+    for page in pages:
+        parser(page)  # Warming up, such that importing the scrapers is not part of the measurement.
+    amount_of_pages = 0
+    amount_of_matches = 0
+    start = time.time()
+    while time.time() - start < min_duration:
+        for page in pages:
+            amount_of_matches += parser(page)
+        amount_of_pages += len(pages)
+    duration = time.time() - start
+    return {'pages_per_sec': amount_of_pages / duration, 'matches_per_sec': amount_of_matches / duration,
+            'peak_memory_mb': peak_memory()}
+
+
+def run_in_own_process(name):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=lambda: results.put(run_benchmark(name)))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def regressions(name, result, baseline):
+    """
+        Comparing a result with its baseline.
+
+        Returns
+        -------
+        problems: list<string>
+            A description of every way in which the result is worse than the baseline allows.
+    """
+    problems = []
+    if result['pages_per_sec'] < baseline['pages_per_sec'] * (1 - allowed_slowdown):
+        problems.append('{}: {:.2f} pages/sec, the baseline is {:.2f}'.format(name, result['pages_per_sec'],
+                                                                             baseline['pages_per_sec']))
+    if result['peak_memory_mb'] > baseline['peak_memory_mb'] * (1 + allowed_memory_growth):
+        problems.append('{}: {:.1f} MB peak memory, the baseline is {:.1f} MB'.format(
+            name, result['peak_memory_mb'], baseline['peak_memory_mb']))
+    return problems
+
+
+def load_baselines():
+    if not os.path.exists(baseline_file):
+        return {}
+    with open(baseline_file, 'r') as fd:
+        return json.load(fd)
+
+
+def save_baselines(baselines):
+    with open(baseline_file, 'w') as fd:
+        json.dump(baselines, fd, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    save = '--save' in sys.argv
+    names = [argument for argument in sys.argv[1:] if argument != '--save'] or sorted(benchmarks)
+    baselines = load_baselines()
+    problems = []
+    print('{:<24} {:>12} {:>14} {:>10}'.format('benchmark', 'pages/sec', 'matches/sec', 'peak MB'))
+    for name in names:
+        result = run_in_own_process(name)
+        print('{:<24} {:>12.2f} {:>14.2f} {:>10.1f}'.format(name, result['pages_per_sec'],
+                                                            result['matches_per_sec'], result['peak_memory_mb']))
+        if save:
+            baselines[name] = result
+        elif name in baselines:
+            problems += regressions(name, result, baselines[name])
+    if save:
+        save_baselines(baselines)
+        print('Stored the baselines in {}'.format(baseline_file))
+    elif not baselines:
+        print('No baselines yet, store them with: python ParserBenchmarks.py --save')
+    for problem in problems:
+        print('Regression in ' + problem)
+    sys.exit(1 if problems else 0)
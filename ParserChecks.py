@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+
+import KnltbFixtures
+import ParserBackends
+
+"""
+    Checks that every parser backend gives exactly the same result as the searching functions, on generated pages and
+    on pages recorded by PageArchive, and compares how fast they are. See ParserBackends.py.
+
+    Usage
+    ----------
+    python ParserChecks.py [directory with recorded pages] [association of the recorded team pages]
+"""
+
+association = 'A.T.C.'  # The association of the generated team pages.
+
+
+def fixture_pages():
+    """
+        Generated player pages of many shapes, including a couple of broken ones that the other backends should
+        hand over to the searching functions.
+    """
+    pages = []
+    for nr, (competition_matches, tournament_matches) in enumerate([(0, 0), (1, 0), (0, 1), (20, 10), (150, 80),
+                                                                    (3, 300)]):
+        pages.append(KnltbFixtures.player_page(20000000 + nr, competition_matches, tournament_matches))
+    for nr in range(20000100, 20000150):
+        pages.append(KnltbFixtures.player_page(nr))
+    page = KnltbFixtures.player_page(20000200)
+    pages.append(page.replace('Rating Dubbel', 'Rating dubbel'))
+    pages.append(page.replace('Partijresultaten toernooien', 'Toernooien'))
+    pages.append(page.replace('</body>', '<table><tr><td>Footer</td></tr></table></body>'))
+    pages.append(page.replace('(&nbsp;', '(', 3))
+    pages.append(page.replace('Voorjaarscompetitie', 'Voorjaars&shy;competitie'))
+    pages.append('<html><body>Deze speler bestaat niet</body></html>')
+    return pages
+
+
+def fixture_team_pages():
+    """
+        Generated team pages of many shapes, including a couple of broken ones. Pages on which the searching functions
+        never finish, like one without the title of a planned match, are left out.
+    """
+    pages = []
+    for seed, (amount_of_teams, match_days, own_teams) in enumerate([(2, 1, 1), (8, 7, 1), (16, 15, 1), (8, 7, 2),
+                                                                    (6, 5, 3), (12, 11, 4)]):
+        pages.append(KnltbFixtures.team_page(association, amount_of_teams, match_days, seed, own_teams))
+    for seed in range(100, 130):
+        pages.append(KnltbFixtures.team_page(association, seed=seed))
+    page = KnltbFixtures.team_page(association, seed=200)
+    pages.append(page.replace('<td class="crm-wp-cell" width="30">', '<td class="crm-wp-cell">', 1))
+    pages.append(page.replace('Opmerking:&lt;/b>', 'Opmerking:&lt;/b>&quot;'))
+    pages.append(page.replace('Gravel', 'Gravel &amp; gras'))
+    pages.append(page.replace(association, 'T.C. Oranje &amp; Zonen'))
+    pages.append(page.replace('Dag ', 'Speeldag '))
+    pages.append('<html><body>Deze poule bestaat niet</body></html>')
+    return pages
+
+
+def recorded_pages(directory, prefix):
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.startswith(prefix):
+            with open(os.path.join(directory, filename), 'rb') as fd:
+                pages.append(fd.read())
+    return pages
+
+
+def read_player_page(backend, s):
+    try:
+        return backend.player_page(s)
+    except (ValueError, IndexError) as e:
+        return backend.player_ratings(s), type(e), []
+
+
+def read_team_page(backend, s, association):
+    try:
+        return backend.team_information(s), backend.team_results(s, association), \
+            backend.team_planning(s, association)
+    except (ValueError, IndexError) as e:
+        return type(e)
+
+
+def check_pages(backend, pages, team_pages, association):
+    """
+        Reads every page with the backend and with the searching functions.
+
+        Returns
+        -------
+        differences: int
+            The amount of pages for which the backend did not agree with the searching functions.
+        read_by_backend: int
+            The amount of pages the backend could read by itself.
+    """
+    searching = ParserBackends.get('find')
+    differences = 0
+    read_by_backend = 0
+    for page in pages:
+        expected = read_player_page(searching, page)
+        if read_player_page(backend, page) != expected:
+            differences += 1
+            print('Backend does not agree on the page of {}'.format(expected[1]))
+        read_by_backend += backend.reads_player_page(page)
+    for page in team_pages:
+        expected = read_team_page(searching, page, association)
+        if read_team_page(backend, page, association) != expected:
+            differences += 1
+            print('Backend does not agree on the team page of {}'.format(expected[0]))
+        read_by_backend += backend.reads_team_page(page, association)
+    return differences, read_by_backend
+
+
+def compare_speed(pages, team_pages, repeat=3):
+    for name in sorted(ParserBackends.backends):
+        backend = ParserBackends.get(name)
+        start = time.time()
+        for _ in range(repeat):
+            for page in pages:
+                read_player_page(backend, page)
+        player_duration = time.time() - start
+        start = time.time()
+        for _ in range(repeat):
+            for page in team_pages:
+                read_team_page(backend, page, association)
+        team_duration = time.time() - start
+        print('{:<12} {:>8.2f} player pages/sec {:>8.2f} team pages/sec'.format(
+            name, len(pages) * repeat / player_duration, len(team_pages) * repeat / team_duration))
+
+
+if __name__ == '__main__':
+    pages = fixture_pages()
+    team_pages = fixture_team_pages()
+    recorded_team_pages = []
+    if len(sys.argv) > 1:
+        pages += recorded_pages(sys.argv[1], 'Spelersprofiel')
+        recorded_team_pages = recorded_pages(sys.argv[1], 'StandenEnUitslagen')
+    total_differences = 0
+    for name in sorted(ParserBackends.backends):
+        if name == 'find':
+            continue
+        backend = ParserBackends.get(name)
+        differences, read_by_backend = check_pages(backend, pages, team_pages, association)
+        if recorded_team_pages:
+            recorded_differences, recorded_read = check_pages(backend, [], recorded_team_pages,
+                                                              sys.argv[2] if len(sys.argv) > 2 else association)
+            differences += recorded_differences
+            read_by_backend += recorded_read
+        total_differences += differences
+        print('{:<12} {} pages checked, {} read by the backend itself, {} differences'.format(
+            name, len(pages) + len(team_pages) + len(recorded_team_pages), read_by_backend, differences))
+    compare_speed([KnltbFixtures.player_page(nr) for nr in range(20000000, 20000100)],
+                  [KnltbFixtures.team_page(association, seed=seed) for seed in range(50)])
+    sys.exit(1 if total_differences else 0)
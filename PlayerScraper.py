@@ -1,10 +1,24 @@
+import array
 import collections
-
-import requests
-import mmap
+import itertools
+import operator
+import re
+import sys
 import time
+import threading
+import Queue
 import TerminalColors as BgColors
-import os
+import RateLimiter
+import HttpSession
+import PageArchive
+import Watermarks
+import OutputBuffer
+import Records
+import WorkQueue
+import Checkpoint
+import Instrumentation
+import ParserBackends
+from LazyProperty import lazy_property
 
 """
     Please specify here which InputOutput you will be using.
@@ -13,13 +27,40 @@ import os
      and what your html_page_directory should be.
 """
 # import YourIO as InputOutput
-# io = InputOutput.YourIO()
+# io_class = InputOutput.YourIO
+# import PageCache
+# HttpSession.page_cache = PageCache.PageCache("cache/")  # Reuses pages that did not change since the last run.
 import GeneralIO as InputOutput
-io = InputOutput.GeneralIO()
+io_class = InputOutput.GeneralIO  # Made on first use by get_io, not when this file is imported.
+io = None
 
 debug = False  # Whether you want verbose information.
 html_page_directory = "pages/"  # Which dictionary the html files should end up in.
+archive_pages = False  # Whether every loaded page is also written to the html_page_directory, in the background.
 delay_time = 0.75  # Time between page loads. The lower, the more risky.. Keep it at at least 0.5!
+adaptive_pacing = False  # Pace page loads by how the site responds instead of delay_time, see RateLimiter.py.
+pacing_floor = 0.2  # Pages per second the adaptive pacing never goes below.
+pacing_ceiling = 4.0  # Pages per second the adaptive pacing never goes above.
+parser_backend = 'find'  # How pages are read: find, single_pass, html_parser or lxml, see ParserBackends.py.
+workers = 1  # Amount of players that are fetched and parsed at the same time. 1 is the old sequential behaviour.
+base_url = "http://publiek.mijnknltb.nl/"  # Where the public KNLTB site lives.
+io_lock = threading.Lock()  # The IO is not expected to be thread safe, so only one worker at a time may call it.
+io_batch_size = 1  # Amount of records collected before they are handed to the IO in one call, 1 hands over each one.
+lazy_records = False  # Matches only cut a field out of the page when it is read, with the single_pass parser_backend.
+compact_records = False  # Share repeated texts between matches and store ratings as numbers, for large crawls.
+incremental = False  # Only pass on to the IO what changed since the last run, unchanged players are not parsed at all.
+watermark_file = "watermarks.json"  # Where incremental runs remember what was already passed on to the IO.
+checkpoint_file = None  # Set to a file like "players.journal" to continue an interrupted run, see Checkpoint.py.
+work_queue_file = None  # Set to a file like "work_queue.db" to share the players between processes, see WorkQueue.py.
+work_queue_batch = 10  # Amount of players a worker claims from the work queue at once.
+work_queue_lease = 120.0  # Seconds a claimed player stays with its worker without a heartbeat.
+instrumentation = False  # Time every stage of a page and write the numbers to metrics_file, see Instrumentation.py.
+metrics_file = "metrics"  # Gets a .json and a .prom extension, the latter can be picked up by Prometheus.
+profile_run = False  # Run under cProfile and write the functions that took the most time to profile_file.
+profile_file = "profile.txt"  # Where the profile of the run ends up.
+
+watermarks = None
+watermarks_lock = threading.Lock()
 """
     This python file returns the requested scraped info for the given knltb numbers
 
@@ -35,9 +76,20 @@ delay_time = 0.75  # Time between page loads. The lower, the more risky.. Keep i
 """
 
 
+def get_io():
+    """
+        The IO the players are read from and handed to, made out of io_class the first time it is needed.
+        Set io to use an IO that is already made.
+    """
+    global io
+    if io is None:
+        io = io_class()
+    return io
+
+
 def load_player_page(number):
     """
-        Loading a players KNLTB page into your filesystem.
+        Loading a players KNLTB page into memory.
 
         Parameters
         ----------
@@ -46,26 +98,21 @@ def load_player_page(number):
 
         Returns
         -------
-        open(file)
-            The variable of the open file
+        page: string
+            The downloaded HTML page.
     """
-    url = "http://publiek.mijnknltb.nl/Spelersprofiel.aspx?bondsnummer=" + str(number)
-    r = requests.get(url, stream=True)
-    filename = html_page_directory+'/last_knltb_player.html'
-    with open(filename, 'wb') as fd:
-        for chunk in r.iter_content(chunk_size=128):
-            fd.write(chunk)
-    return open(filename, 'r+')
+    url = base_url + "Spelersprofiel.aspx?bondsnummer=" + str(number)
+    return HttpSession.fetch(url, page_type='player').content
 
 
-def get_player_data(openfile, knltb_number):
+def get_player_data(s, knltb_number):
     """
-        Scraping the information of the KNLTB players webpage which is already downloaded as a file.
+        Scraping the information of the KNLTB players webpage which is already downloaded.
 
         Parameters
         ----------
-        openfile: open(file)
-            The downloaded HTML file from the public KNLTB site for this KNLTB player.
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
         knltb_number: int
             KNLTB number of the person that is the owner of the page and we want to scrape
 
@@ -75,8 +122,23 @@ def get_player_data(openfile, knltb_number):
             Sets the players rating in the IO.
         boolean: whether it is a valid player
     """
-    s = mmap.mmap(openfile.fileno(), 0, access=mmap.ACCESS_READ)
+    return set_player_data(knltb_number, get_player_ratings(s))
+
 
+def get_player_ratings(s):
+    """
+        Getting the ratings from the KNLTB players webpage.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+
+        Returns
+        -------
+        ratings: list<string>
+            The six ratings in the order they are shown on the page, fewer when the page is not a valid player.
+    """
     all_strings = ['<td class="knltb-public-label">Speelsterkte Enkel 2017</td>',
                    '<td class="knltb-public-label">Speelsterkte Dubbel 2017</td>',
                    '<td class="knltb-public-label">Rating Enkel</td>',
@@ -84,9 +146,6 @@ def get_player_data(openfile, knltb_number):
                    '<td class="knltb-public-label">Eindejaarsrating Enkel</td>',
                    '<td class="knltb-public-label">Eindejaarsrating Dubbel</td>']
     ratings = []
-    debug_for_rating = ['Players single rating of this year is ', 'Players double rating of this year is ',
-                        'Players current single rating ', 'Players current double rating ',
-                        'Players single rating end of last year ', 'Players double rating end of last year ']
 
     current_length = 0
     for idx, string in enumerate(all_strings):
@@ -94,27 +153,51 @@ def get_player_data(openfile, knltb_number):
         temp_value, current_length = get_td_val(s, "<td>", current_length)
         if temp_value is not False:
             ratings.append(temp_value)
-            if debug:
-                print(debug_for_rating[idx] + temp_value)
+    return ratings
 
-    s.close()
 
+def set_player_data(knltb_number, ratings, output=None):
+    """
+        Passing the ratings of a player on to the IO.
+
+        Parameters
+        ----------
+        knltb_number: int
+            KNLTB number of the person that is the owner of the page and we want to scrape
+        ratings: list<string>
+            The ratings as returned by get_player_ratings.
+        output: OutputBuffer.OutputBuffer
+            Collects the ratings for the IO, by default they are handed over immediately.
+
+        Returns
+        -------
+        boolean: whether it is a valid player
+    """
+    debug_for_rating = ['Players single rating of this year is ', 'Players double rating of this year is ',
+                        'Players current single rating ', 'Players current double rating ',
+                        'Players single rating end of last year ', 'Players double rating end of last year ']
+    if debug:
+        for idx, rating in enumerate(ratings):
+            print(debug_for_rating[idx] + rating)
+
+    if output is None:
+        output = OutputBuffer.OutputBuffer(get_io(), 1, io_lock)
     if len(ratings) == 6:
-        io.set_player_rating(knltb_number, ratings[2], ratings[3], ratings[4], ratings[5], ratings[0], ratings[1])
+        output.add_player_rating(knltb_number, ratings[2], ratings[3], ratings[4], ratings[5], ratings[0], ratings[1])
         return True
     else:
-        io.invalid_player(knltb_number)
+        output.add_invalid_player(knltb_number)
         return False
 
 
-def get_player_changes_over_time(openfile, knltb_number):
+def get_player_changes_over_time(s, knltb_number):
     """
         Getting match information of a player.
 
         Parameters
         ----------
-        openfile: open(file)
-            The downloaded HTML file from the public KNLTB site for this KNLTB player.
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
         knltb_number: int
             KNLTB number of the person that is the owner of the page and we want to scrape
 
@@ -122,14 +205,36 @@ def get_player_changes_over_time(openfile, knltb_number):
         -------
         Nothing. It calls set_player_match_results in the IO.
     """
-    s = mmap.mmap(openfile.fileno(), 0, access=mmap.ACCESS_READ)
+    player_name, list_of_matches = get_player_matches(s)
+    if player_name is False:
+        return False
+
+    with io_lock:
+        get_io().set_player_match_results(knltb_number, list_of_matches)
 
+
+def get_player_matches(s):
+    """
+        Getting the name of the player and all the matches on the KNLTB players webpage.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+
+        Returns
+        -------
+        player_name: string
+            The name of the player, False when it could not be found.
+        list_of_matches: list<MatchInfo>
+            All competition matches followed by all tournament matches.
+    """
     current_length = s.find('Spelersprofiel\r\n        :&nbsp;')
     current_length += len('Spelersprofiel\r\n        :&nbsp;')
     end_length = s.find('&nbsp;[', current_length)
     player_name = s[current_length:end_length]
     if len(player_name) > 40 or len(player_name) < 1:
-        return False
+        return False, []
 
     list_of_matches = []
 
@@ -143,8 +248,7 @@ def get_player_changes_over_time(openfile, knltb_number):
     current_length = s.find('<table class="knltb-geselecteerde-toernooien" ', current_length)
     for match_result in get_matches_information(s, current_length, player_name, True):
         list_of_matches.append(match_result)
-
-    io.set_player_match_results(knltb_number, list_of_matches)
+    return player_name, list_of_matches
 
 
 def get_matches_information(s, current_length, player_name, tournament_or_competition, stop_length=False):
@@ -153,8 +257,8 @@ def get_matches_information(s, current_length, player_name, tournament_or_compet
 
         Parameters
         ----------
-        s: mmap.mmap
-            The downloaded HTML file opened through the mmap.mmap interface.
+        s: string
+            The downloaded HTML page.
         current_length: int
             The current search location, character, we are in the file.
         player_name: string
@@ -194,6 +298,7 @@ def get_matches_information(s, current_length, player_name, tournament_or_compet
 MatchInfo = collections.namedtuple('Match', 'date event_name tournament_or_competition match_type category '
                                             'club_home club_out added_rating rating_at_start_match partner '
                                             'opponent1 opponent2 home_player who_won match_result')
+CompactMatchInfo = Records.compact(MatchInfo, 'CompactMatchInfo', floats=['added_rating', 'rating_at_start_match'])
 
 
 def get_match_info(s, cl, player_name, tournament_or_competition):
@@ -202,8 +307,8 @@ def get_match_info(s, cl, player_name, tournament_or_competition):
 
         Parameters
         ----------
-        s: mmap.mmap
-            The downloaded HTML file opened through the mmap.mmap interface.
+        s: string
+            The downloaded HTML page.
         cl: int
             The current search location, character, we are in the file.
             Renamed to make the lines fit nicer on a line.
@@ -277,6 +382,41 @@ def get_match_info(s, cl, player_name, tournament_or_competition):
             rating_at_start_match, cl = get_td_val(s, 'nbsp;', cl, ")</a>")
         players.append(random_player_name)
 
+    home_player, partner, opponent1, opponent2 = get_match_roles(players, player_name, match_type)
+
+    who_won, cl = get_td_val(s, 'style="vertical-align:middle;white-space:nowrap">', cl)
+    match_result, cl = get_td_val(s, 'style="vertical-align:middle">', cl)
+
+    match = (CompactMatchInfo if compact_records else MatchInfo)(
+        date, event_name, tournament_or_competition, match_type, category, club_home, club_out, added_rating,
+        rating_at_start_match, partner, opponent1, opponent2, home_player, who_won, match_result)
+
+    return match, cl
+
+
+def get_match_roles(players, player_name, match_type):
+    """
+        Figuring out who was the partner and who were the opponents, given the players in the order of the page.
+
+        Parameters
+        ----------
+        players: list<string>
+            The names of the players of the match, the home players first.
+        player_name: string
+            A string containing the players name
+        match_type: enum("Enkel","Dubbel")
+
+        Returns
+        -------
+        home_player: boolean
+        partner: string. False if not relevant
+        opponent1: string
+        opponent2: string. False if not relevant
+
+        Raises errors
+        -------
+        ValueError, when the player is not one of the players of the match.
+    """
     try:
         index_of_player = players.index(player_name)
     except ValueError:
@@ -310,15 +450,7 @@ def get_match_info(s, cl, player_name, tournament_or_competition):
             home_player = False
             opponent1 = players[0]
         opponent2 = False
-
-    who_won, cl = get_td_val(s, 'style="vertical-align:middle;white-space:nowrap">', cl)
-    match_result, cl = get_td_val(s, 'style="vertical-align:middle">', cl)
-
-    match = MatchInfo(date, event_name, tournament_or_competition, match_type, category, club_home, club_out,
-                      added_rating, rating_at_start_match, partner, opponent1, opponent2, home_player, who_won,
-                      match_result)
-
-    return match, cl
+    return home_player, partner, opponent1, opponent2
 
 
 def get_td_val(s, identifier, current_length, deidentifier="</td>"):
@@ -327,8 +459,8 @@ def get_td_val(s, identifier, current_length, deidentifier="</td>"):
 
         Parameters
         ----------
-        s: mmap.mmap
-            The downloaded HTML file opened through the mmap.mmap interface.
+        s: string
+            The downloaded HTML page.
         identifier: string
             A unique string that we can search for that is followed by the <td>*</td> that we are looking for.
         current_length: int
@@ -352,42 +484,812 @@ def get_td_val(s, identifier, current_length, deidentifier="</td>"):
         return False, False
 
 
-try:
+def skip_to(identifier):
+    """
+        A pattern that skips ahead to the first occurrence of identifier, like s.find(identifier) would. It jumps from
+        one occurrence of the first character of the identifier to the next, which is a lot faster than trying every
+        single position like .*? does.
     """
-        The main loop that combines it all
+    return '(?:[^{0}]*{0})*?{1}'.format(re.escape(identifier[0]), re.escape(identifier[1:]))
 
-        We start out by checking if the directory exists on the file system, if not we create it.
-        Then we follow by getting the KNLTB players and the settings.
-        Then as long as we have a remaining player:
-            We fetch his page
-            We get his ratings
-            If set in settings we also get the changes over time
-        Finally we say bye bye
 
-        Of course you should be able to interrupt with your keyboard, hence by Ctrl+C you can exit the program early.
+def td_val_pattern(identifier, name, deidentifier="</td>"):
     """
+        A pattern that reads the same value get_td_val(s, identifier, current_length, deidentifier) would read.
+    """
+    return skip_to(identifier) + '(?P<{}>.*?){}'.format(name, re.escape(deidentifier))
 
-    if not os.path.exists(html_page_directory):
-        os.makedirs(html_page_directory)
 
-    counter = 0
-    knltb_numbers = io.get_players
-    want_rating_changes, debug = io.get_settings()
-    print BgColors.TerminalColors.ok_blue + "Let's start!" + BgColors.TerminalColors.end_color
-    while counter < len(knltb_numbers):
-        nr = knltb_numbers[counter]
-        html_page = load_player_page(nr)
-        if debug:
-            print('Got player: {}'.format(nr))
-        get_player_data(html_page, nr)
+"""
+    Compiled patterns for the single pass parser. They read every value from the same identifiers as the searching
+    functions do, always picking the first occurrence after the previous value, so a pattern that matches gives
+    exactly the values the searching functions would find.
+"""
+match_separator = '<td class="crm-wp-cell crm-wp-cell-padding-top">'
+match_pattern_start = '(?P<date>.*?)</td>' + \
+    td_val_pattern('<td class="crm-wp-cell crm-wp-cell-padding-top" colspan="4">', 'event_name') + \
+    td_val_pattern('<td class="crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom">', 'match_type')
+match_pattern_end = \
+    td_val_pattern('crm-wp-cell-padding-top crm-wp-cell-padding-bottom" colspan="2">', 'added_rating') + \
+    skip_to('<tr') + '(?P<players>' + skip_to('style="vertical-align:middle;white-space:nowrap">') + ')' + \
+    '(?P<who_won>.*?)</td>' + td_val_pattern('style="vertical-align:middle">', 'match_result') + '(?P<rest>.*)'
+competition_match_pattern = re.compile(
+    match_pattern_start +
+    td_val_pattern('<td class="crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom">', 'club_home') +
+    td_val_pattern('<td class="crm-wp-cell crm-wp-cell-padding-top crm-wp-cell-padding-bottom">', 'club_out') +
+    match_pattern_end, re.DOTALL)
+tournament_match_pattern = re.compile(
+    match_pattern_start + td_val_pattern('crm-wp-cell-padding-bottom" colspan="2">', 'category') +
+    match_pattern_end, re.DOTALL)
+competition_fields = ('date', 'event_name', 'match_type', 'club_home', 'club_out', 'added_rating', 'who_won',
+                      'match_result')
+tournament_fields = ('date', 'event_name', 'match_type', 'category', 'added_rating', 'who_won', 'match_result')
+player_pattern = re.compile(r'" target="_blank">([^<]*?) \(([^<]*?)\)</a>')
+ratings_pattern = re.compile(''.join(skip_to('<td class="knltb-public-label">' + label + '</td>') +
+                                     td_val_pattern('<td>', 'rating{}'.format(idx))
+                                     for idx, label in enumerate(['Speelsterkte Enkel 2017', 'Speelsterkte Dubbel 2017',
+                                                                  'Rating Enkel', 'Rating Dubbel',
+                                                                  'Eindejaarsrating Enkel',
+                                                                  'Eindejaarsrating Dubbel'])), re.DOTALL)
+
+
+UnexpectedPage = ParserBackends.UnexpectedPage  # Raised by the single pass parser, shared with the other backends.
+
+
+def parse_player_page(s, with_matches=True):
+    """
+        Getting the ratings, the name of the player and all matches from the KNLTB players webpage in a single sweep
+        over the page. The page is cut into one piece per match in one go, after which every match is read with a
+        single compiled pattern, instead of searching the page again for every single value.
+        Whenever the page does not look like the patterns expect, the page is parsed with get_player_ratings and
+        get_player_matches instead, such that both ways always give the same result.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+        with_matches: boolean
+            Whether we also want the matches, otherwise we stop after the ratings.
+
+        Returns
+        -------
+        ratings: list<string>
+            See get_player_ratings.
+        player_name: string
+            See get_player_matches, False when with_matches is False.
+        list_of_matches: list<MatchInfo>
+            See get_player_matches.
+    """
+    try:
+        return sweep_player_page(s, with_matches)
+    except UnexpectedPage:
+        ratings = get_player_ratings(s)
+        if not with_matches:
+            return ratings, False, []
+        player_name, list_of_matches = get_player_matches(s)
+        return ratings, player_name, list_of_matches
+
+
+def sweep_player_page(s, with_matches):
+    """
+        The single sweep of parse_player_page.
+
+        Raises errors
+        -------
+        UnexpectedPage, when the page does not look like we expect.
+    """
+    pieces = s.split(match_separator)
+    ratings = ratings_pattern.match(pieces[0])
+    if ratings is None or max(len(rating) for rating in ratings.groups()) >= 100:
+        raise UnexpectedPage()
+    ratings = list(ratings.groups())
+    if not with_matches:
+        return ratings, False, []
+
+    current_length = s.find('Spelersprofiel\r\n        :&nbsp;')
+    end_length = s.find('&nbsp;[', current_length)
+    if current_length < 0 or end_length < 0:
+        raise UnexpectedPage()
+    player_name = s[current_length + len('Spelersprofiel\r\n        :&nbsp;'):end_length]
+    if len(player_name) > 40 or len(player_name) < 1:
+        return ratings, False, []
+    if ' ' not in player_name:
+        raise UnexpectedPage()
+    player_name_lower = player_name.rsplit(' ', 1)
+    player_name_lower = player_name_lower[0] + ' ' + player_name_lower[1].lower()
+
+    # Where get_matches_information starts looking for the first competition and the first tournament match.
+    competition_length = s.find('Partijresultaten competitie')
+    tournament_length = s.find('Partijresultaten toernooien')
+    if competition_length < 0 or tournament_length < competition_length:
+        raise UnexpectedPage()
+    table = '<table class="knltb-geselecteerde-toernooien" '
+    competition_start = s.find('<tr', s.find("Datum", s.find(table, competition_length)))
+    tournament_start = s.find('<tr', s.find("Datum", s.find(table, tournament_length)))
+    if competition_start < 0 or tournament_start < 0 or len(pieces[0]) < competition_start:
+        raise UnexpectedPage()
+
+    list_of_matches = []
+    piece_start = len(pieces[0]) + len(match_separator)
+    last_competition_end = None
+    for idx, piece in enumerate(pieces[1:]):
+        tournament_or_competition = piece_start > tournament_length
+        if tournament_or_competition:
+            if piece_start < tournament_start:
+                raise UnexpectedPage()
+            match = tournament_match_pattern.match(piece)
+        else:
+            match = competition_match_pattern.match(piece)
+        if match is None:
+            raise UnexpectedPage()
+        # The searching functions look for the next match from the next row, so there has to be one in between.
+        if idx < len(pieces) - 2 and piece.find('<tr', match.start('rest')) < 0:
+            raise UnexpectedPage()
+        if lazy_records:
+            list_of_matches.append(lazy_match_info(s, piece, piece_start, match, tournament_or_competition,
+                                                   player_name, player_name_lower))
+        else:
+            fields = match.group(*(tournament_fields if tournament_or_competition else competition_fields))
+            if max(map(len, fields)) >= 100:
+                raise UnexpectedPage()
 
+            amount_of_players = 4 if fields[2] == "Dubbel" else 2
+            players = player_pattern.findall(piece, match.start('players'),
+                                             match.end('players'))[:amount_of_players]
+            if len(players) < amount_of_players:
+                raise UnexpectedPage()
+            rating_at_start_match = False
+            for name, rest in players:
+                if name == player_name or name == player_name_lower:
+                    if rest[:len('&nbsp;')] != '&nbsp;':
+                        raise UnexpectedPage()
+                    rating_at_start_match = rest[len('&nbsp;'):]
+            try:
+                list_of_matches.append(build_match_info(fields, tournament_or_competition,
+                                                        [name for name, _ in players], player_name,
+                                                        rating_at_start_match))
+            except ValueError:
+                raise UnexpectedPage()
+
+        if not tournament_or_competition:
+            last_competition_end = piece_start + match.start('rest')
+        piece_start += len(piece) + len(match_separator)
+
+    # The searching functions would try to read another match from every row after the last match they found.
+    if last_competition_end is not None and 0 <= s.find('<tr', last_competition_end) < tournament_length:
+        raise UnexpectedPage()
+    if len(pieces) > 1 and piece_start > tournament_length and pieces[-1].find('<tr', match.start('rest')) >= 0:
+        raise UnexpectedPage()
+    return ratings, player_name, list_of_matches
+
+
+def build_match_info(fields, tournament_or_competition, players, player_name, rating_at_start_match):
+    """
+        Building the MatchInfo out of the values the single pass parser found for a match, see get_match_info.
+
+        Parameters
+        ----------
+        fields: tuple<string>
+            The values of the match, in the order of competition_fields or tournament_fields.
+        tournament_or_competition: boolean
+            Tournament is true, Competition is false
+        players: list<string>
+            The names of the players of the match, the home players first.
+        player_name: string
+            A string containing the players name
+        rating_at_start_match: string
+            Containing the rating you started the match with.
+
+        Returns
+        -------
+        match_info: MatchInfo
+    """
+    if tournament_or_competition is True:
+        date, event_name, match_type, category, added_rating, who_won, match_result = fields
+        club_home = False
+        club_out = False
+    else:
+        date, event_name, match_type, club_home, club_out, added_rating, who_won, match_result = fields
+        category = False
+    home_player, partner, opponent1, opponent2 = get_match_roles(players, player_name, match_type)
+    return (CompactMatchInfo if compact_records else MatchInfo)(
+        date, event_name, tournament_or_competition, match_type, category, club_home, club_out, added_rating,
+        rating_at_start_match, partner, opponent1, opponent2, home_player, who_won, match_result)
+
+
+def page_parser():
+    """
+        The backend that reads the pages, see parser_backend.
+    """
+    return ParserBackends.get(parser_backend)
+
+
+class PlayerPage(object):
+    """
+        One downloaded page of a player. Every section is parsed the first time it is asked for and kept afterwards,
+        such that the page is never scanned twice for the same information.
+    """
+    def __init__(self, s, knltb_number=None):
+        """
+            Parameters
+            ----------
+            s: string
+                The downloaded HTML page from the public KNLTB site for this KNLTB player.
+            knltb_number: int
+                KNLTB number of the person that is the owner of the page.
+        """
+        self.s = s
+        self.knltb_number = knltb_number
+
+    @lazy_property
+    def ratings(self):
+        """
+            See get_player_ratings.
+        """
+        return page_parser().player_ratings(self.s)
+
+    @lazy_property
+    def match_history(self):
+        """
+            The name of the player and all the matches, see get_player_matches.
+        """
+        ratings, player_name, list_of_matches = page_parser().player_page(self.s)
+        # The ratings were found on the way, no need to look for them again.
+        self.__dict__.setdefault('ratings', ratings)
+        return player_name, list_of_matches
+
+    @property
+    def valid(self):
+        return len(self.ratings) == 6
+
+    @property
+    def player_name(self):
+        return self.match_history[0]
+
+    @property
+    def matches(self):
+        return self.match_history[1]
+
+
+"""
+    The fields a LazyMatchInfo reads straight from the page, in the order of their offsets.
+"""
+lazy_fields = ('date', 'event_name', 'match_type', 'category', 'club_home', 'club_out', 'added_rating',
+               'rating_at_start_match', 'who_won', 'match_result')
+# Picks the spans of lazy_fields out of the spans of a match, -1 is the span of a value that is not on the page.
+lazy_spans = {pattern: operator.itemgetter(*[pattern.groupindex.get(field, -1) for field in lazy_fields])
+              for pattern in (competition_match_pattern, tournament_match_pattern)}
+
+
+def lazy_match_info(s, piece, piece_start, match, tournament_or_competition, player_name, player_name_lower):
+    """
+        Building a LazyMatchInfo out of where the single pass parser found the values of a match, without cutting
+        any value out of the page. Checks the same things build_match_info and the sweep check for a MatchInfo.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+        piece: string
+            The part of the page with this match.
+        piece_start: int
+            Where the piece starts in the page.
+        match: re.MatchObject
+            The values of the match in the piece, see competition_match_pattern and tournament_match_pattern.
+        tournament_or_competition: boolean
+            Tournament is true, Competition is false
+        player_name: string
+            A string containing the players name
+        player_name_lower: string
+            The players name with the last part in lower case, as it is sometimes written in the match tables.
+
+        Returns
+        -------
+        match_info: LazyMatchInfo
+
+        Raises errors
+        -------
+        UnexpectedPage, when the match does not look like we expect.
+    """
+    spans = list(lazy_spans[match.re](match.regs + ((-1, -1),)))
+    if max([end - begin for begin, end in spans]) >= 100:
+        raise UnexpectedPage()
+
+    begin, end = spans[2]  # match_type
+    amount_of_players = 4 if end - begin == len("Dubbel") and piece.startswith("Dubbel", begin) else 2
+    players = list(itertools.islice(player_pattern.finditer(piece, *match.span('players')), amount_of_players))
+    if len(players) < amount_of_players:
+        raise UnexpectedPage()
+    owner_found = False
+    for player in players:
+        name = player.group(1)
+        if name == player_name or name == player_name_lower:
+            owner_found = True
+            begin, end = player.span(2)
+            if not piece.startswith('&nbsp;', begin):
+                raise UnexpectedPage()
+            spans[7] = (begin + len('&nbsp;'), end)  # rating_at_start_match
+    if not owner_found:
+        raise UnexpectedPage()
+
+    # The spans count from the start of the piece, which is stored in front of them.
+    spans.extend(player.regs[1] for player in players)
+    offsets = array.array('i', sum(spans, (piece_start,)))
+    return LazyMatchInfo(s, offsets, tournament_or_competition, player_name)
+
+
+def lazy_field(idx):
+    def read(self):
+        offsets = self.offsets
+        begin = offsets[2 * idx + 1]
+        if begin < 0:
+            return False
+        return self.page[offsets[0] + begin:offsets[0] + offsets[2 * idx + 2]]
+    return property(read)
+
+
+def lazy_role(idx):
+    def read(self):
+        return self.roles()[idx]
+    return property(read)
+
+
+class LazyMatchInfo(object):
+    """
+        A match that only remembers where its values are on the page. A value is cut out of the page when it is read,
+        such that going through many matches for a single field does not build the other fourteen.
+        It has the same fields as MatchInfo and can be used as one, materialize() gives the MatchInfo itself.
+    """
+    __slots__ = ('page', 'offsets', 'tournament_or_competition', 'player_name')
+    _fields = MatchInfo._fields
+
+    def __init__(self, page, offsets, tournament_or_competition, player_name):
+        """
+            Parameters
+            ----------
+            page: string
+                The downloaded HTML page the match is on.
+            offsets: array<int>
+                Where the match starts on the page, followed by where every value in lazy_fields begins and ends from
+                there and where the names of the players begin and end. -1 for values that are not on the page.
+            tournament_or_competition: boolean
+                Tournament is true, Competition is false
+            player_name: string
+                A string containing the players name
+        """
+        self.page = page
+        self.offsets = offsets
+        self.tournament_or_competition = tournament_or_competition
+        self.player_name = player_name
+
+    date = lazy_field(0)
+    event_name = lazy_field(1)
+    match_type = lazy_field(2)
+    category = lazy_field(3)
+    club_home = lazy_field(4)
+    club_out = lazy_field(5)
+    added_rating = lazy_field(6)
+    rating_at_start_match = lazy_field(7)
+    who_won = lazy_field(8)
+    match_result = lazy_field(9)
+    home_player = lazy_role(0)
+    partner = lazy_role(1)
+    opponent1 = lazy_role(2)
+    opponent2 = lazy_role(3)
+
+    def roles(self):
+        """
+            See get_match_roles.
+        """
+        offsets = self.offsets
+        players = [self.page[offsets[0] + offsets[idx]:offsets[0] + offsets[idx + 1]]
+                   for idx in range(2 * len(lazy_fields) + 1, len(offsets), 2)]
+        return get_match_roles(players, self.player_name, self.match_type)
+
+    def materialize(self):
+        return MatchInfo(*self)
+
+    def _asdict(self):
+        return self.materialize()._asdict()
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, idx):
+        return tuple(self)[idx] if isinstance(idx, slice) else getattr(self, self._fields[idx])
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other) if isinstance(other, (tuple, LazyMatchInfo)) else NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+
+def scrape_player(nr, want_rating_changes, output=None):
+    """
+        Fetching and parsing the page of a single player.
+
+        Parameters
+        ----------
+        nr: int
+            The KNLTB number of the person we want to scrape.
+        want_rating_changes: boolean
+            Whether we also want the match results of this player.
+        output: OutputBuffer.OutputBuffer
+            Collects the results for the IO, by default they are handed over immediately.
+
+        Returns
+        -------
+        Nothing. The results are passed on to the IO.
+    """
+    scrape_player_page(load_player_page(nr), nr, want_rating_changes, output)
+
+
+def scrape_player_page(s, nr, want_rating_changes, output=None):
+    """
+        Parsing the page of a single player which is already downloaded.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+        nr: int
+            The KNLTB number of the owner of the page.
+        want_rating_changes: boolean
+            Whether we also want the match results of this player.
+        output: OutputBuffer.OutputBuffer
+            Collects the results for the IO, by default they are handed over immediately.
+
+        Returns
+        -------
+        Nothing. The results are passed on to the IO.
+    """
+    if output is None:
+        output = OutputBuffer.OutputBuffer(get_io(), 1, io_lock)
+    page = PlayerPage(s, nr)
+    if debug:
+        print('Got player: {}'.format(nr))
+    if incremental:
+        page_fingerprint = Watermarks.fingerprint(page.s, want_rating_changes is True)
+        if get_watermarks().unchanged(nr, page_fingerprint):
+            if debug:
+                print('Player {} did not change since the last run'.format(nr))
+            return
+    with Instrumentation.stage('parse'):
         if want_rating_changes is True:
-            get_player_changes_over_time(html_page, nr)
-        counter += 1
+            # Asking for the matches first, such that the single pass parser reads the ratings on the same sweep.
+            page.match_history
+        page.ratings
+    set_player_data(nr, page.ratings, output)
+
+    passed_on_matches = want_rating_changes is True and page.player_name is not False
+    if passed_on_matches:
+        list_of_matches = page.matches
+        Instrumentation.count('matches', len(list_of_matches))
+        if incremental:
+            list_of_matches = get_watermarks().new_matches(nr, list_of_matches)
+        if list_of_matches or not incremental:
+            output.add_match_results(nr, list_of_matches)
+    if incremental:
+        output.add_watermark(get_watermarks(), nr, page_fingerprint, page.matches if passed_on_matches else [])
+
+
+def get_watermarks():
+    """
+        Returns the watermarks of the incremental mode, loading them from the watermark_file on first use.
+    """
+    global watermarks
+    with watermarks_lock:
+        if watermarks is None:
+            watermarks = Watermarks.WatermarkStore(watermark_file)
+        return watermarks
+
+
+def save_watermarks():
+    """
+        Writes the watermarks of the incremental mode to the watermark_file, when they were used in this run.
+    """
+    if watermarks is not None:
+        watermarks.save()
+
+
+def wait_between_pages():
+    """
+        Waiting delay_time after a page, unless the page loads are paced by how the site responds, see
+        adaptive_pacing.
+    """
+    if HttpSession.pacer is None:
         time.sleep(delay_time)
 
-    if counter == len(knltb_numbers):
-        print('Finished Bye Bye, exiting..')
 
-except KeyboardInterrupt:
-    print('Received CTRL + C, exiting..')
+def open_checkpoint(knltb_numbers, want_rating_changes):
+    """
+        The journal of this run when a checkpoint_file is set, which continues the journal of an interrupted run of
+        the same players.
+    """
+    if checkpoint_file is None:
+        return None
+    checkpoint = Checkpoint.Checkpoint(checkpoint_file, Checkpoint.job_key('players', sorted(knltb_numbers),
+                                                                           want_rating_changes is True))
+    if checkpoint.resumed:
+        print('Continuing the interrupted run of {}'.format(checkpoint_file))
+    return checkpoint
+
+
+def close_checkpoint(checkpoint, complete):
+    """
+        Removes the journal when the run is complete, otherwise the next run continues it.
+    """
+    if checkpoint is not None:
+        if complete:
+            checkpoint.finish()
+        else:
+            checkpoint.close()
+
+
+def scrape_players(knltb_numbers, want_rating_changes):
+    """
+        Scraping the players one after another, waiting delay_time after every player.
+        Players that an interrupted run already finished are skipped, see checkpoint_file.
+
+        Parameters
+        ----------
+        knltb_numbers: list<int>
+            The KNLTB numbers of the people we want to scrape.
+        want_rating_changes: boolean
+            Whether we also want the match results of these players.
+
+        Returns
+        -------
+        counter: int
+            The amount of players that were scraped, including those an interrupted run already finished.
+    """
+    checkpoint = open_checkpoint(knltb_numbers, want_rating_changes)
+    output = OutputBuffer.OutputBuffer(get_io(), io_batch_size, io_lock, checkpoint)
+    counter = 0
+    while counter < len(knltb_numbers):
+        if checkpoint is None or not checkpoint.done('player', knltb_numbers[counter]):
+            scrape_player(knltb_numbers[counter], want_rating_changes, output)
+            output.add_finished('player', knltb_numbers[counter])
+            wait_between_pages()
+        counter += 1
+    output.flush()
+    save_watermarks()
+    close_checkpoint(checkpoint, True)
+    return counter
+
+
+def scrape_players_concurrently(knltb_numbers, want_rating_changes, amount_of_workers):
+    """
+        Scraping the players with a pool of workers. Every worker fetches and parses its own players, while one token
+        bucket that is shared by all workers makes sure we never load more than one page per delay_time. This way
+        the waiting for the network of one worker overlaps with the parsing of another.
+
+        Parameters
+        ----------
+        knltb_numbers: list<int>
+            The KNLTB numbers of the people we want to scrape.
+        want_rating_changes: boolean
+            Whether we also want the match results of these players.
+        amount_of_workers: int
+            The maximum amount of players that are being fetched and parsed at the same time.
+
+        Returns
+        -------
+        counter: int
+            The amount of players that were scraped, including those an interrupted run already finished.
+    """
+    limiter = RateLimiter.TokenBucket(1.0 / delay_time)
+    checkpoint = open_checkpoint(knltb_numbers, want_rating_changes)
+    output = OutputBuffer.OutputBuffer(get_io(), io_batch_size, io_lock, checkpoint)
+    remaining_numbers = Queue.Queue()
+    finished = []
+    for nr in knltb_numbers:
+        if checkpoint is not None and checkpoint.done('player', nr):
+            finished.append(nr)
+        else:
+            remaining_numbers.put(nr)
+
+    def worker():
+        while True:
+            try:
+                nr = remaining_numbers.get_nowait()
+            except Queue.Empty:
+                return
+            if HttpSession.pacer is None:
+                limiter.acquire()
+            try:
+                scrape_player(nr, want_rating_changes, output)
+                output.add_finished('player', nr)
+                finished.append(nr)
+            except Exception as e:
+                Instrumentation.count('errors')
+                print(BgColors.TerminalColors.fail + 'Failed scraping player {}: {}'.format(nr, e) +
+                      BgColors.TerminalColors.end_color)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(amount_of_workers, remaining_numbers.qsize()))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        # Joining with a timeout, otherwise Ctrl+C is not delivered until all the players are done.
+        while thread.is_alive():
+            thread.join(0.5)
+    output.flush()
+    save_watermarks()
+    # The players that failed are tried again by the next run, the others are skipped.
+    close_checkpoint(checkpoint, len(finished) == len(knltb_numbers))
+    return len(finished)
+
+
+def scrape_players_from_queue(knltb_numbers, want_rating_changes, amount_of_workers):
+    """
+        Scraping the players of the work queue in work_queue_file, which can be shared by any amount of processes on
+        one or more machines. Every worker claims work_queue_batch players at a time and acknowledges them when they
+        are scraped, players of workers that stopped are claimed again once their lease ran out.
+        All processes share one politeness budget in the same file, such that together they never load more than one
+        page per delay_time.
+
+        Parameters
+        ----------
+        knltb_numbers: list<int>
+            The KNLTB numbers that are added to the queue, players that are already in the queue keep their state.
+        want_rating_changes: boolean
+            Whether we also want the match results of these players.
+        amount_of_workers: int
+            The amount of workers in this process.
+
+        Returns
+        -------
+        counter: int
+            The amount of players that were scraped by this process.
+    """
+    queue = WorkQueue.WorkQueue(work_queue_file, work_queue_lease)
+    queue.add(knltb_numbers)
+    # With adaptive pacing every process finds its own pace, the processes together stay below the ceiling.
+    budget = WorkQueue.SharedBudget(work_queue_file, delay_time if HttpSession.pacer is None else 1.0 / pacing_ceiling)
+    worker = WorkQueue.worker_name()
+    heartbeat = WorkQueue.Heartbeat(queue, worker).start()
+    output = OutputBuffer.OutputBuffer(get_io(), io_batch_size, io_lock)
+    finished = []
+
+    def work():
+        while True:
+            batch = queue.claim(worker, work_queue_batch)
+            if not batch:
+                if not queue.unfinished():
+                    return
+                # Other workers still hold leases, we take over their players when they do not finish them.
+                time.sleep(min(work_queue_lease / 4.0, 5))
+                continue
+            done = []
+            failed = []
+            for nr in batch:
+                budget.acquire()
+                try:
+                    scrape_player(nr, want_rating_changes, output)
+                    done.append(nr)
+                except Exception as e:
+                    Instrumentation.count('errors')
+                    failed.append(nr)
+                    print(BgColors.TerminalColors.fail + 'Failed scraping player {}: {}'.format(nr, e) +
+                          BgColors.TerminalColors.end_color)
+            # Handing the batch to the IO before it is acknowledged, such that a crash never loses a player.
+            with output.lock:
+                output.hand_over()
+            queue.ack(worker, done)
+            queue.release(worker, failed)
+            finished.extend(done)
+
+    threads = [threading.Thread(target=work) for _ in range(max(1, amount_of_workers))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    finally:
+        heartbeat.stop()
+    output.flush()
+    save_watermarks()
+    return len(finished)
+
+
+def set_up():
+    """
+        Sets up what every run of this process shares: the archive of the pages and the adaptive pacing. What is
+        already set up is kept, such that a process that runs many times, like ScrapeDaemon, keeps it warm.
+    """
+    if archive_pages and HttpSession.page_archive is None:
+        HttpSession.page_archive = PageArchive.PageArchive(html_page_directory)
+    if adaptive_pacing and HttpSession.pacer is None:
+        HttpSession.pacer = RateLimiter.AdaptivePacer(1.0 / delay_time, pacing_floor, pacing_ceiling)
+
+
+def run(knltb_numbers=None):
+    """
+        Scrapes the players like running this file does, with the scraping mode of the settings above.
+
+        Parameters
+        ----------
+        knltb_numbers: list<int>
+            The players to scrape, by default the players of the IO.
+
+        Returns
+        -------
+        knltb_numbers: list<int>
+            The players that were asked for.
+        counter: int
+            The amount of players that were scraped, or handed over to the IO with a work_queue_file.
+    """
+    global debug
+    set_up()
+    if knltb_numbers is None:
+        knltb_numbers = get_io().get_players()
+    want_rating_changes, debug = get_io().get_settings()
+    if work_queue_file is not None:
+        counter = scrape_players_from_queue(knltb_numbers, want_rating_changes, workers)
+    elif workers > 1:
+        counter = scrape_players_concurrently(knltb_numbers, want_rating_changes, workers)
+    else:
+        counter = scrape_players(knltb_numbers, want_rating_changes)
+    if HttpSession.page_archive is not None:
+        HttpSession.page_archive.flush()
+    return knltb_numbers, counter
+
+
+ParserBackends.register(player_scraper=sys.modules[__name__])
+
+if __name__ == '__main__':
+    profiler = None
+    try:
+        """
+            The main loop that combines it all
+
+            We start out by setting up the archive of the pages, if requested.
+            Then we follow by getting the KNLTB players and the settings.
+            Then as long as we have a remaining player:
+                We fetch his page
+                We get his ratings
+                If set in settings we also get the changes over time
+            When workers is larger than 1, multiple players are handled at the same time.
+            With a work_queue_file, the players are shared with the other processes using the same file.
+            With a checkpoint_file, the players an interrupted run already finished are skipped.
+            With instrumentation or profile_run, we write down where the time went.
+            Finally we say bye bye
+
+            Of course you should be able to interrupt with your keyboard, hence by Ctrl+C you can exit the program
+            early.
+        """
+
+        if profile_run:
+            profiler = Instrumentation.Profiler().start()
+        if instrumentation:
+            Instrumentation.start()
+
+        print BgColors.TerminalColors.ok_blue + "Let's start!" + BgColors.TerminalColors.end_color
+        knltb_numbers, counter = run()
+
+        if HttpSession.pacer is not None:
+            print(HttpSession.pacer.summary())
+        Instrumentation.report(metrics_file, profiler, profile_file)
+        if counter == len(knltb_numbers) or work_queue_file is not None:
+            print('Finished Bye Bye, exiting..')
+
+    except KeyboardInterrupt:
+        save_watermarks()
+        Instrumentation.report(metrics_file, profiler, profile_file)
+        print('Received CTRL + C, exiting..')
+        if checkpoint_file is not None:
+            print('Run again to continue where this run stopped.')
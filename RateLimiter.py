@@ -0,0 +1,271 @@
+import threading
+import time
+
+"""
+    A token bucket that can be shared between threads to make sure we never load pages faster than the public KNLTB
+    site should be bothered with, no matter how many workers are scraping at the same time.
+"""
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity=1):
+        """
+            Parameters
+            ----------
+            rate: float
+                The amount of tokens (page loads) that are added to the bucket per second.
+            capacity: int
+                The maximum amount of tokens the bucket can hold. This is the largest burst of page loads that can
+                happen right after each other. Keep it at 1 to be as polite as the old fixed delay.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last_refill = time.time()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """
+            Adds the tokens that came in since the last refill. Should only be called while holding the lock.
+        """
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+            Takes a single token out of the bucket, blocking until one is available.
+
+            Returns
+            -------
+            waited: float
+                The amount of seconds we had to wait for the token.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+
+class CircuitBreaker(object):
+    def __init__(self, failure_threshold=5, pause=30.0, max_pause=600.0):
+        """
+            Stops all page loads while the site is down, instead of hammering it with requests that fail anyway.
+            After failure_threshold failures in a row the breaker opens and no page is loaded for pause seconds. Then
+            a single page is let through, when it loads the breaker closes again, when it fails the breaker opens for
+            twice as long, up to max_pause.
+
+            Parameters
+            ----------
+            failure_threshold: int
+                The amount of failed page loads in a row that opens the breaker.
+            pause: float
+                Seconds the breaker stays open the first time.
+            max_pause: float
+                The most seconds the breaker stays open at once.
+        """
+        self.failure_threshold = failure_threshold
+        self.first_pause = pause
+        self.max_pause = max_pause
+        self.pause = pause
+        self.state = 'closed'
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        self.seconds_open = 0.0
+
+    def wait_time(self, now):
+        """
+            Seconds until a page may be loaded, 0 when it may be loaded right away. Should only be called while
+            holding the lock of the pacer.
+        """
+        if self.state == 'open' and now >= self.open_until:
+            self.state = 'half open'
+            self.probing = False
+        if self.state == 'open':
+            return self.open_until - now
+        if self.state == 'half open':
+            if self.probing:
+                return min(1.0, self.pause)  # Waiting for the outcome of the page that tests the site.
+            self.probing = True
+        return 0.0
+
+    def record(self, failed, now, pause=None):
+        """
+            Counts the outcome of a page load. Should only be called while holding the lock of the pacer.
+
+            Parameters
+            ----------
+            failed: boolean
+                Whether the page could not be loaded.
+            now: float
+                The current time.
+            pause: float
+                Seconds the site asked us to wait, with a Retry-After header.
+        """
+        if not failed:
+            if self.state == 'half open':
+                self.pause = self.first_pause
+            self.state = 'closed'
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.state == 'half open':
+            self.pause = min(self.max_pause, self.pause * 2)
+            self.open(now, self.pause)
+        elif self.state == 'closed' and (self.failures >= self.failure_threshold or pause is not None):
+            self.open(now, max(self.pause, pause or 0))
+
+    def open(self, now, pause):
+        self.state = 'open'
+        self.open_until = now + pause
+        self.opened += 1
+        self.seconds_open += pause
+
+
+class AdaptivePacer(object):
+    def __init__(self, rate, floor_rate=0.2, ceiling_rate=4.0, target_latency=1.0, increase=0.2, decrease=0.5,
+                 breaker=None):
+        """
+            Paces page loads by how the site responds, with additive increase and multiplicative decrease (AIMD).
+            While pages load fast and well the rate goes up by increase pages per second every second, a slow page,
+            an HTTP 429 or 5xx or an error page cuts the rate by decrease at once. A CircuitBreaker stops the page
+            loads altogether when the site is down. Shared by all workers, like a TokenBucket.
+
+            Parameters
+            ----------
+            rate: float
+                The pages per second we start with, like 1 / delay_time.
+            floor_rate: float
+                The lowest pages per second the rate is cut down to.
+            ceiling_rate: float
+                The highest pages per second the rate goes up to.
+            target_latency: float
+                Seconds a page may take before it counts as slow.
+            increase: float
+                Pages per second the rate goes up by, every second pages load well.
+            decrease: float
+                The part of the rate that is kept when the site struggles.
+            breaker: CircuitBreaker
+                Pauses the page loads during outages, a default CircuitBreaker when not given.
+        """
+        self.floor_rate = float(floor_rate)
+        self.ceiling_rate = float(ceiling_rate)
+        self.rate = min(self.ceiling_rate, max(self.floor_rate, float(rate)))
+        self.target_latency = target_latency
+        self.increase = increase
+        self.decrease = decrease
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.last_page = 0.0
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counts = {'pages': 0, 'slow': 0, 'failed': 0, 'increases': 0, 'decreases': 0}
+        self.statuses = {}
+        self.latency_total = 0.0
+        self.lowest_rate = self.highest_rate = self.rate
+        self.history = [(0.0, self.rate)]  # The rate after every decrease, and at most every 10 seconds otherwise.
+
+    def acquire(self):
+        """
+            Blocks until the next page may be loaded.
+
+            Returns
+            -------
+            waited: float
+                The amount of seconds we had to wait.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                wait_time = self.breaker.wait_time(now)
+                if wait_time <= 0:
+                    # Looking at the rate again after every wait, such that a changed rate counts right away.
+                    wait_time = self.last_page + 1.0 / self.rate - now
+                    if wait_time <= 0:
+                        self.last_page = now
+                        return waited
+                    if self.breaker.state == 'half open':
+                        self.breaker.probing = False  # Another worker may test the site once the wait is over.
+            time.sleep(min(wait_time, 1.0))
+            waited += min(wait_time, 1.0)
+
+    def report(self, latency, status=None, error_page=False, retry_after=None):
+        """
+            Adjusts the rate to how a page load went.
+
+            Parameters
+            ----------
+            latency: float
+                Seconds the page took to load.
+            status: int
+                The HTTP status of the response, None when the site could not be reached at all.
+            error_page: boolean
+                Whether the site answered with its error page.
+            retry_after: float
+                Seconds the site asked us to wait, with a Retry-After header.
+        """
+        failed = status is None or status == 429 or status >= 500 or error_page
+        slow = latency > self.target_latency
+        with self.lock:
+            now = time.time()
+            self.counts['pages'] += 1
+            self.counts['failed'] += failed
+            self.counts['slow'] += slow
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.latency_total += latency
+            self.breaker.record(failed, now, retry_after)
+            if failed or slow:
+                # Pages that were already on their way when the site started to struggle do not cut the rate again.
+                if now - self.last_decrease > max(latency, 1.0 / self.rate):
+                    self.rate = max(self.floor_rate, self.rate * self.decrease)
+                    self.last_decrease = now
+                    self.counts['decreases'] += 1
+                    self.history.append((now - self.started_at, self.rate))
+            elif self.rate < self.ceiling_rate:
+                self.rate = min(self.ceiling_rate, self.rate + self.increase / self.rate)
+                self.counts['increases'] += 1
+                if now - self.started_at - self.history[-1][0] >= 10:
+                    self.history.append((now - self.started_at, self.rate))
+            self.lowest_rate = min(self.lowest_rate, self.rate)
+            self.highest_rate = max(self.highest_rate, self.rate)
+
+    def metrics(self):
+        """
+            How the pacing behaved over the run.
+
+            Returns
+            -------
+            metrics: dict
+                The counts of pages, slow pages, failed pages, increases and decreases, the pages per HTTP status,
+                the current, lowest, highest and average rate, the average latency, how often and how long the
+                circuit breaker was open and the history of the rate as (seconds since the start, rate).
+        """
+        with self.lock:
+            duration = time.time() - self.started_at
+            metrics = dict(self.counts)
+            metrics.update({'statuses': dict(self.statuses), 'rate': self.rate, 'lowest_rate': self.lowest_rate,
+                            'highest_rate': self.highest_rate,
+                            'average_rate': self.counts['pages'] / duration if duration > 0 else 0.0,
+                            'average_latency': self.latency_total / self.counts['pages'] if self.counts['pages']
+                            else 0.0,
+                            'breaker_opened': self.breaker.opened, 'seconds_paused': self.breaker.seconds_open,
+                            'breaker_state': self.breaker.state, 'history': list(self.history)})
+        return metrics
+
+    def summary(self):
+        """
+            The metrics in a single line, to print at the end of a run.
+        """
+        metrics = self.metrics()
+        return ('{pages} pages at {average_rate:.2f}/sec on average, rate between {lowest_rate:.2f} and '
+                '{highest_rate:.2f}/sec and now {rate:.2f}/sec, {slow} slow and {failed} failed pages, '
+                'paused {breaker_opened} times for {seconds_paused:.0f}s'.format(**metrics))
@@ -0,0 +1,223 @@
+import ColumnarExport
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+"""
+    Computes how the ratings of many players developed, out of the added_rating and rating_at_start_match of their
+    matches. Everything is computed on whole columns at once, so a report over all players of a club does not loop
+    over their matches in Python.
+
+    The matches of a player are split in a trajectory of the singles and one of the doubles, as they change different
+    ratings. Within a trajectory the matches are ordered by date. The page lists the newest matches first, so matches
+    of the same day are ordered by their position on the page, the last one first.
+
+    The matches come from a ColumnarExport or from a ColumnarFile it wrote. Requires numpy.
+"""
+
+double_type = 'Dubbel'  # The match_type of a double, everything else changes the single rating.
+report_fields = [
+    ('knltb_number', '<i4'), ('double', '|u1'), ('matches', '<i4'), ('first_rating', '<f8'),
+    ('latest_rating', '<f8'), ('change', '<f8'), ('form', '<f8'), ('rating', '<f8'), ('year_end_rating', '<f8'),
+    ('drift', '<f8'), ('start_gap', '<f8'),
+]
+
+
+class RatingTrajectories(object):
+    """
+        The matches of many players, ordered into a trajectory per player and match type.
+
+        Parameters
+        ----------
+        knltb_numbers: numpy.ndarray<int>
+            The KNLTB number of the player of every match.
+        dates: numpy.ndarray<int>
+            The days since 1970-01-01 of every match, see ColumnarExport.parse_date.
+        doubles: numpy.ndarray<bool>
+            Whether every match was a double.
+        added_ratings: numpy.ndarray<float>
+            The rating every match added, not a number when the match did not count.
+        start_ratings: numpy.ndarray<float>
+            The rating the player started every match with.
+        events: numpy.ndarray<int>
+            The number of the event of every match in event_names, optional.
+        event_names: list<string>
+            The names of the events by their number.
+        ratings: dict<string, numpy.ndarray>
+            The ratings table of a ColumnarExport, to compare the trajectories with the ratings on the players pages.
+        positions: numpy.ndarray<int>
+            The position of every match on the page of its player, by default the order in which the matches are
+            given, which is the order of the page for the matches of a ColumnarExport.
+    """
+    def __init__(self, knltb_numbers, dates, doubles, added_ratings, start_ratings, events=None, event_names=None,
+                 ratings=None, positions=None):
+        ColumnarExport.require_numpy()
+        knltb_numbers = numpy.asarray(knltb_numbers, dtype='<i8')
+        doubles = numpy.asarray(doubles, dtype=bool)
+        dates = numpy.asarray(dates, dtype='<i4')
+        positions = numpy.arange(len(knltb_numbers)) if positions is None else numpy.asarray(positions, dtype='<i8')
+        self.order = numpy.lexsort((-positions, dates, doubles, knltb_numbers))
+        self.knltb_numbers = knltb_numbers[self.order]
+        self.doubles = doubles[self.order]
+        self.dates = dates[self.order]
+        self.added_ratings = numpy.asarray(added_ratings, dtype='<f8')[self.order]
+        self.start_ratings = numpy.asarray(start_ratings, dtype='<f8')[self.order]
+        self.events = None if events is None else numpy.asarray(events)[self.order]
+        self.event_names = event_names
+        self.ratings = ratings
+
+        keys = self.knltb_numbers * 2 + self.doubles
+        is_start = numpy.ones(len(keys), dtype=bool)
+        is_start[1:] = keys[1:] != keys[:-1]
+        self.starts = numpy.flatnonzero(is_start)
+        self.ends = numpy.append(self.starts[1:], len(keys))[:len(self.starts)] - 1
+        self.trajectory_of_match = numpy.cumsum(is_start) - 1
+        self.keys = keys[self.starts]
+
+    @classmethod
+    def from_export(cls, export):
+        """
+            The trajectories of the matches collected so far by a ColumnarExport, also the one of a ColumnarIO.
+        """
+        def column(name, dtype, table='matches'):
+            values = export.columns[table][name]
+            return numpy.frombuffer(values, dtype=dtype) if values else numpy.zeros(0, dtype=dtype)
+
+        double_code = export.dictionary('types').codes.get(double_type, -1)
+        ratings = {name: column(name, dtype, 'ratings') for name, dtype in ColumnarExport.rating_columns}
+        return cls(column('knltb_number', '<i4'), column('date', '<i4'), column('match_type', '<u4') == double_code,
+                   column('added_rating', '<f4'), column('rating_at_start_match', '<f4'),
+                   column('event_name', '<u4'), export.dictionary('events').values, ratings)
+
+    @classmethod
+    def from_columnar(cls, columnar_file):
+        """
+            The trajectories of the matches in a ColumnarFile.
+        """
+        def column(name):
+            return columnar_file.column('matches', name)
+
+        match_types = column('match_type')
+        events = column('event_name')
+        ratings = {name: columnar_file.column('ratings', name) for name, _ in ColumnarExport.rating_columns}
+        return cls(column('knltb_number'), column('date'), match_types.codes == match_types.code(double_type),
+                   column('added_rating'), column('rating_at_start_match'), events.codes, events.values, ratings)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def ratings_after(self):
+        """
+            The rating of the player after every match, in the order of the trajectories.
+        """
+        return self.start_ratings + numpy.nan_to_num(self.added_ratings)
+
+    def steps(self):
+        """
+            How much the rating at the start of every match differs from the one at the start of the match before it
+            in the same trajectory. Unlike added_rating this also shows changes between matches, like matches that
+            are not on the page. Not a number for the first match of a trajectory.
+        """
+        steps = numpy.empty(len(self.start_ratings))
+        steps[1:] = self.start_ratings[1:] - self.start_ratings[:-1]
+        steps[self.starts] = numpy.nan
+        return steps
+
+    def rolling_form(self, window=5):
+        """
+            The sum of the ratings added by the last window matches of the trajectory, up to and including every
+            match. A negative form means the rating went down, and a lower rating is a better one.
+        """
+        totals = numpy.zeros(len(self.added_ratings) + 1)
+        numpy.cumsum(numpy.nan_to_num(self.added_ratings), out=totals[1:])
+        rows = numpy.arange(1, len(totals))
+        window_starts = numpy.maximum(rows - window, self.starts[self.trajectory_of_match])
+        return totals[rows] - totals[window_starts]
+
+    def trajectory(self, knltb_number, double=False):
+        """
+            Returns
+            -------
+            dates: numpy.ndarray<datetime64[D]>
+                The dates of the matches of the player of this type, in order.
+            ratings: numpy.ndarray<float>
+                The rating of the player after each of these matches.
+        """
+        idx = numpy.searchsorted(self.keys, knltb_number * 2 + bool(double))
+        if idx == len(self.keys) or self.keys[idx] != knltb_number * 2 + bool(double):
+            return numpy.zeros(0, dtype='datetime64[D]'), numpy.zeros(0)
+        rows = slice(self.starts[idx], self.ends[idx] + 1)
+        return self.dates[rows].astype('datetime64[D]'), self.ratings_after()[rows]
+
+    def event_totals(self):
+        """
+            The rating every event added to every trajectory.
+
+            Returns
+            -------
+            totals: numpy.ndarray
+                A record per trajectory and event with the fields knltb_number, double, event (its number in
+                event_names), matches and added_rating.
+        """
+        if self.events is None:
+            raise ValueError('These trajectories were made without events')
+        events = self.events.astype('<i8')
+        keys = self.trajectory_of_match * (int(events.max()) + 1 if len(events) else 1) + events
+        unique_keys, first_rows, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+        totals = numpy.zeros(len(unique_keys), dtype=[('knltb_number', '<i4'), ('double', '|u1'), ('event', '<i4'),
+                                                      ('matches', '<i4'), ('added_rating', '<f8')])
+        totals['knltb_number'] = self.knltb_numbers[first_rows]
+        totals['double'] = self.doubles[first_rows]
+        totals['event'] = events[first_rows]
+        totals['matches'] = numpy.bincount(inverse, minlength=len(unique_keys))
+        totals['added_rating'] = numpy.bincount(inverse, numpy.nan_to_num(self.added_ratings),
+                                                minlength=len(unique_keys))
+        return totals
+
+    def report(self, window=5):
+        """
+            A summary of every trajectory, compared with the ratings on the players page when they are known.
+
+            Returns
+            -------
+            report: numpy.ndarray
+                A record per trajectory with the fields:
+                knltb_number, double, matches
+                first_rating: the rating the player started the first match with.
+                latest_rating: the rating after the last match.
+                change: latest_rating - first_rating.
+                form: the rolling form after the last match, see rolling_form.
+                rating: the current rating on the players page, Rating Enkel or Rating Dubbel.
+                year_end_rating: the rating at the end of last year on the players page, Eindejaarsrating Enkel or
+                    Dubbel.
+                When a player has several ratings, the last one added is used.
+                drift: latest_rating - rating, what the matches on the page do not explain.
+                start_gap: first_rating - year_end_rating.
+                The ratings that are not known are not a number.
+        """
+        report = numpy.zeros(len(self.starts), dtype=report_fields)
+        report['knltb_number'] = self.knltb_numbers[self.starts]
+        report['double'] = self.doubles[self.starts]
+        report['matches'] = self.ends - self.starts + 1
+        report['first_rating'] = self.start_ratings[self.starts]
+        report['latest_rating'] = self.ratings_after()[self.ends]
+        report['change'] = report['latest_rating'] - report['first_rating']
+        report['form'] = self.rolling_form(window)[self.ends]
+        report['rating'] = numpy.nan
+        report['year_end_rating'] = numpy.nan
+
+        if self.ratings is not None and len(self.ratings['knltb_number']):
+            numbers = numpy.asarray(self.ratings['knltb_number'], dtype='<i8')
+            order = numpy.argsort(numbers, kind='mergesort')
+            found = numpy.maximum(numpy.searchsorted(numbers[order], report['knltb_number'], side='right') - 1, 0)
+            known = numbers[order][found] == report['knltb_number']
+            rows = order[found[known]]
+            doubles = report['double'][known].astype(bool)
+            for field, single, double in [('rating', 'act_e_rating', 'act_d_rating'),
+                                          ('year_end_rating', 'old_e_rating', 'old_d_rating')]:
+                report[field][known] = numpy.where(doubles, self.ratings[double][rows], self.ratings[single][rows])
+        report['drift'] = report['latest_rating'] - report['rating']
+        report['start_gap'] = report['first_rating'] - report['year_end_rating']
+        return report
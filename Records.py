@@ -0,0 +1,85 @@
+"""
+    Compact versions of the named tuples of the scrapers, for crawls that keep many records in memory.
+
+    The names of clubs, events, players and the like repeat thousands of times over a large crawl, while every record
+    holds its own copy cut out of its own page. A compact record keeps a single shared copy of every text, and turns
+    numbers into ints and floats once, instead of keeping them as text.
+    A compact record is a subclass of the original named tuple without any extra fields, so it is still a tuple with
+    the same fields in the same order, and every IO keeps working.
+"""
+
+parsed_numbers = {}  # Ratings repeat as well, every text is turned into a number once and shared afterwards.
+
+
+def shared_text(value):
+    """
+        The single shared copy of a text, other values are returned as they are.
+    """
+    if type(value) is str:
+        return intern(value)
+    return value
+
+
+def as_int(value):
+    """
+        The number in a text like 12, the text itself when it is not a number.
+    """
+    if type(value) is not str:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return shared_text(value)
+
+
+def as_float(value):
+    """
+        The number in a text like +0.0123 or 8,2719, the text itself when it is not a number.
+    """
+    if type(value) is not str:
+        return value
+    number = parsed_numbers.get(value)
+    if number is None:
+        try:
+            number = parsed_numbers[value] = float(value.replace(',', '.'))
+        except ValueError:
+            return shared_text(value)
+    return number
+
+
+def compact(record_class, name, ints=(), floats=()):
+    """
+        Creates the compact version of a named tuple.
+
+        Parameters
+        ----------
+        record_class: namedtuple
+            The named tuple to make a compact version of.
+        name: string
+            The name under which the compact version is stored in the module of record_class, such that records can be
+            pickled.
+        ints: list<string>
+            The fields that hold a whole number.
+        floats: list<string>
+            The fields that hold a number with decimals.
+
+        Returns
+        -------
+        compact_class: class
+            A subclass of record_class that shares texts and stores numbers as numbers.
+    """
+    converters = tuple(as_int if field in ints else as_float if field in floats else shared_text
+                       for field in record_class._fields)
+
+    def __new__(cls, *values, **named_values):
+        if named_values:
+            values += tuple(named_values[field] for field in record_class._fields[len(values):])
+        if len(values) != len(converters):
+            raise TypeError('{} takes {} values, {} given'.format(name, len(converters), len(values)))
+        return tuple.__new__(cls, [convert(value) for convert, value in zip(converters, values)])
+
+    def _make(cls, iterable, new=tuple.__new__, len=len):
+        return cls(*iterable)
+
+    return type(name, (record_class,), {'__slots__': (), '__new__': __new__, '_make': classmethod(_make),
+                                        '__module__': record_class.__module__})
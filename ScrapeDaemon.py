@@ -0,0 +1,364 @@
+import BaseHTTPServer
+import SocketServer
+import itertools
+import json
+import threading
+import time
+import urllib2
+import sys
+
+import TerminalColors as BgColors
+import HttpSession
+import Instrumentation
+
+"""
+    Keeps the scrapers running in one process, such that the interpreter, the imports, the connections to the site,
+    the page cache and the competition index are set up once instead of for every run.
+
+    The runs of the schedule start by themselves. Other runs are asked for through a small control interface, which
+    only listens on 127.0.0.1:
+        GET  /status         The daemon, its schedule and the last jobs.
+        GET  /jobs/<id>      A single job.
+        POST /jobs           Adds a job, the body is JSON like {"kind": "players", "knltb_numbers": [20889364]}.
+                             The kinds are players, competitions and competition_index. Without knltb_numbers or
+                             competitions the job scrapes the ones of the IO.
+        POST /stop           Stops the daemon after the job that is running.
+    The jobs run one after another, as they share the settings, the IO and the politeness delay of the scrapers.
+    The scrapers are configured like when they run by themselves, through the settings in PlayerScraper.py and
+    CompetitionScraper.py.
+
+    Usage
+    ----------
+    python ScrapeDaemon.py
+        Runs the daemon until Ctrl+C or a stop.
+    python ScrapeDaemon.py status|stop|players [knltb numbers]|competitions|competition_index
+        Talks to the daemon that is running.
+"""
+
+control_port = 8765  # The port of the control interface.
+schedule = [('players', 24 * 3600), ('competitions', 6 * 3600)]  # Jobs that run by themselves, every so many seconds.
+warm_up_index = True  # Load the competition index when the daemon starts, instead of during the first run.
+jobs_kept = 100  # Amount of finished jobs that can still be looked up.
+job_kinds = ('players', 'competitions', 'competition_index')
+
+
+class Job(object):
+    def __init__(self, job_id, kind, arguments=None, scheduled=False):
+        self.id = job_id
+        self.kind = kind
+        self.arguments = arguments
+        self.scheduled = scheduled
+        self.state = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def as_dict(self):
+        return {'id': self.id, 'kind': self.kind, 'arguments': self.arguments, 'scheduled': self.scheduled,
+                'state': self.state, 'submitted': self.submitted, 'started': self.started,
+                'finished': self.finished, 'result': self.result, 'error': self.error}
+
+
+def run_players(knltb_numbers=None):
+    import PlayerScraper
+    if PlayerScraper.instrumentation:
+        Instrumentation.start()
+    try:
+        knltb_numbers, counter = PlayerScraper.run(knltb_numbers)
+    finally:
+        Instrumentation.report(PlayerScraper.metrics_file)
+    return {'players': len(knltb_numbers), 'scraped': counter}
+
+
+def run_competitions(competitions=None):
+    import CompetitionScraper
+    if CompetitionScraper.instrumentation:
+        Instrumentation.start()
+    try:
+        competitions, failed = CompetitionScraper.run(competitions)
+    finally:
+        Instrumentation.report(CompetitionScraper.metrics_file)
+    return {'competitions': len(competitions), 'failed': failed}
+
+
+def run_competition_index():
+    import CompetitionScraper
+    index, _ = CompetitionScraper.get_competition_index(force_refresh=True)
+    return {'competitions': len(index.competitions)}
+
+
+class ScrapeDaemon(object):
+    """
+        Runs the jobs of the schedule and the jobs that are asked for, one after another.
+
+        Parameters
+        ----------
+        schedule: list<(string, float)>
+            The kind of every job that runs by itself and the seconds between its runs. The first runs start right
+            away.
+        port: int
+            The port of the control interface on 127.0.0.1, None runs the daemon without one. 0 picks a free port.
+    """
+    def __init__(self, schedule=schedule, port=control_port):
+        self.schedule = [(kind, float(interval)) for kind, interval in schedule]
+        self.next_runs = {kind: time.time() for kind, _ in self.schedule}
+        self.jobs = {}
+        self.queue = []
+        self.lock = threading.Condition()
+        self.ids = itertools.count(1)
+        self.started = time.time()
+        self.stopping = False
+        self.current = None
+        self.server = None if port is None else ControlServer(port, self)
+
+    def warm_up(self):
+        """
+            Sets up what every run shares: the settings of the scrapers, the connections to the site and the
+            competition index.
+        """
+        import PlayerScraper
+        import CompetitionScraper
+        PlayerScraper.set_up()
+        CompetitionScraper.set_up()
+        HttpSession.get_session()
+        if warm_up_index:
+            try:
+                CompetitionScraper.get_competition_index()
+            except Exception as e:
+                print(BgColors.TerminalColors.warning + 'Could not load the competition index yet: {}'.format(e) +
+                      BgColors.TerminalColors.end_color)
+
+    def submit(self, kind, arguments=None, scheduled=False):
+        """
+            Adds a job to the end of the queue.
+
+            Returns
+            -------
+            job: Job
+                The job, which is updated while it runs.
+
+            Raises errors
+            -------
+            ValueError, when the kind of job is not known.
+        """
+        if kind not in job_kinds:
+            raise ValueError('Unknown kind of job {}, expected one of {}'.format(kind, ', '.join(job_kinds)))
+        with self.lock:
+            job = Job(next(self.ids), kind, arguments, scheduled)
+            self.jobs[job.id] = job
+            self.queue.append(job)
+            self.lock.notify_all()
+            return job
+
+    def job(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else job.as_dict()
+
+    def status(self):
+        with self.lock:
+            return {'started': self.started, 'uptime': time.time() - self.started, 'stopping': self.stopping,
+                    'running': None if self.current is None else self.current.id,
+                    'queued': [job.id for job in self.queue],
+                    'schedule': [{'kind': kind, 'interval': interval, 'next_run': self.next_runs[kind]}
+                                 for kind, interval in self.schedule],
+                    'jobs': [self.jobs[job_id].as_dict() for job_id in sorted(self.jobs)[-10:]]}
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            self.lock.notify_all()
+
+    def due_jobs(self, now):
+        """
+            Queues the jobs of the schedule that are due, unless the same kind of scheduled job still waits in the
+            queue. Must be called with the lock held.
+
+            Returns
+            -------
+            wait: float
+                The seconds until the next job of the schedule is due.
+        """
+        for kind, interval in self.schedule:
+            if self.next_runs[kind] <= now:
+                if not any(job.kind == kind and job.scheduled for job in self.queue):
+                    job = Job(next(self.ids), kind, scheduled=True)
+                    self.jobs[job.id] = job
+                    self.queue.append(job)
+                self.next_runs[kind] = now + interval
+        return min([self.next_runs[kind] - now for kind, _ in self.schedule] or [3600])
+
+    def next_job(self):
+        """
+            Waits for the next job, None when the daemon stops.
+        """
+        with self.lock:
+            while True:
+                if self.stopping:
+                    return None
+                wait = self.due_jobs(time.time())
+                if self.queue:
+                    self.current = self.queue.pop(0)
+                    return self.current
+                self.lock.wait(min(wait, 60))
+
+    def run_job(self, job):
+        job.state = 'running'
+        job.started = time.time()
+        print(BgColors.TerminalColors.ok_blue + 'Starting job {} ({})'.format(job.id, job.kind) +
+              BgColors.TerminalColors.end_color)
+        try:
+            if job.kind == 'players':
+                job.result = run_players(job.arguments)
+            elif job.kind == 'competitions':
+                job.result = run_competitions(job.arguments)
+            else:
+                job.result = run_competition_index()
+            job.state = 'done'
+        except Exception as e:
+            job.state = 'failed'
+            job.error = '{}: {}'.format(type(e).__name__, e)
+            print(BgColors.TerminalColors.fail + 'Job {} ({}) failed: {}'.format(job.id, job.kind, job.error) +
+                  BgColors.TerminalColors.end_color)
+        job.finished = time.time()
+        with self.lock:
+            self.current = None
+            finished = sorted(job_id for job_id, job in self.jobs.items() if job.finished is not None)
+            for job_id in finished[:-jobs_kept]:
+                del self.jobs[job_id]
+
+    def work(self):
+        while True:
+            job = self.next_job()
+            if job is None:
+                return
+            self.run_job(job)
+
+    def run(self):
+        """
+            Warms up and runs jobs until the daemon is stopped.
+        """
+        self.warm_up()
+        if self.server is not None:
+            self.server.start()
+            print('Listening on {}'.format(self.server.url))
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+        try:
+            # Joining with a timeout, otherwise Ctrl+C is not delivered until the daemon stops.
+            while worker.is_alive():
+                worker.join(0.5)
+        finally:
+            self.close()
+
+    def close(self):
+        self.stop()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if HttpSession.page_archive is not None:
+            HttpSession.page_archive.flush()
+        HttpSession.close_session()
+
+
+class ControlHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/status':
+            self.answer(200, self.server.scrape_daemon.status())
+        elif self.path.startswith('/jobs/') and self.path[len('/jobs/'):].isdigit():
+            job = self.server.scrape_daemon.job(int(self.path[len('/jobs/'):]))
+            self.answer(404 if job is None else 200, job or {'error': 'Unknown job'})
+        else:
+            self.answer(404, {'error': 'Unknown path'})
+
+    def do_POST(self):
+        if self.path == '/jobs':
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+                arguments = request.get('knltb_numbers', request.get('competitions'))
+                job = self.server.scrape_daemon.submit(request.get('kind'), arguments)
+            except (ValueError, AttributeError) as e:
+                self.answer(400, {'error': str(e)})
+                return
+            self.answer(202, job.as_dict())
+        elif self.path == '/stop':
+            self.server.scrape_daemon.stop()
+            self.answer(202, {'stopping': True})
+        else:
+            self.answer(404, {'error': 'Unknown path'})
+
+    def answer(self, status, content):
+        body = json.dumps(content, sort_keys=True)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ControlServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, daemon):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), ControlHandler)
+        self.scrape_daemon = daemon
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def control(path, content=None, port=control_port):
+    """
+        Asks the daemon that is running on this machine for something, see the control interface above.
+
+        Parameters
+        ----------
+        path: string
+            The path, like /status.
+        content: dict
+            The JSON body of a POST, None for a GET.
+
+        Returns
+        -------
+        answer: dict
+            The answer of the daemon.
+    """
+    data = None if content is None else json.dumps(content)
+    request = urllib2.Request('http://127.0.0.1:{}{}'.format(port, path), data, {'Content-Type': 'application/json'})
+    try:
+        return json.loads(urllib2.urlopen(request, timeout=10).read())
+    except urllib2.HTTPError as e:
+        return json.loads(e.read())
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        command = sys.argv[1]
+        if command == 'status':
+            answer = control('/status')
+        elif command == 'stop':
+            answer = control('/stop', {})
+        elif command == 'players' and len(sys.argv) > 2:
+            answer = control('/jobs', {'kind': 'players', 'knltb_numbers': [int(nr) for nr in sys.argv[2:]]})
+        else:
+            answer = control('/jobs', {'kind': command})
+        print(json.dumps(answer, indent=2, sort_keys=True))
+    else:
+        try:
+            ScrapeDaemon().run()
+            print('Stopped, bye bye..')
+        except KeyboardInterrupt:
+            print('Received CTRL + C, exiting..')
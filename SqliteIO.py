@@ -0,0 +1,315 @@
+import contextlib
+import re
+import sqlite3
+import threading
+import time
+
+from AbstractInputOutput import AbstractInputOutput
+import Watermarks
+
+"""
+    An IO that stores everything the scrapers find in a SQLite database.
+
+    Names of events and teams are stored once and referred to by their id. Every record has a natural key, such that
+    scraping the same player or team again updates the rows that are already there instead of adding them again:
+        ratings      knltb_number and the day they were scraped
+        matches      knltb_number, date, event, match type, partner, opponents and result
+        team_info    the url of the team page
+        standings    the url of the team page and the team
+        planning     the url of the team page, the match day and both teams
+
+    Usage
+    ----------
+    import SqliteIO
+    io = SqliteIO.SqliteIO("knltb.db", knltb_numbers=[20889364, 22582657],
+                           competitions=[["Winteroutdoorcompetitie Zuid 2016/2017", "A.T.C."]])
+
+    All matches of a club in a season:
+    io.club_matches('A.T.C.', '2017-01-01', '2017-12-31')
+"""
+
+schema = '''
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS teams (
+    team_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    club TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS teams_club ON teams (club);
+CREATE TABLE IF NOT EXISTS players (
+    knltb_number INTEGER PRIMARY KEY,
+    valid INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    knltb_number INTEGER NOT NULL,
+    scraped_on TEXT NOT NULL,
+    act_e_rating TEXT, act_d_rating TEXT, old_e_rating TEXT, old_d_rating TEXT, year_e_rating TEXT,
+    year_d_rating TEXT,
+    PRIMARY KEY (knltb_number, scraped_on)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    knltb_number INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    event_id INTEGER NOT NULL REFERENCES events (event_id),
+    tournament INTEGER NOT NULL,
+    match_type TEXT NOT NULL, category TEXT,
+    club_home_id INTEGER REFERENCES teams (team_id),
+    club_out_id INTEGER REFERENCES teams (team_id),
+    added_rating TEXT, rating_at_start_match TEXT,
+    home_player INTEGER, partner TEXT NOT NULL, opponent1 TEXT NOT NULL, opponent2 TEXT NOT NULL,
+    who_won TEXT, match_result TEXT NOT NULL,
+    PRIMARY KEY (knltb_number, date, event_id, match_type, partner, opponent1, opponent2, match_result)
+);
+CREATE INDEX IF NOT EXISTS matches_date ON matches (date);
+CREATE INDEX IF NOT EXISTS matches_club_home ON matches (club_home_id, date);
+CREATE INDEX IF NOT EXISTS matches_club_out ON matches (club_out_id, date);
+CREATE TABLE IF NOT EXISTS team_info (
+    team_url TEXT PRIMARY KEY,
+    season TEXT, full_day TEXT, day TEXT, type TEXT, class TEXT, name TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS standings (
+    team_url TEXT NOT NULL,
+    team_id INTEGER NOT NULL REFERENCES teams (team_id),
+    position TEXT, times_played TEXT, won TEXT, draw TEXT, lost TEXT, points_won TEXT, points_lost TEXT,
+    own_team INTEGER NOT NULL,
+    PRIMARY KEY (team_url, team_id)
+);
+CREATE INDEX IF NOT EXISTS standings_team ON standings (team_id);
+CREATE TABLE IF NOT EXISTS planning (
+    team_url TEXT NOT NULL,
+    day_count TEXT NOT NULL,
+    own_team_id INTEGER NOT NULL REFERENCES teams (team_id),
+    opponent_id INTEGER NOT NULL REFERENCES teams (team_id),
+    date TEXT, play_at_home INTEGER, result TEXT, status TEXT, catch_up TEXT, commencement TEXT, present TEXT,
+    court_type TEXT, comments TEXT,
+    PRIMARY KEY (team_url, day_count, own_team_id, opponent_id)
+);
+CREATE INDEX IF NOT EXISTS planning_own_team ON planning (own_team_id, date);
+CREATE INDEX IF NOT EXISTS planning_opponent ON planning (opponent_id, date);
+CREATE INDEX IF NOT EXISTS planning_date ON planning (date);
+'''
+
+
+def upsert(table, columns, key_columns):
+    """
+        The statement that inserts a row, or updates the row with the same natural key when there already is one.
+        SQLite versions before 3.24 do not know ON CONFLICT, those replace the row instead.
+    """
+    insert = 'INTO {} ({}) VALUES ({})'.format(table, ', '.join(columns), ', '.join('?' * len(columns)))
+    if sqlite3.sqlite_version_info < (3, 24, 0):
+        return 'INSERT OR REPLACE ' + insert
+    updates = ', '.join('{0} = excluded.{0}'.format(column) for column in columns if column not in key_columns)
+    return 'INSERT ' + insert + ' ON CONFLICT ({}) DO UPDATE SET {}'.format(', '.join(key_columns), updates)
+
+
+def as_date(date):
+    """
+        Stores dates like 24-06-2017 as 2017-06-24, such that they sort and can be compared in queries.
+    """
+    return Watermarks.sortable_date(date) or date
+
+
+def club_of(team_name):
+    """
+        The club of a team, which is the name of the team without its number. A.T.C. 3 is a team of A.T.C.
+    """
+    return re.sub(r'\s+\d+$', '', team_name.strip())
+
+
+class SqliteIO(AbstractInputOutput):
+    def __init__(self, filename="knltb.db", knltb_numbers=None, competitions=None, want_match_results=True,
+                 debug=False):
+        """
+            Parameters
+            ----------
+            filename: string
+                The database file, it is created when it does not exist yet.
+            knltb_numbers: list<int>
+                The players to scrape, see get_players.
+            competitions: list<list<competition, association abbreviation>>
+                The competitions to scrape, see get_competition.
+            want_match_results: boolean
+                Whether we also want match results, see get_settings.
+            debug: boolean
+                Whether we should output in debug modus, see get_settings.
+        """
+        self.knltb_numbers = knltb_numbers or []
+        self.competitions = competitions or []
+        self.want_match_results = want_match_results
+        self.debug = debug
+        # The scrapers call the IO from their worker threads, one at a time.
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.text_factory = str
+        self.lock = threading.Lock()
+        # Readers do not block the scraper while it writes, and a commit does not wait for the disk twice.
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(schema)
+        self.event_ids = {}
+        self.team_ids = {}
+
+    def get_settings(self):
+        return self.want_match_results, self.debug
+
+    def get_players(self):
+        return self.knltb_numbers
+
+    def get_competition(self):
+        return self.competitions
+
+    def set_player_rating(self, knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
+                          year_e_rating, year_d_rating):
+        self.set_player_ratings_batch([(knltb_number, act_e_rating, act_d_rating, old_e_rating, old_d_rating,
+                                        year_e_rating, year_d_rating)])
+
+    def set_player_ratings_batch(self, ratings):
+        now = time.time()
+        today = time.strftime('%Y-%m-%d')
+        with self.transaction():
+            self.connection.executemany(
+                upsert('players', ['knltb_number', 'valid', 'updated_at'], ['knltb_number']),
+                [(rating[0], 1, now) for rating in ratings])
+            self.connection.executemany(
+                upsert('ratings', ['knltb_number', 'scraped_on', 'act_e_rating', 'act_d_rating', 'old_e_rating',
+                                   'old_d_rating', 'year_e_rating', 'year_d_rating'], ['knltb_number', 'scraped_on']),
+                [(rating[0], today) + tuple(rating[1:]) for rating in ratings])
+
+    def invalid_player(self, knltb_number):
+        self.invalid_players_batch([knltb_number])
+
+    def invalid_players_batch(self, knltb_numbers):
+        now = time.time()
+        with self.transaction():
+            self.connection.executemany(
+                upsert('players', ['knltb_number', 'valid', 'updated_at'], ['knltb_number']),
+                [(knltb_number, 0, now) for knltb_number in knltb_numbers])
+
+    def set_player_match_results(self, knltb_number, matches):
+        self.set_match_results_batch([(knltb_number, matches)])
+
+    def set_match_results_batch(self, match_results):
+        statement = upsert('matches', ['knltb_number', 'date', 'event_id', 'tournament', 'match_type', 'category',
+                                       'club_home_id', 'club_out_id', 'added_rating', 'rating_at_start_match',
+                                       'home_player', 'partner', 'opponent1', 'opponent2', 'who_won', 'match_result'],
+                           ['knltb_number', 'date', 'event_id', 'match_type', 'partner', 'opponent1', 'opponent2',
+                            'match_result'])
+
+        def rows():
+            # The columns of the key are never NULL, SQLite would see two rows with a NULL in their key as different.
+            for knltb_number, matches in match_results:
+                for match in matches:
+                    yield (knltb_number, as_date(match.date), self.event_id(match.event_name),
+                           int(match.tournament_or_competition is True), match.match_type or '',
+                           match.category or None, self.team_id(match.club_home), self.team_id(match.club_out),
+                           match.added_rating, match.rating_at_start_match or None, int(match.home_player),
+                           match.partner or '', match.opponent1, match.opponent2 or '', match.who_won,
+                           match.match_result or '')
+
+        with self.transaction():
+            self.connection.executemany(statement, rows())
+
+    def stream_match_results(self, match_results):
+        # The rows are written while the persons and their matches are read, in one transaction.
+        self.set_match_results_batch(match_results)
+
+    def set_competition(self, season, own_teams, comp_url, comp_info, comp_results, comp_play_times):
+        self.set_competitions_batch([(season, own_teams, comp_url, comp_info, comp_results, comp_play_times)])
+
+    def set_competitions_batch(self, competitions):
+        now = time.time()
+        standings = []
+        planning = []
+
+        with self.transaction():
+            for season, own_teams, comp_url, comp_info, comp_results, comp_play_times in competitions:
+                self.connection.execute(
+                    upsert('team_info', ['team_url', 'season', 'full_day', 'day', 'type', 'class', 'name',
+                                         'updated_at'], ['team_url']),
+                    (comp_url, season, comp_info.FullDay, comp_info.Day, comp_info.Type, comp_info.Class,
+                     comp_info.Name, now))
+                for result in comp_results:
+                    standings.append((comp_url, self.team_id(result.Name), result.Position, result.TimesPlayed,
+                                      result.Won, result.Draw, result.Lost, result.PointsWon, result.PointsLost,
+                                      int(result.OwnTeam)))
+                for play_time in comp_play_times:
+                    planning.append((comp_url, play_time.DayCount, self.team_id(play_time.OwnTeamName),
+                                     self.team_id(play_time.Opponent), as_date(play_time.Date),
+                                     int(play_time.PlayAtHome), play_time.Result, play_time.Status,
+                                     play_time.CatchUp, play_time.Commencement, play_time.Present,
+                                     play_time.CourtType, play_time.Comments))
+            self.connection.executemany(
+                upsert('standings', ['team_url', 'team_id', 'position', 'times_played', 'won', 'draw', 'lost',
+                                     'points_won', 'points_lost', 'own_team'], ['team_url', 'team_id']),
+                standings)
+            self.connection.executemany(
+                upsert('planning', ['team_url', 'day_count', 'own_team_id', 'opponent_id', 'date', 'play_at_home',
+                                    'result', 'status', 'catch_up', 'commencement', 'present', 'court_type',
+                                    'comments'], ['team_url', 'day_count', 'own_team_id', 'opponent_id']),
+                planning)
+
+    def stream_competition(self, competitions):
+        self.set_competitions_batch(competitions)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+            Everything written inside is committed at once, or not at all when something goes wrong.
+        """
+        with self.lock:
+            try:
+                with self.connection:
+                    yield
+            except Exception:
+                # Events and teams added in this transaction are gone again, so are their ids.
+                self.event_ids.clear()
+                self.team_ids.clear()
+                raise
+
+    def club_matches(self, club, first_date, last_date):
+        """
+            All matches played by teams of a club between two dates, like 2017-01-01, using the indexes on the teams
+            of both sides of the match instead of going through all matches in that period.
+
+            Returns
+            -------
+            matches: list<tuple>
+                The rows of the matches table.
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT * FROM matches WHERE (club_home_id IN (SELECT team_id FROM teams WHERE club = ?) OR '
+                'club_out_id IN (SELECT team_id FROM teams WHERE club = ?)) AND date BETWEEN ? AND ?',
+                (club, club, first_date, last_date)).fetchall()
+
+    def event_id(self, name):
+        """
+            The id of an event, added to the events table when it is new. The lock has to be held.
+        """
+        if name not in self.event_ids:
+            self.connection.execute('INSERT OR IGNORE INTO events (name) VALUES (?)', (name,))
+            self.event_ids[name] = self.connection.execute('SELECT event_id FROM events WHERE name = ?',
+                                                           (name,)).fetchone()[0]
+        return self.event_ids[name]
+
+    def team_id(self, name):
+        """
+            The id of a team, added to the teams table when it is new. None for a team without a name, like the
+            club of a tournament match. The lock has to be held.
+        """
+        if not name:
+            return None
+        if name not in self.team_ids:
+            self.connection.execute('INSERT OR IGNORE INTO teams (name, club) VALUES (?, ?)',
+                                    (name, club_of(name)))
+            self.team_ids[name] = self.connection.execute('SELECT team_id FROM teams WHERE name = ?',
+                                                          (name,)).fetchone()[0]
+        return self.team_ids[name]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
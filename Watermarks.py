@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+"""
+    Remembers per KNLTB number what was already passed on to the IO, such that a following run only has to pass on
+    what changed since.
+
+    Every player has a watermark with the fingerprint of the part of the page that holds the ratings and the matches,
+    the date of the latest match we saw and the matches we saw on that date. A page with the same fingerprint does not
+    have to be parsed at all, and of a changed page only the matches after the watermark are new.
+"""
+
+
+def fingerprint(s, with_matches=True):
+    """
+        The fingerprint of the ratings and the match tables of a players page, the rest of the page is left out such
+        that a change in for example the menu of the site does not count as a change of the player.
+
+        Parameters
+        ----------
+        s: string
+            The downloaded HTML page from the public KNLTB site for this KNLTB player.
+        with_matches: boolean
+            Whether the matches are passed on to the IO as well. A page of which only the ratings were passed on gets
+            a different fingerprint, such that the matches are not skipped when they are asked for later.
+
+        Returns
+        -------
+        fingerprint: string
+    """
+    begin_length = s.find('<td class="knltb-public-label">')
+    tournament_length = s.find('Partijresultaten toernooien')
+    end_length = s.find('</table>', s.find('<table class="knltb-geselecteerde-toernooien" ', tournament_length))
+    if begin_length >= 0 and tournament_length >= 0 and end_length >= 0:
+        s = s[begin_length:end_length]
+    # A checksum instead of a cryptographic hash, it is several times faster and only has to notice changes.
+    return '{}:{:08x}:{}'.format('matches' if with_matches else 'ratings', zlib.crc32(s) & 0xffffffff, len(s))
+
+
+def sortable_date(date):
+    """
+        Turns a date like 24-06-2017 into 2017-06-24, such that dates can be compared. None when it is not a date.
+    """
+    parts = date.strip().split('-')
+    if len(parts) != 3 or not all(part.isdigit() for part in parts):
+        return None
+    return '{:0>4}-{:0>2}-{:0>2}'.format(parts[2], parts[1], parts[0])
+
+
+def match_key(match_info):
+    """
+        Identifies a match, such that two matches on the same date can be told apart.
+    """
+    return hashlib.sha1(repr(tuple(match_info))).hexdigest()[:16]
+
+
+class WatermarkStore(object):
+    def __init__(self, filename="watermarks.json", save_every=100):
+        """
+            Parameters
+            ----------
+            filename: string
+                The file in which the watermarks are kept between runs.
+            save_every: int
+                The watermarks are written to the file after this many updates, such that an interrupted run does
+                not lose everything.
+        """
+        self.filename = filename
+        self.save_every = save_every
+        self.watermarks = {}
+        self.updates = 0
+        self.lock = threading.Lock()
+        if os.path.exists(filename):
+            with open(filename, 'r') as fd:
+                self.watermarks = json.load(fd)
+
+    def unchanged(self, knltb_number, page_fingerprint):
+        """
+            Whether the page of this player is the same as the last time it was passed on to the IO.
+        """
+        with self.lock:
+            watermark = self.watermarks.get(str(knltb_number))
+        return watermark is not None and watermark['fingerprint'] == page_fingerprint
+
+    def new_matches(self, knltb_number, list_of_matches):
+        """
+            The matches that were played after the watermark of this player.
+
+            Parameters
+            ----------
+            knltb_number: int
+                KNLTB number of the person that is the owner of the matches.
+            list_of_matches: list<MatchInfo>
+                All matches on the page of the player.
+
+            Returns
+            -------
+            list_of_matches: list<MatchInfo>
+                The matches after the date of the watermark, the matches on that date which we did not see before and
+                the matches of which we could not read the date.
+        """
+        with self.lock:
+            watermark = self.watermarks.get(str(knltb_number))
+        if watermark is None or watermark['last_date'] is None:
+            return list_of_matches
+        seen = set(watermark['last_date_matches'])
+        new = []
+        for match_info in list_of_matches:
+            date = sortable_date(match_info.date)
+            if date is None or date > watermark['last_date'] or \
+                    (date == watermark['last_date'] and match_key(match_info) not in seen):
+                new.append(match_info)
+        return new
+
+    def update(self, knltb_number, page_fingerprint, list_of_matches):
+        """
+            Moves the watermark of this player, to be called once everything is passed on to the IO.
+
+            Parameters
+            ----------
+            knltb_number: int
+                KNLTB number of the person that is the owner of the page.
+            page_fingerprint: string
+                See fingerprint.
+            list_of_matches: list<MatchInfo>
+                All matches on the page of the player, empty when the matches were not passed on.
+        """
+        with self.lock:
+            watermark = self.watermarks.get(str(knltb_number), {'last_date': None, 'last_date_matches': []})
+            last_date = watermark['last_date']
+            last_date_matches = set(watermark['last_date_matches'])
+            for match_info in list_of_matches:
+                date = sortable_date(match_info.date)
+                if date is None or (last_date is not None and date < last_date):
+                    continue
+                if date != last_date:
+                    last_date = date
+                    last_date_matches = set()
+                last_date_matches.add(match_key(match_info))
+            self.watermarks[str(knltb_number)] = {'fingerprint': page_fingerprint, 'last_date': last_date,
+                                                  'last_date_matches': sorted(last_date_matches)}
+            self.updates += 1
+            save_now = self.updates % self.save_every == 0
+        if save_now:
+            self.save()
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.watermarks)
+        # Writing to a temporary file first, such that an interrupted run never leaves half the watermarks behind.
+        handle, temporary_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filename)))
+        with os.fdopen(handle, 'w') as fd:
+            fd.write(data)
+        os.rename(temporary_filename, self.filename)
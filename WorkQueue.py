@@ -0,0 +1,297 @@
+import contextlib
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+"""
+    A queue of KNLTB numbers in a SQLite file, shared by any amount of scraper processes on one machine or on several
+    machines that share the file. Every process claims a batch of numbers with a lease, scrapes them and acknowledges
+    them. A process keeps its leases alive with a heartbeat, when it dies its leases run out and the numbers are
+    claimed by another process.
+
+    The file also holds the politeness budget, see SharedBudget, such that all processes together never load pages
+    faster than delay_time allows for a single one.
+
+    Machines that share the file need clocks that agree within a few seconds, and a file system on which SQLite
+    locking works. Many network file systems do not lock reliably, see https://www.sqlite.org/faq.html#q5.
+
+    Usage
+    ----------
+    python WorkQueue.py [work_queue.db]
+        Shows how many numbers are pending, leased, done and failed.
+"""
+
+schema = '''
+CREATE TABLE IF NOT EXISTS work (
+    knltb_number INTEGER PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS work_state ON work (state, lease_until);
+CREATE TABLE IF NOT EXISTS budget (
+    name TEXT PRIMARY KEY,
+    next_slot REAL NOT NULL
+);
+'''
+states = ['pending', 'leased', 'done', 'failed']
+
+
+def worker_name():
+    """
+        A name for this process that differs from every other process sharing the queue, on any machine.
+    """
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def connect(filename, timeout=60):
+    """
+        A connection to the queue file in which we start every transaction ourselves.
+    """
+    connection = sqlite3.connect(filename, timeout=timeout, isolation_level=None, check_same_thread=False)
+    # Counting and reading the queue does not wait for the processes that claim and acknowledge.
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.executescript(schema)
+    return connection
+
+
+class WorkQueue(object):
+    def __init__(self, filename="work_queue.db", lease_time=120.0, max_attempts=3):
+        """
+            Parameters
+            ----------
+            filename: string
+                The SQLite file with the queue, it is created when it does not exist yet.
+            lease_time: float
+                Seconds a claimed number stays with its worker without a heartbeat, after which another worker may
+                claim it.
+            max_attempts: int
+                The amount of times a number is claimed before it is marked as failed instead of pending again.
+        """
+        self.filename = filename
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.connection = connect(filename)
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+            Takes the write lock of the file right away, such that two workers never claim the same numbers.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def add(self, knltb_numbers):
+        """
+            Puts numbers in the queue. Numbers that are already in it keep their state, such that every process may
+            add the same list of players without scraping them twice.
+
+            Returns
+            -------
+            added: int
+                The amount of numbers that were new.
+        """
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO work (knltb_number) VALUES (?)',
+                                   [(int(nr),) for nr in knltb_numbers])
+            return connection.total_changes - before
+
+    def claim(self, worker, batch_size=10):
+        """
+            Leases the next pending numbers to a worker. Numbers of which the lease ran out are claimed again.
+
+            Parameters
+            ----------
+            worker: string
+                The name of the worker, see worker_name.
+            batch_size: int
+                The maximum amount of numbers to claim.
+
+            Returns
+            -------
+            knltb_numbers: list<int>
+                The claimed numbers, empty when there is nothing left to claim right now.
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            # Numbers that ran out of leases too often are given up on, instead of taking down every next worker.
+            connection.execute("UPDATE work SET state = 'failed', worker = NULL, lease_until = NULL "
+                               "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                               (now, self.max_attempts))
+            knltb_numbers = [row[0] for row in connection.execute(
+                "SELECT knltb_number FROM work WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY knltb_number LIMIT ?", (now, batch_size))]
+            connection.executemany("UPDATE work SET state = 'leased', worker = ?, lease_until = ?, "
+                                   "attempts = attempts + 1 WHERE knltb_number = ?",
+                                   [(worker, now + self.lease_time, nr) for nr in knltb_numbers])
+        return knltb_numbers
+
+    def heartbeat(self, worker):
+        """
+            Extends all leases of a worker by lease_time.
+
+            Returns
+            -------
+            extended: int
+                The amount of leases the worker still holds.
+        """
+        with self.transaction() as connection:
+            return connection.execute("UPDATE work SET lease_until = ? WHERE state = 'leased' AND worker = ?",
+                                      (time.time() + self.lease_time, worker)).rowcount
+
+    def ack(self, worker, knltb_numbers):
+        """
+            Marks numbers as done. Numbers of which the worker lost the lease to another worker are left alone.
+        """
+        with self.transaction() as connection:
+            connection.executemany("UPDATE work SET state = 'done', worker = NULL, lease_until = NULL, "
+                                   "finished_at = ? WHERE knltb_number = ? AND worker = ? AND state = 'leased'",
+                                   [(time.time(), nr, worker) for nr in knltb_numbers])
+
+    def release(self, worker, knltb_numbers):
+        """
+            Gives numbers that could not be scraped back to the queue, or marks them as failed after max_attempts.
+        """
+        with self.transaction() as connection:
+            connection.executemany("UPDATE work SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                   "worker = NULL, lease_until = NULL "
+                                   "WHERE knltb_number = ? AND worker = ? AND state = 'leased'",
+                                   [(self.max_attempts, nr, worker) for nr in knltb_numbers])
+
+    def counts(self):
+        """
+            The amount of numbers in every state.
+        """
+        with self.lock:
+            counts = dict(self.connection.execute('SELECT state, COUNT(*) FROM work GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in states}
+
+    def unfinished(self):
+        """
+            Whether there are numbers that are pending or leased, by this or any other worker.
+        """
+        counts = self.counts()
+        return counts['pending'] + counts['leased'] > 0
+
+    def retry_failed(self):
+        """
+            Puts the failed numbers back in the queue with a fresh amount of attempts.
+        """
+        with self.transaction() as connection:
+            return connection.execute("UPDATE work SET state = 'pending', attempts = 0 "
+                                      "WHERE state = 'failed'").rowcount
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class Heartbeat(object):
+    """
+        Keeps the leases of a worker alive from a background thread, until it is stopped.
+    """
+    def __init__(self, queue, worker):
+        self.queue = queue
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def run(self):
+        # Three beats per lease, such that a single slow beat does not lose the leases.
+        while not self.stopped.wait(self.queue.lease_time / 3.0):
+            try:
+                self.queue.heartbeat(self.worker)
+            except sqlite3.OperationalError:
+                pass  # The file was busy for too long, the next beat tries again.
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+
+class SharedBudget(object):
+    def __init__(self, filename, interval, name='pages'):
+        """
+            The politeness budget of all processes sharing the queue file. Every page load reserves the next free
+            slot of interval seconds in the file and waits for it, so the processes together load at most one page
+            per interval. Can be used instead of a RateLimiter.TokenBucket.
+
+            Parameters
+            ----------
+            filename: string
+                The SQLite file of the queue.
+            interval: float
+                Seconds between two page loads, of any process.
+            name: string
+                The budget, processes that load pages of different sites may keep separate budgets.
+        """
+        self.interval = interval
+        self.name = name
+        self.connection = connect(filename)
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+            Reserves the next free slot.
+
+            Returns
+            -------
+            slot: float
+                The time at which we may load the page.
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = self.connection.execute('SELECT next_slot FROM budget WHERE name = ?', (self.name,)).fetchone()
+                # A budget that was not used for a while does not build up a burst of page loads.
+                slot = max(now, row[0]) if row is not None else now
+                self.connection.execute('INSERT OR REPLACE INTO budget (name, next_slot) VALUES (?, ?)',
+                                        (self.name, slot + self.interval))
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+        return slot
+
+    def acquire(self):
+        """
+            Blocks until this process may load its next page.
+
+            Returns
+            -------
+            waited: float
+                The amount of seconds we had to wait.
+        """
+        waited = max(0.0, self.reserve() - time.time())
+        if waited > 0:
+            time.sleep(waited)
+        return waited
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+if __name__ == '__main__':
+    work_queue = WorkQueue(sys.argv[1] if len(sys.argv) > 1 else "work_queue.db")
+    for state, amount in sorted(work_queue.counts().items(), key=lambda item: states.index(item[0])):
+        print('{:<8} {:>10}'.format(state, amount))